@@ -0,0 +1,79 @@
+"""
+Encode/decode time of the JSON codec backends on pipeline configurations.
+
+Usage:
+    python benchmarks/bench_codec.py [CONFIG ...] [--replicate N] [--repeat N]
+
+Configurations can be YAML pipeline configurations or JSON documents (e.g. a validated config saved from the API).
+By default, the MosaiCatcher configuration is used with its data collections replicated to mimic a large config.
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import yaml
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from depictio_cli.codec import BACKENDS, get_codec  # noqa: E402
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "..", "configs", "mosaicatcher_pipeline", "mosaicatcher_pipeline.yaml")
+
+
+def load(path: str):
+    with open(path) as f:
+        return json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+
+
+def replicate(config: dict, n: int) -> dict:
+    config = copy.deepcopy(config)
+    for workflow in config.get("workflows", []):
+        data_collections = workflow.get("data_collections", [])
+        workflow["data_collections"] = [
+            {**copy.deepcopy(dc), "data_collection_tag": f"{dc['data_collection_tag']}_{i}"} for i in range(n) for dc in data_collections
+        ]
+    return config
+
+
+def bench(codec, obj, repeat: int):
+    encoded = codec.dumps(obj)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        codec.dumps(obj)
+    encode_time = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        codec.loads(encoded)
+    decode_time = (time.perf_counter() - start) / repeat
+    return len(encoded), encode_time, decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("configs", nargs="*", default=[DEFAULT_CONFIG])
+    parser.add_argument("--replicate", type=int, default=500, help="Replicate the data collections N times")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    codecs = []
+    for name in BACKENDS:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+
+    print(f"{'config':40} {'backend':8} {'size (MB)':>10} {'encode (ms)':>12} {'decode (ms)':>12}")
+    for path in args.configs:
+        obj = replicate(load(path), args.replicate) if args.replicate > 1 else load(path)
+        for codec in codecs:
+            size, encode_time, decode_time = bench(codec, obj, args.repeat)
+            print(f"{os.path.basename(path)[:40]:40} {codec.name:8} {size / 1e6:10.2f} {encode_time * 1e3:12.2f} {decode_time * 1e3:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Memory footprint of a list of manifest entries (dicts) versus the columnar Manifest.
+
+Usage:
+    python benchmarks/bench_manifest.py [--files N] [--runs N]
+
+Synthetic entries mimic a Strand-seq layout: runs / samples / cells, with sample and cell wildcards.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from depictio_cli.manifest import Manifest  # noqa: E402
+
+
+def synthetic_entries(n_files: int, n_runs: int):
+    files_per_run = max(1, n_files // n_runs)
+    for i in range(n_files):
+        run = f"2024-01-{i // files_per_run:04d}"
+        sample = f"SAMPLE{(i // 96) % 50:03d}"
+        cell = f"{sample}x{i % 96:02d}PE20{i % 7}"
+        yield {
+            "data_collection_tag": "mosaicatcher_stats",
+            "run_id": run,
+            "path": f"/data/runs/{run}/{sample}/counts/{cell}.txt.percell.gz",
+            "size": 1000 + i,
+            "mtime": 1700000000.0 + i,
+            "wildcards": {"sample": sample, "cell": cell},
+        }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1_000_000, help="Number of files")
+    parser.add_argument("--runs", type=int, default=100, help="Number of runs")
+    args = parser.parse_args()
+
+    entries, dict_bytes, dict_time = measure(lambda: list(synthetic_entries(args.files, args.runs)))
+    del entries
+    manifest, manifest_bytes, manifest_time = measure(lambda: Manifest.from_entries(synthetic_entries(args.files, args.runs)))
+
+    start = time.perf_counter()
+    data = manifest.to_bytes()
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    Manifest.from_bytes(data)
+    decode_time = time.perf_counter() - start
+
+    print(f"{'representation':<16} {'bytes/file':>12} {'total (MB)':>12} {'build (s)':>10}")
+    print(f"{'list of dicts':<16} {dict_bytes / args.files:>12.1f} {dict_bytes / 2**20:>12.1f} {dict_time:>10.2f}")
+    print(f"{'Manifest':<16} {manifest_bytes / args.files:>12.1f} {manifest_bytes / 2**20:>12.1f} {manifest_time:>10.2f}")
+    print(f"Reduction: {dict_bytes / manifest_bytes:.1f}x")
+    print(f"Serialised: {len(data) / 2**20:.1f} MB, encode {encode_time:.2f}s, decode {decode_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Size and throughput of the front-coded manifest wire format against plain JSON, with and without gzip.
+
+Usage:
+    python benchmarks/bench_wire.py [--paths FILE | --root DIR] [--files N] [--repeat N]
+
+--paths reads one path per line (e.g. the output of `find /g/korbel/... -type f`), --root walks a directory.
+Without either, synthetic Strand-seq-like paths are generated.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from depictio_cli.wire import decode_manifest, encode_manifest  # noqa: E402
+
+
+def entries_from_paths(paths):
+    for i, path in enumerate(paths):
+        yield {"path": path, "size": 1000 + i, "mtime": 1700000000.0 + i, "run_id": path.split("/")[-4] if path.count("/") > 4 else "", "wildcards": {}}
+
+
+def read_paths(path_file: str):
+    with open(path_file) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def walk_paths(root: str):
+    return [os.path.join(directory, name) for directory, _, names in os.walk(root) for name in names]
+
+
+def synthetic_paths(n_files: int):
+    paths = []
+    for i in range(n_files):
+        run = f"2024-01-{i // 10000:04d}-run_NovaSeq_{i // 10000:04d}"
+        sample = f"SAMPLE{(i // 96) % 50:03d}"
+        paths.append(f"/g/korbel/STRANDSEQ_ANALYSIS/{run}/{sample}/counts/{sample}x{i % 96:02d}PE20{i % 7}.txt.percell.gz")
+    return paths
+
+
+def timed(function, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", help="File with one path per line")
+    parser.add_argument("--root", help="Directory to walk")
+    parser.add_argument("--files", type=int, default=100_000, help="Number of synthetic files")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions")
+    args = parser.parse_args()
+
+    paths = read_paths(args.paths) if args.paths else walk_paths(args.root) if args.root else synthetic_paths(args.files)
+    entries = list(entries_from_paths(paths))
+    n = len(entries)
+
+    plain, plain_encode = timed(lambda: json.dumps({"files": entries}).encode("utf-8"), args.repeat)
+    _, plain_decode = timed(lambda: json.loads(plain)["files"], args.repeat)
+    plain_gzip, plain_gzip_encode = timed(lambda: gzip.compress(plain, compresslevel=6), args.repeat)
+    _, plain_gzip_decode = timed(lambda: json.loads(gzip.decompress(plain_gzip)), args.repeat)
+
+    wire, wire_encode = timed(lambda: json.dumps({"manifest": encode_manifest(entries)}).encode("utf-8"), args.repeat)
+    _, wire_decode = timed(lambda: decode_manifest(json.loads(wire)["manifest"]), args.repeat)
+    wire_gzip, wire_gzip_encode = timed(lambda: gzip.compress(wire, compresslevel=6), args.repeat)
+    _, wire_gzip_decode = timed(lambda: decode_manifest(json.loads(gzip.decompress(wire_gzip))["manifest"]), args.repeat)
+
+    print(f"{n} files, mean path length {sum(map(len, paths)) / max(n, 1):.0f} characters")
+    print(f"{'format':<20} {'size (MB)':>10} {'bytes/file':>11} {'encode (files/s)':>17} {'decode (files/s)':>17}")
+    rows = [
+        ("JSON", plain, plain_encode, plain_decode),
+        ("JSON + gzip", plain_gzip, plain_encode + plain_gzip_encode, plain_gzip_decode),
+        ("front-coded", wire, wire_encode, wire_decode),
+        ("front-coded + gzip", wire_gzip, wire_encode + wire_gzip_encode, wire_gzip_decode),
+    ]
+    for name, data, encode_time, decode_time in rows:
+        print(f"{name:<20} {len(data) / 2**20:>10.2f} {len(data) / max(n, 1):>11.1f} {n / encode_time:>17,.0f} {n / decode_time:>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
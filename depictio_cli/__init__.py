@@ -3,3 +3,13 @@ from pathlib import Path
 # Set BASE_path to the parent directory where depictio package is located
 
 BASE_PATH = Path(__file__).parent
+
+
+def __getattr__(name: str):
+    # The API client (and the CLI modules it uses) is only imported when used, so the workers of the process pools
+    # importing a submodule of the package stay light
+    if name in ["DepictioClient", "SyncDepictioClient"]:
+        from depictio_cli import client
+
+        return getattr(client, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,113 @@
+import queue
+import threading
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional
+
+from depictio_cli.logging import logger
+from depictio_cli.scheduler import DAGScheduler, StageNode
+
+TERMINAL_STATUSES = ["success", "failed", "cancelled"]
+# Put on the event queue of a job group once it is over, whether it finished or died
+_END_OF_GROUP = None
+
+
+class LocalBuildBackend:
+    """
+    In-process stand-in for the server-side build jobs: the jobs of a group run in a thread pool, each once the jobs
+    it depends on succeeded, and their status changes are reported as a single event stream.
+
+    `run_job` builds one job and returns its result (or raises), e.g. with one request per data collection.
+    """
+
+    def __init__(self, run_job: Callable[[dict], Optional[dict]], max_workers: int = 4):
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self._groups: Dict[str, queue.Queue] = {}
+
+    def submit(self, workflow_id: str, jobs: List[dict]) -> str:
+        group_id = uuid.uuid4().hex
+        events: queue.Queue = queue.Queue()
+        self._groups[group_id] = events
+
+        def emit(job: dict, status: str, **extra) -> None:
+            events.put({"job_group_id": group_id, "data_collection_id": job["data_collection_id"], "data_collection_tag": job["data_collection_tag"], "status": status, **extra})
+
+        tags = {job["data_collection_id"]: job["data_collection_tag"] for job in jobs}
+        nodes = {}
+        for job in jobs:
+            node = StageNode(dc_tag=job["data_collection_tag"], stage="build", dc=job)
+            node.upstream = [(tags[dependency], "build") for dependency in job.get("depends_on", []) if dependency in tags]
+            nodes[node.key] = node
+        for node in nodes.values():
+            for upstream in node.upstream:
+                nodes[upstream].downstream.append(node.key)
+
+        def run_node(node: StageNode) -> bool:
+            job = node.dc
+            emit(job, "running")
+            try:
+                result = self.run_job(job)
+            except Exception as e:
+                emit(job, "failed", error=str(e))
+                raise
+            emit(job, "success", result=result)
+            return True
+
+        def run_group() -> None:
+            try:
+                for job in jobs:
+                    emit(job, "queued")
+                DAGScheduler(nodes, run_node, max_workers=self.max_workers).run()
+                for node in nodes.values():
+                    if node.status == "cancelled":
+                        emit(node.dc, "cancelled", error=node.error)
+            except Exception as e:
+                logger.error(f"Job group {group_id} failed: {e}")
+            finally:
+                events.put(_END_OF_GROUP)
+
+        threading.Thread(target=run_group, name=f"build-{group_id}", daemon=True).start()
+        return group_id
+
+    def status_events(self, group_id: str) -> Iterator[dict]:
+        events = self._groups[group_id]
+        try:
+            while True:
+                event = events.get()
+                if event is _END_OF_GROUP:
+                    return
+                yield event
+        finally:
+            # Also when the consumer stops early: the jobs still running report to a queue nobody reads
+            self._groups.pop(group_id, None)
+
+
+def track_build_jobs(backend, group_id: str, jobs: List[dict]) -> Dict[str, dict]:
+    """
+    Follow the status stream of a job group until every job is finished.
+
+    Returns the last event of each job, by data collection id; jobs the stream ended without finishing are reported as failed.
+    """
+    pending = {job["data_collection_id"]: job["data_collection_tag"] for job in jobs}
+    final: Dict[str, dict] = {}
+    for event in backend.status_events(group_id):
+        dc_id = event.get("data_collection_id")
+        if dc_id not in pending:
+            continue
+        status = event["status"]
+        if status == "failed":
+            logger.error(f"Build of {pending[dc_id]} failed: {event.get('error')}")
+        elif status == "cancelled":
+            logger.warning(f"Build of {pending[dc_id]} cancelled: {event.get('error')}")
+        else:
+            logger.info(f"Build of {pending[dc_id]}: {status}")
+        if status in TERMINAL_STATUSES:
+            final[dc_id] = event
+            del pending[dc_id]
+            if not pending:
+                break
+
+    for dc_id, dc_tag in pending.items():
+        logger.error(f"Build of {dc_tag}: status stream ended before the job finished")
+        final[dc_id] = {"job_group_id": group_id, "data_collection_id": dc_id, "data_collection_tag": dc_tag, "status": "failed", "error": "status stream ended before the job finished"}
+    return final
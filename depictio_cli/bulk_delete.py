@@ -0,0 +1,147 @@
+import fnmatch
+import importlib.util
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Optional
+
+from depictio_cli.logging import logger
+from depictio_cli.utils import api_request
+
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def matches(value: str, patterns: Optional[List[str]]) -> bool:
+    return not patterns or any(fnmatch.fnmatchcase(value, pattern) for pattern in patterns)
+
+
+def select_targets(workflows: Iterable[dict], workflow_patterns: Optional[List[str]] = None, data_collection_patterns: Optional[List[str]] = None) -> List[dict]:
+    """
+    Select what to delete: whole workflows matching the workflow tags or globs or, with data collection tags or globs,
+    only the matching data collections of these workflows.
+    """
+    targets = []
+    for workflow in workflows:
+        if not matches(workflow["workflow_tag"], workflow_patterns):
+            continue
+        if data_collection_patterns:
+            for dc in workflow.get("data_collections", []):
+                if matches(dc["data_collection_tag"], data_collection_patterns):
+                    targets.append({"workflow": workflow, "data_collections": [dc], "kind": "data_collection"})
+        else:
+            targets.append({"workflow": workflow, "data_collections": workflow.get("data_collections", []), "kind": "workflow"})
+    return targets
+
+
+def target_name(target: dict) -> str:
+    if target["kind"] == "workflow":
+        return target["workflow"]["workflow_tag"]
+    return f"{target['workflow']['workflow_tag']}/{target['data_collections'][0]['data_collection_tag']}"
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class S3Deleter:
+    """
+    Delete the S3 objects of data collections (under `<prefix><data collection id>/`), in batches of up to 1000 keys
+    per request (requires boto3; credentials are read the usual boto3 way).
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "", batch_size: int = S3_DELETE_BATCH_SIZE):
+        if importlib.util.find_spec("boto3") is None:
+            raise RuntimeError("boto3 is required to delete S3 objects, install it with `pip install depictio-cli[s3]`")
+        import boto3
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.batch_size = min(batch_size, S3_DELETE_BATCH_SIZE)
+        self._lock = threading.Lock()
+        self.stats = {"objects": 0, "bytes": 0, "requests": 0, "errors": 0}
+
+    def _iter_objects(self, prefix: str) -> Iterator[dict]:
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            yield from page.get("Contents", [])
+
+    def delete_data_collection(self, data_collection_id: str) -> bool:
+        """
+        Delete the objects of a data collection. Returns False if some of them could not be deleted.
+        """
+        success = True
+        for batch in iter_batches(self._iter_objects(f"{self.prefix}{data_collection_id}/"), self.batch_size):
+            response = self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": [{"Key": item["Key"]} for item in batch], "Quiet": True})
+            errors = response.get("Errors", [])
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["objects"] += len(batch) - len(errors)
+                self.stats["bytes"] += sum(item.get("Size", 0) for item in batch)
+                self.stats["errors"] += len(errors)
+            for error in errors[:5]:
+                logger.error(f"Cannot delete s3://{self.bucket}/{error['Key']}: {error.get('Message')}")
+            success = success and not errors
+        return success
+
+
+def delete_target(agent_config: dict, target: dict, headers: dict, s3: Optional[S3Deleter] = None) -> bool:
+    """
+    Delete a workflow or a data collection. Its S3 objects are deleted first, so a failed deletion can simply be run again.
+    """
+    if s3 is not None:
+        for dc in target["data_collections"]:
+            if not s3.delete_data_collection(str(dc["_id"])):
+                return False
+
+    workflow_id = str(target["workflow"]["_id"])
+    if target["kind"] == "workflow":
+        url = f"{agent_config['api_base_url']}/depictio/api/v1/workflows/delete/{workflow_id}"
+    else:
+        url = f"{agent_config['api_base_url']}/depictio/api/v1/datacollections/delete/{workflow_id}/{target['data_collections'][0]['_id']}"
+    response = api_request("DELETE", url, headers=headers, timeout=60.0, retries=2)
+    if response.status_code not in [200, 204]:
+        logger.error(f"Cannot delete {target_name(target)}: {response.text}")
+        return False
+    return True
+
+
+def delete_targets(agent_config: dict, targets: List[dict], headers: dict, max_workers: int = 8, s3: Optional[S3Deleter] = None) -> List[dict]:
+    """
+    Delete workflows and data collections concurrently, with at most `max_workers` deletions in flight, and report the throughput.
+    Returns the targets deleted.
+    """
+    start = time.monotonic()
+    deleted, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(delete_target, agent_config, target, headers, s3): target for target in targets}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                success = future.result()
+            except Exception as e:
+                logger.error(f"Cannot delete {target_name(target)}: {e}")
+                success = False
+            if success:
+                logger.info(f"Deleted {target_name(target)}")
+                deleted.append(target)
+            else:
+                failed.append(target_name(target))
+
+    elapsed = max(time.monotonic() - start, 1e-9)
+    logger.info(f"Deleted {len(deleted)} of {len(targets)} workflows/data collections in {elapsed:.1f}s ({len(deleted) / elapsed:.1f}/s)")
+    if s3 is not None:
+        stats = s3.stats
+        logger.info(
+            f"Deleted {stats['objects']} S3 objects ({stats['bytes'] / 1024 / 1024:.1f} MB) in {stats['requests']} requests: "
+            f"{stats['objects'] / elapsed:.0f} objects/s, {stats['bytes'] / 1024 / 1024 / elapsed:.1f} MB/s"
+        )
+    if failed:
+        logger.error(f"Could not delete: {', '.join(sorted(failed))}")
+    return deleted
@@ -0,0 +1,283 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, TypeVar, Union
+
+import httpx
+import yaml
+
+from depictio_cli import codec
+from depictio_cli.manifest import Manifest
+from depictio_cli.utils import (
+    api_request,
+    check_workflow_exists,
+    create_deltatable_request,
+    create_token_manager,
+    create_trackset,
+    get_config,
+    get_scan_type,
+    list_workflows,
+    register_files_for_data_collection,
+    register_workflow,
+    scan_files_for_data_collection,
+    use_api_session,
+    validate_depictio_agent_config,
+)
+from depictio_cli.validation import validate_pipeline_config_locally
+
+T = TypeVar("T")
+
+
+class DepictioClient:
+    """
+    Async client of the Depictio API, for pipelines registering their outputs in-process instead of running the CLI
+    for each of them. It holds the agent configuration, a pool of connections, the token (refreshed before it expires
+    and when rejected) and the workflows already resolved, for as long as it is open:
+
+        async with DepictioClient.from_config_file() as client:
+            workflow = await client.register_workflow(workflow_config)
+            await client.register_files(workflow["_id"], dc_id, entries)
+            await client.aggregate(workflow["_id"], dc_id)
+
+    Requests go through the same functions as the CLI (retries, token refresh, HTTP cache, bandwidth limits and metrics),
+    run in a thread pool with the connections and the token of the client.
+    """
+
+    def __init__(
+        self,
+        agent_config: dict,
+        config_path: Optional[str] = None,
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        retries: int = 2,
+        backoff: float = 1.0,
+    ):
+        self.agent_config = agent_config
+        self.base_url = f"{agent_config['api_base_url']}/depictio/api/v1"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.token_manager = create_token_manager(agent_config, config_path)
+        self._http_client = httpx.Client(
+            timeout=timeout, limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="depictio-client")
+        self._workflows: Dict[Tuple[str, str], dict] = {}
+
+    @classmethod
+    def from_config_file(cls, config_path: str = "~/.depictio/agent.yaml", **kwargs) -> "DepictioClient":
+        """
+        Create a client from an agent configuration file, to which refreshed tokens are written back.
+        """
+        with open(os.path.expanduser(config_path), "r") as f:
+            agent_config = validate_depictio_agent_config(yaml.safe_load(f))
+        return cls(agent_config, config_path=config_path, **kwargs)
+
+    async def __aenter__(self) -> "DepictioClient":
+        await self.login()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        # Requests still running finish first, off the event loop
+        await asyncio.to_thread(self._executor.shutdown)
+        self._http_client.close()
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token_manager.access_token()}"}
+
+    async def _call(self, function: Callable[[], T]) -> T:
+        """
+        Run a blocking call of the CLI API functions in the thread pool, its requests sent with the connections and the token of the client.
+        """
+        context = contextvars.copy_context()
+        context.run(use_api_session, self._http_client, self.token_manager)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, function)
+
+    async def request(
+        self,
+        method: str,
+        endpoint: str,
+        json_body: Any = None,
+        params: Optional[dict] = None,
+        content: Optional[bytes] = None,
+        headers: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        Send a request to an endpoint of the API (e.g. "workflows/get_all_workflows"), as api_request does for the CLI.
+        Idempotent requests (GET, DELETE) are retried on connection errors and gateway errors.
+        """
+        retries = self.retries if method in ["GET", "DELETE"] else 0
+        return await self._call(
+            lambda: api_request(
+                method,
+                f"{self.base_url}/{endpoint}",
+                headers={**self._headers(), **(headers or {})},
+                json_body=json_body,
+                params=params,
+                content=content,
+                timeout=self.timeout if timeout is None else timeout,
+                retries=retries,
+                backoff=self.backoff,
+            )
+        )
+
+    async def _request_json(self, method: str, endpoint: str, action: str, **kwargs) -> Any:
+        response = await self.request(method, endpoint, **kwargs)
+        return _response_body(response, action)
+
+    async def login(self) -> None:
+        """
+        Check the agent configuration with the server.
+        """
+        await self._request_json("POST", "cli/validate_agent_config", "validating the agent configuration", json_body=self.agent_config)
+
+    async def validate(self, pipeline_config: Union[str, dict]) -> dict:
+        """
+        Validate a pipeline configuration (a path or its content), locally then on the server. Returns the validated configuration.
+        """
+        if isinstance(pipeline_config, str):
+            pipeline_config = get_config(pipeline_config)
+        errors = validate_pipeline_config_locally(pipeline_config)
+        if errors:
+            raise ValueError(f"Pipeline configuration failed the local validation: {'; '.join(errors)}")
+        body = await self._request_json("POST", "cli/validate_pipeline_config", "validating the pipeline configuration", json_body=pipeline_config)
+        return body.get("config", {})
+
+    async def get_workflow(self, name: str, engine: str) -> Optional[dict]:
+        """
+        Return the workflow registered with this name and engine, if any (resolved once per client).
+        """
+        if (name, engine) not in self._workflows:
+            exists, workflow = await self._call(lambda: check_workflow_exists(self.agent_config, {"name": name, "engine": engine}, self._headers()))
+            if not exists:
+                return None
+            self._workflows[(name, engine)] = workflow
+        return self._workflows[(name, engine)]
+
+    async def list_workflows(self) -> List[dict]:
+        return await self._call(lambda: list(list_workflows(self.agent_config, self._headers())))
+
+    async def register_workflow(self, workflow: dict, update: bool = False) -> dict:
+        """
+        Register a workflow of a validated pipeline configuration. An existing workflow is returned as is when its
+        configuration matches, replaced with `update`, and an error otherwise.
+        """
+        registered = await self._call(lambda: register_workflow(self.agent_config, workflow, self._headers(), update=update))
+        self._workflows[(workflow["name"], workflow["engine"])] = registered
+        return registered
+
+    async def scan(self, workflow_id: str, data_collection: dict, file_stats: Optional[List[dict]] = None) -> Any:
+        """
+        Have the server scan the files of a data collection (a data collection of a registered workflow).
+        """
+        response = await self._call(
+            lambda: scan_files_for_data_collection(
+                self.agent_config, workflow_id, data_collection["_id"], self._headers(), get_scan_type(data_collection), file_stats=file_stats
+            )
+        )
+        return _response_body(response, f"scanning data collection {data_collection['data_collection_tag']}")
+
+    async def register_files(self, workflow_id: str, data_collection_id: str, entries: Union[List[dict], Manifest], batch_size: int = 10000) -> int:
+        """
+        Register files found by the pipeline itself (entries of a local scan), in batches. Returns the number of files registered.
+        """
+        registered = await self._call(
+            lambda: register_files_for_data_collection(self.agent_config, workflow_id, data_collection_id, entries, self._headers(), batch_size=batch_size)
+        )
+        if not registered:
+            raise ValueError(f"Error registering files for data collection {data_collection_id}")
+        return len(entries)
+
+    async def aggregate(self, workflow_id: str, data_collection_id: str) -> Any:
+        """
+        Build the delta table of a data collection.
+        """
+        response = await self._call(lambda: create_deltatable_request(self.agent_config, workflow_id, data_collection_id, self._headers()))
+        return _response_body(response, f"aggregating data collection {data_collection_id}")
+
+    async def create_trackset(self, workflow_id: str, data_collection_id: str) -> Any:
+        response = await self._call(lambda: create_trackset(self.agent_config, workflow_id, data_collection_id, self._headers()))
+        return _response_body(response, f"creating the trackset of data collection {data_collection_id}")
+
+
+def _response_body(response: httpx.Response, action: str) -> Any:
+    if response.status_code not in [200, 204]:
+        raise httpx.HTTPStatusError(message=f"Error {action}: {response.text}", request=response.request, response=response)
+    return codec.loads(response.content) if response.content else None
+
+
+class SyncDepictioClient:
+    """
+    Blocking wrapper of DepictioClient, for pipelines without an event loop. The async client runs on a private loop in
+    a background thread, so its connections are reused across calls (and calls work from inside a running loop).
+    """
+
+    def __init__(self, agent_config: dict, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="depictio-client", daemon=True)
+        self._thread.start()
+        self.client: DepictioClient = self._run(self._create(agent_config, **kwargs))
+
+    @staticmethod
+    async def _create(agent_config: dict, **kwargs) -> DepictioClient:
+        # The async client is created on the loop it is used from
+        return DepictioClient(agent_config, **kwargs)
+
+    @classmethod
+    def from_config_file(cls, config_path: str = "~/.depictio/agent.yaml", **kwargs) -> "SyncDepictioClient":
+        with open(os.path.expanduser(config_path), "r") as f:
+            agent_config = validate_depictio_agent_config(yaml.safe_load(f))
+        return cls(agent_config, config_path=config_path, **kwargs)
+
+    def _run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __enter__(self) -> "SyncDepictioClient":
+        self.login()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._loop.is_running():
+            self._run(self.client.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        return self._run(self.client.request(method, endpoint, **kwargs))
+
+    def login(self) -> None:
+        self._run(self.client.login())
+
+    def validate(self, pipeline_config: Union[str, dict]) -> dict:
+        return self._run(self.client.validate(pipeline_config))
+
+    def get_workflow(self, name: str, engine: str) -> Optional[dict]:
+        return self._run(self.client.get_workflow(name, engine))
+
+    def list_workflows(self) -> List[dict]:
+        return self._run(self.client.list_workflows())
+
+    def register_workflow(self, workflow: dict, update: bool = False) -> dict:
+        return self._run(self.client.register_workflow(workflow, update=update))
+
+    def scan(self, workflow_id: str, data_collection: dict, file_stats: Optional[List[dict]] = None) -> Any:
+        return self._run(self.client.scan(workflow_id, data_collection, file_stats=file_stats))
+
+    def register_files(self, workflow_id: str, data_collection_id: str, entries: Union[List[dict], Manifest], batch_size: int = 10000) -> int:
+        return self._run(self.client.register_files(workflow_id, data_collection_id, entries, batch_size=batch_size))
+
+    def aggregate(self, workflow_id: str, data_collection_id: str) -> Any:
+        return self._run(self.client.aggregate(workflow_id, data_collection_id))
+
+    def create_trackset(self, workflow_id: str, data_collection_id: str) -> Any:
+        return self._run(self.client.create_trackset(workflow_id, data_collection_id))
@@ -0,0 +1,109 @@
+import json
+import os
+from typing import Any, Union
+
+from depictio_cli.logging import logger
+
+BACKENDS = ["orjson", "msgspec", "json"]
+
+
+def _default(obj: Any) -> str:
+    # ObjectId, datetime, Path, ... are sent as strings
+    return str(obj)
+
+
+class _StdlibCodec:
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class _OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, default=_default, option=self._options)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._orjson.loads(data)
+
+
+class _MsgspecCodec:
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._encoder = msgspec.json.Encoder(enc_hook=_default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._decoder.decode(data)
+
+
+_CODEC_CLASSES = {"orjson": _OrjsonCodec, "msgspec": _MsgspecCodec, "json": _StdlibCodec}
+
+
+def get_codec(backend: str = None):
+    """
+    Return the codec of the given backend, or of the first available backend (orjson, msgspec, then the json module).
+
+    The backend can be forced with the DEPICTIO_JSON_BACKEND environment variable.
+    """
+    candidates = [backend] if backend else BACKENDS
+    for name in candidates:
+        if name not in _CODEC_CLASSES:
+            raise ValueError(f"Unknown JSON backend '{name}', expected one of {BACKENDS}")
+        try:
+            return _CODEC_CLASSES[name]()
+        except ImportError:
+            if backend:
+                raise
+    return _StdlibCodec()
+
+
+_codec = get_codec(os.environ.get("DEPICTIO_JSON_BACKEND") or None)
+logger.debug(f"JSON codec backend: {_codec.name}")
+
+
+def set_backend(backend: str) -> None:
+    global _codec
+    _codec = get_codec(backend)
+
+
+def backend_name() -> str:
+    return _codec.name
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object as compact JSON bytes.
+    """
+    return _codec.dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode JSON bytes or text.
+    """
+    return _codec.loads(data)
+
+
+def dumps_pretty(obj: Any) -> str:
+    """
+    Encode an object as indented JSON text, for logging.
+    """
+    return json.dumps(obj, default=_default, indent=2)
@@ -1,6 +1,38 @@
-from depictio_cli.utils import create_update_delete_workflow, login, process_workflow, remote_validate_pipeline_config
+import httpx
+import os
+import yaml
+from depictio_cli.build_jobs import LocalBuildBackend
+from depictio_cli.bulk_delete import S3Deleter, delete_targets, select_targets, target_name
+from depictio_cli.compaction import MB, CompactionThresholds, LocalTableStore, compact_tables, workflow_table_store
+from depictio_cli.conversion import DEFAULT_CACHE_DIR
+from depictio_cli.file_index import DEFAULT_INDEX_PATH, FileIndex
+from depictio_cli.http_cache import cache_scope
+from depictio_cli.progress import ProgressDisplay
+from depictio_cli.metrics import get_metrics
+from depictio_cli.journal import DEFAULT_JOURNAL_PATH, RunJournal, compute_config_hash
+from depictio_cli.scanner import discover_runs, scan_runs
+from depictio_cli.schema_inference import infer_data_collection_schema
+from depictio_cli.scheduler import get_dc_type
+from depictio_cli.stage_lock import DEFAULT_LOCK_DIR, OVERLAP_MODES, StageLocks
+from depictio_cli.streaming import RowWriter, write_rows
+from depictio_cli.table_cache import DEFAULT_TABLE_CACHE_DIR, TableCache, fetch_table, read_table, write_table
+from depictio_cli.table_state import DEFAULT_TABLE_STATE_PATH, TableState
+from depictio_cli.validation import validate_pipeline_config_locally
+from depictio_cli.utils import (
+    check_workflow_exists,
+    create_update_delete_workflow,
+    get_config,
+    list_files_for_data_collection,
+    list_workflows as stream_workflows,
+    load_agent_identity,
+    login,
+    login_headers,
+    process_workflow,
+    remote_validate_pipeline_config,
+    run_build_job,
+)
 import typer
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional
 
 from depictio_cli.logging import logger
 
@@ -39,6 +71,33 @@ def validate_pipeline_config(
         raise typer.Exit(code=1)
 
 
+@app.command()
+def validate(
+    pipeline_config_path: Annotated[str, typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")],
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    offline: Annotated[bool, typer.Option("--offline", help="Only validate locally, without contacting the server")] = False,
+):
+    """
+    Validate a pipeline configuration, locally (JSON Schema, regular expressions, references) then on the server.
+    """
+    pipeline_config = get_config(pipeline_config_path)
+    errors = validate_pipeline_config_locally(pipeline_config)
+    for error in errors:
+        typer.echo(f"ERROR {error}", err=True)
+    if errors:
+        logger.error(f"Pipeline configuration failed the local validation with {len(errors)} error(s).")
+        raise typer.Exit(code=1)
+    logger.info("Pipeline configuration passed the local validation.")
+
+    if not offline:
+        login_response = login(agent_config_path)
+        if not login_response["success"]:
+            raise typer.Exit(code=1)
+        if not remote_validate_pipeline_config(login_response["agent_config"], pipeline_config_path)["success"]:
+            raise typer.Exit(code=1)
+        logger.info("Pipeline configuration validated by the server.")
+
+
 @app.command()
 def setup(
     agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
@@ -47,16 +106,63 @@ def setup(
     erase_all: Optional[bool] = typer.Option(False, "--erase-all", help="Erase all workflows and data collections"),
     scan_files: Optional[bool] = typer.Option(False, "--scan-files", help="Scan files for all data collections of the workflow"),
     data_collection_tag: Optional[str] = typer.Option(None, "--data-collection-tag", help="Data collection tag to be scanned"),
+    max_workers: int = typer.Option(4, "--max-workers", help="Maximum number of data collection stages processed in parallel"),
+    resume: Optional[bool] = typer.Option(False, "--resume", help="Skip the stages completed by a previous run whose inputs did not change"),
+    journal_path: Annotated[str, typer.Option("--journal-path", help="Path to the run journal")] = DEFAULT_JOURNAL_PATH,
+    index_path: Annotated[str, typer.Option("--index-path", help="Path to the local file index")] = DEFAULT_INDEX_PATH,
+    scan_mode: Annotated[str, typer.Option("--scan-mode", help="server: the server scans the files, local: the CLI scans them and registers them")] = "server",
+    file_stats: Annotated[bool, typer.Option("--file-stats", help="Compute the row counts and check the headers of Table input files, and send them with the scan")] = False,
+    convert_parquet: Annotated[bool, typer.Option("--convert-parquet", help="Convert Table input files to Parquet locally and upload them before the aggregation")] = False,
+    cache_dir: Annotated[str, typer.Option("--cache-dir", help="Directory where the Parquet conversions are cached")] = DEFAULT_CACHE_DIR,
+    incremental: Annotated[bool, typer.Option("--incremental", help="Only write the files added or changed since the last table version, instead of rebuilding the tables")] = False,
+    table_state_path: Annotated[str, typer.Option("--table-state-path", help="Path to the local record of the table versions")] = DEFAULT_TABLE_STATE_PATH,
+    compact_after: Annotated[bool, typer.Option("--compact", help="Compact the tables piling up small files once the workflow is processed")] = False,
+    batch_builds: Annotated[bool, typer.Option("--batch-builds", help="Submit the table and trackset builds of a workflow together and follow them on one status stream")] = False,
+    build_backend: Annotated[str, typer.Option("--build-backend", help="server: the server fans out the batched builds, local: the CLI runs them one request per data collection")] = "server",
+    show_progress: Annotated[bool, typer.Option("--progress/--no-progress", help="Show the live progress of the data collections")] = True,
+    cancel_stragglers: Annotated[bool, typer.Option("--cancel-stragglers", help="Cancel the data collections much slower than the others of their stage")] = False,
+    straggler_factor: Annotated[float, typer.Option("--straggler-factor", help="A data collection running this many times longer than the median of its stage is a straggler")] = 3.0,
+    stage_timeout: Annotated[Optional[float], typer.Option("--stage-timeout", help="Cancel the data collection stages running longer than this many seconds")] = None,
+    coalesce_runs: Annotated[
+        bool, typer.Option("--coalesce-runs/--no-coalesce-runs", help="Do not run a data collection stage already running in another process (with --batch-builds, the builds are coalesced as a whole, with other batched runs only)")
+    ] = True,
+    on_overlap: Annotated[
+        str, typer.Option("--on-overlap", help="wait: wait for the other process and reuse its result, defer: leave the stage to a follow-up pass of the other process")
+    ] = "wait",
+    lock_dir: Annotated[str, typer.Option("--lock-dir", help="Directory of the stage locks (on a shared filesystem to coalesce runs across machines)")] = DEFAULT_LOCK_DIR,
 ):
     """
     Upload files to a data collection.
     """
+    if scan_mode not in ["server", "local"]:
+        logger.error(f"Unknown scan mode '{scan_mode}', expected 'server' or 'local'")
+        raise typer.Exit(code=1)
+    if build_backend not in ["server", "local"]:
+        logger.error(f"Unknown build backend '{build_backend}', expected 'server' or 'local'")
+        raise typer.Exit(code=1)
+    if on_overlap not in OVERLAP_MODES:
+        logger.error(f"Unknown overlap mode '{on_overlap}', expected 'wait' or 'defer'")
+        raise typer.Exit(code=1)
     validated_config = None
     login_response = login(agent_config_path)
     logger.info(login_response)
 
     if login_response["success"]:
-        response = remote_validate_pipeline_config(login_response["agent_config"], pipeline_config_path)
+        journal = RunJournal(journal_path)
+        file_index = FileIndex(index_path)
+        table_state = TableState(table_state_path)
+        agent_config = login_response["agent_config"]
+
+        # Validation only depends on the content of the pipeline configuration and the user/instance it is validated for
+        validation_hash = compute_config_hash(get_config(pipeline_config_path), agent_config["api_base_url"], agent_config["user"]["email"])
+        journal_entry = journal.get("__pipeline__", os.path.abspath(pipeline_config_path), "validate", validation_hash) if resume else None
+        if journal_entry:
+            logger.info("Pipeline configuration already validated, reusing the journal entry.")
+            response = {"success": True, "config": journal_entry["result"]}
+        else:
+            response = remote_validate_pipeline_config(agent_config, pipeline_config_path)
+            if response["success"]:
+                journal.record("__pipeline__", os.path.abspath(pipeline_config_path), "validate", validation_hash, result=response["config"])
 
         if response["success"]:
             logger.info("Pipeline configuration validated.")
@@ -71,11 +177,67 @@ def setup(
 
             headers = {"Authorization": f"Bearer {login_response['agent_config']['user']['token']['access_token']}"}
 
+            stage_locks = StageLocks(lock_dir, on_overlap=on_overlap) if coalesce_runs else None
+            progress = None
+            if show_progress:
+                progress = ProgressDisplay(straggler_factor=straggler_factor, cancel_stragglers=cancel_stragglers, stage_timeout=stage_timeout)
+
             # Populate DB with the validated config for each workflow
+            failed_workflows = []
             for workflow in validated_config["workflows"]:
                 logger.info(f"Processing workflow: {workflow}")
-                response_body = create_update_delete_workflow(login_response["agent_config"], workflow, headers, update=update)
-                process_workflow(login_response["agent_config"], response_body, headers, scan_files=scan_files, data_collection_tag=data_collection_tag)
+                workflow_hash = compute_config_hash(workflow, update)
+                journal_entry = journal.get(workflow["workflow_tag"], "__workflow__", "register", workflow_hash) if resume else None
+                if journal_entry:
+                    logger.info(f"Workflow {workflow['workflow_tag']} already registered, reusing the journal entry.")
+                    response_body = journal_entry["result"]
+                else:
+                    response_body = create_update_delete_workflow(login_response["agent_config"], workflow, headers, update=update)
+                    journal.record(workflow["workflow_tag"], "__workflow__", "register", workflow_hash, result=response_body)
+                backend = None
+                if batch_builds and build_backend == "local":
+                    wf_id = str(response_body["_id"])
+                    backend = LocalBuildBackend(lambda job, wf_id=wf_id: run_build_job(login_response["agent_config"], wf_id, job, headers), max_workers=max_workers)
+                if progress is not None:
+                    progress.start()
+                try:
+                    success = process_workflow(
+                        login_response["agent_config"],
+                        response_body,
+                        headers,
+                        scan_files=scan_files,
+                        data_collection_tag=data_collection_tag,
+                        max_workers=max_workers,
+                        journal=journal,
+                        resume=resume,
+                        file_index=file_index,
+                        scan_mode=scan_mode,
+                        file_stats=file_stats,
+                        convert_tables=convert_parquet,
+                        cache_dir=cache_dir,
+                        table_state=table_state,
+                        incremental=incremental,
+                        batch_builds=batch_builds,
+                        build_backend=backend,
+                        progress=progress,
+                        stage_locks=stage_locks,
+                    )
+                finally:
+                    if progress is not None:
+                        progress.stop()
+                metrics = get_metrics()
+                if metrics is not None:
+                    metrics.set("depictio_workflow_success", int(success), workflow=str(response_body["_id"]))
+                if not success:
+                    failed_workflows.append(workflow["workflow_tag"])
+                elif compact_after:
+                    store = workflow_table_store(login_response["agent_config"], response_body, headers, data_collection_tag=data_collection_tag)
+                    if not compact_tables(store, CompactionThresholds()):
+                        logger.warning(f"Compaction failed for some tables of {workflow['workflow_tag']}, they will be compacted on a later run.")
+
+            if failed_workflows:
+                logger.error(f"Processing did not complete for workflows: {', '.join(failed_workflows)}")
+                raise typer.Exit(code=1)
 
             # remote_upload_files(response["agent_config"], pipeline_config_path, data_collection_tag)
 
@@ -83,3 +245,308 @@ def setup(
             raise typer.Exit(code=1)
     else:
         raise typer.Exit(code=1)
+
+
+@app.command()
+def compact(
+    pipeline_config_path: Annotated[Optional[str], typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")] = None,
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    store_dir: Annotated[Optional[str], typer.Option("--store-dir", help="Compact a local directory-backed table store (one sub-directory per table) instead")] = None,
+    workflow_tag: Annotated[Optional[str], typer.Option("--workflow-tag", help="Only compact the tables of this workflow")] = None,
+    data_collection_tag: Annotated[Optional[str], typer.Option("--data-collection-tag", help="Only compact the table of this data collection")] = None,
+    target_file_size: Annotated[int, typer.Option("--target-file-size", help="Size of the compacted files, in MB")] = 128,
+    small_file_size: Annotated[int, typer.Option("--small-file-size", help="Files smaller than this size (MB) are compacted")] = 32,
+    min_small_files: Annotated[int, typer.Option("--min-small-files", help="Minimum number of small files for a compaction to pay off")] = 10,
+    min_small_file_ratio: Annotated[float, typer.Option("--min-small-file-ratio", help="Minimum fraction of small files for a compaction to pay off")] = 0.2,
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="Only report the tables that would be compacted")] = False,
+):
+    """
+    Rewrite the small files of aggregated tables into target-sized ones, for the tables where it pays off.
+    """
+    thresholds = CompactionThresholds(
+        target_file_size=target_file_size * MB,
+        small_file_size=small_file_size * MB,
+        min_small_files=min_small_files,
+        min_small_file_ratio=min_small_file_ratio,
+    )
+    if store_dir:
+        store = LocalTableStore(store_dir)
+        if not compact_tables(store, thresholds, tables=[data_collection_tag] if data_collection_tag else None, dry_run=dry_run):
+            raise typer.Exit(code=1)
+        return
+
+    if not pipeline_config_path:
+        logger.error("Either --pipeline-config-path or --store-dir is required.")
+        raise typer.Exit(code=1)
+    agent_config, headers = login_headers(agent_config_path)
+    success = True
+    for workflow in get_config(pipeline_config_path)["workflows"]:
+        if workflow_tag and workflow["workflow_tag"] != workflow_tag:
+            continue
+        exists, registered_workflow = check_workflow_exists(agent_config, workflow, headers)
+        if not exists:
+            logger.warning(f"Workflow {workflow['workflow_tag']} is not registered, skipping it.")
+            continue
+        store = workflow_table_store(agent_config, registered_workflow, headers, data_collection_tag=data_collection_tag)
+        success = compact_tables(store, thresholds, dry_run=dry_run) and success
+    if not success:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def get_table(
+    pipeline_config_path: Annotated[str, typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")],
+    workflow_tag: Annotated[str, typer.Option("--workflow-tag", help="Workflow of the table")],
+    data_collection_tag: Annotated[str, typer.Option("--data-collection-tag", help="Data collection of the table")],
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    columns: Annotated[Optional[List[str]], typer.Option("--column", help="Column to output, can be repeated")] = None,
+    filters: Annotated[Optional[List[str]], typer.Option("--filter", help="Row filter as `column <op> value` (==, !=, >, >=, <, <=, in), can be repeated")] = None,
+    output: Annotated[Optional[str], typer.Option("--output", help="Output file (.parquet, .arrow, .csv, .tsv), CSV on stdout by default")] = None,
+    cache_dir: Annotated[str, typer.Option("--cache-dir", help="Directory of the local table cache")] = DEFAULT_TABLE_CACHE_DIR,
+    max_cache_size: Annotated[int, typer.Option("--max-cache-size", help="Size of the local table cache, in MB")] = 2048,
+    offline: Annotated[bool, typer.Option("--offline", help="Read the cached table without checking for a newer version")] = False,
+):
+    """
+    Get the aggregated table of a data collection, through a local cache refreshed only when the table changes.
+    """
+    workflow = next((workflow for workflow in get_config(pipeline_config_path)["workflows"] if workflow["workflow_tag"] == workflow_tag), None)
+    if workflow is None:
+        logger.error(f"Workflow {workflow_tag} not found in {pipeline_config_path}")
+        raise typer.Exit(code=1)
+
+    try:
+        if offline:
+            # The agent configuration only selects the cache of its server and user: no login needed, even with an expired token
+            cache = TableCache(cache_scope(load_agent_identity(agent_config_path)), cache_dir, max_size=max_cache_size * MB)
+            path = fetch_table({}, workflow, {"data_collection_tag": data_collection_tag}, {}, cache, offline=True)
+        else:
+            agent_config, headers = login_headers(agent_config_path)
+            cache = TableCache(cache_scope(agent_config), cache_dir, max_size=max_cache_size * MB)
+            exists, registered_workflow = check_workflow_exists(agent_config, workflow, headers)
+            if not exists:
+                logger.error(f"Workflow {workflow_tag} is not registered")
+                raise typer.Exit(code=1)
+            dc = next((dc for dc in registered_workflow["data_collections"] if dc["data_collection_tag"] == data_collection_tag), None)
+            if dc is None:
+                logger.error(f"Data collection {data_collection_tag} not found in workflow {workflow_tag}")
+                raise typer.Exit(code=1)
+            path = fetch_table(agent_config, registered_workflow, dc, headers, cache)
+        write_table(read_table(path, columns=columns, filters=filters), output)
+    except (ValueError, RuntimeError) as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def files(
+    workflow: Annotated[Optional[str], typer.Option("--workflow", help="Workflow tag, name or id")] = None,
+    data_collection: Annotated[Optional[str], typer.Option("--data-collection", help="Data collection tag or id")] = None,
+    run: Annotated[Optional[str], typer.Option("--run", help="Run id")] = None,
+    wildcard: Annotated[Optional[List[str]], typer.Option("--wildcard", help="Wildcard filter as name=value, can be repeated")] = None,
+    limit: Annotated[Optional[int], typer.Option("--limit", help="Maximum number of files returned")] = None,
+    index_path: Annotated[str, typer.Option("--index-path", help="Path to the local file index")] = DEFAULT_INDEX_PATH,
+):
+    """
+    List the registered files matching the filters, from the local file index (populated during scans).
+    """
+    wildcards = {}
+    for item in wildcard or []:
+        if "=" not in item:
+            logger.error(f"Invalid wildcard filter '{item}', expected name=value.")
+            raise typer.Exit(code=1)
+        name, value = item.split("=", 1)
+        wildcards[name] = value
+
+    file_index = FileIndex(index_path)
+    for file in file_index.query_files(workflow=workflow, data_collection=data_collection, run_id=run, wildcards=wildcards, limit=limit):
+        wildcards_str = ",".join(f"{name}={value}" for name, value in sorted(file["wildcards"].items()))
+        typer.echo(f"{file['workflow_tag']}\t{file['data_collection_tag']}\t{file['run_id']}\t{file['file_location']}\t{wildcards_str}")
+
+
+@app.command()
+def workflows(
+    index_path: Annotated[str, typer.Option("--index-path", help="Path to the local file index")] = DEFAULT_INDEX_PATH,
+):
+    """
+    List the workflows of the local file index.
+    """
+    file_index = FileIndex(index_path)
+    for workflow in file_index.list_workflows():
+        typer.echo(
+            f"{workflow['workflow_tag']}\t{workflow['workflow_id']}\t{workflow['engine']}\t"
+            f"{workflow['data_collections']} data collections\t{workflow['files']} files\tindexed {workflow['indexed_at']}"
+        )
+
+
+@app.command()
+def list_workflows(
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    output_format: Annotated[str, typer.Option("--format", help="Output format: ndjson or tsv")] = "ndjson",
+    columns: Annotated[Optional[List[str]], typer.Option("--column", help="Column to output in TSV format, can be repeated")] = None,
+    page_size: Annotated[int, typer.Option("--page-size", help="Fetch the listing by pages of this size (0 to disable pagination)")] = 0,
+):
+    """
+    Stream the workflows available to the user to stdout, one row per workflow.
+    """
+    agent_config, headers = login_headers(agent_config_path)
+    try:
+        count = write_rows(stream_workflows(agent_config, headers, page_size=page_size), output_format=output_format, columns=columns or None)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Failed to list workflows: {e}")
+        raise typer.Exit(code=1)
+    logger.info(f"{count} workflows listed.")
+
+
+@app.command()
+def delete(
+    workflow_patterns: Annotated[List[str], typer.Option("--workflow", help="Tag or glob of the workflows to delete, can be repeated")],
+    data_collection_patterns: Annotated[
+        Optional[List[str]], typer.Option("--data-collection", help="Only delete the data collections matching this tag or glob, can be repeated")
+    ] = None,
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    max_workers: Annotated[int, typer.Option("--max-workers", help="Maximum number of deletions in flight")] = 8,
+    s3_bucket: Annotated[Optional[str], typer.Option("--s3-bucket", help="Also delete the S3 objects of the data collections from this bucket")] = None,
+    s3_endpoint_url: Annotated[Optional[str], typer.Option("--s3-endpoint-url", help="S3 endpoint (e.g. MinIO)")] = None,
+    s3_prefix: Annotated[str, typer.Option("--s3-prefix", help="Prefix of the data collection directories in the bucket")] = "",
+    journal_path: Annotated[str, typer.Option("--journal-path", help="Path to the run journal")] = DEFAULT_JOURNAL_PATH,
+    table_state_path: Annotated[str, typer.Option("--table-state-path", help="Path to the local record of the table versions")] = DEFAULT_TABLE_STATE_PATH,
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="Only list what would be deleted")] = False,
+    yes: Annotated[bool, typer.Option("--yes", help="Do not ask for confirmation")] = False,
+):
+    """
+    Delete workflows, or some of their data collections, selected by tag or glob, concurrently.
+    """
+    try:
+        s3 = S3Deleter(s3_bucket, endpoint_url=s3_endpoint_url, prefix=s3_prefix) if s3_bucket else None
+    except RuntimeError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+    agent_config, headers = login_headers(agent_config_path)
+    try:
+        targets = select_targets(stream_workflows(agent_config, headers), workflow_patterns, data_collection_patterns)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Failed to list workflows: {e}")
+        raise typer.Exit(code=1)
+    if not targets:
+        logger.info("Nothing matches, nothing to delete.")
+        return
+    for target in targets:
+        typer.echo(f"{target['kind']}\t{target_name(target)}")
+    if dry_run:
+        return
+    if not yes and not typer.confirm(f"Delete these {len(targets)} workflows/data collections?"):
+        raise typer.Exit(code=1)
+    deleted = delete_targets(agent_config, targets, headers, max_workers=max_workers, s3=s3)
+
+    # Forget the local records of what was deleted, so a later setup does not reuse them
+    journal = RunJournal(journal_path)
+    table_state = TableState(table_state_path)
+    for target in deleted:
+        workflow_id = str(target["workflow"]["_id"])
+        # The recorded registration of the workflow lists what was deleted
+        journal.invalidate(target["workflow"]["workflow_tag"])
+        if target["kind"] == "workflow":
+            journal.invalidate(workflow_id)
+        for dc in target["data_collections"]:
+            journal.invalidate(workflow_id, dc["data_collection_tag"])
+            table_state.invalidate(workflow_id, str(dc["_id"]))
+    if len(deleted) != len(targets):
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def list_files(
+    workflow_id: Annotated[str, typer.Option("--workflow-id", help="Workflow id")],
+    data_collection_id: Annotated[str, typer.Option("--data-collection-id", help="Data collection id")],
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    output_format: Annotated[str, typer.Option("--format", help="Output format: ndjson or tsv")] = "ndjson",
+    columns: Annotated[Optional[List[str]], typer.Option("--column", help="Column to output in TSV format, can be repeated")] = None,
+    page_size: Annotated[int, typer.Option("--page-size", help="Fetch the listing by pages of this size (0 to disable pagination)")] = 0,
+    update_index: Annotated[bool, typer.Option("--update-index", help="Also synchronise the local file index with the listed files")] = False,
+    index_path: Annotated[str, typer.Option("--index-path", help="Path to the local file index")] = DEFAULT_INDEX_PATH,
+):
+    """
+    Stream the files registered for a data collection to stdout, one row per file.
+    """
+    agent_config, headers = login_headers(agent_config_path)
+    rows = list_files_for_data_collection(agent_config, workflow_id, data_collection_id, headers, page_size=page_size)
+    writer = RowWriter(output_format=output_format, columns=columns or None)
+
+    def write_and_forward(rows):
+        for row in rows:
+            writer.write(row)
+            yield row
+
+    try:
+        if update_index:
+            # The index is refreshed from the same stream the rows are written from
+            FileIndex(index_path).refresh_data_collection_files(workflow_id, data_collection_id, write_and_forward(rows))
+        else:
+            for row in rows:
+                writer.write(row)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Failed to list files: {e}")
+        raise typer.Exit(code=1)
+    logger.info(f"{writer.count} files listed.")
+
+
+@app.command()
+def infer_schema(
+    pipeline_config_path: Annotated[str, typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")],
+    workflow_tag: Annotated[Optional[str], typer.Option("--workflow-tag", help="Only process this workflow")] = None,
+    data_collection_tag: Annotated[Optional[str], typer.Option("--data-collection-tag", help="Only process this data collection")] = None,
+    max_files: Annotated[int, typer.Option("--max-files", help="Maximum number of files sampled per data collection")] = 200,
+    rows: Annotated[int, typer.Option("--rows", help="Number of rows read from the head of each sampled file")] = 1000,
+    max_workers: Annotated[int, typer.Option("--max-workers", help="Number of processes reading the sampled files")] = 4,
+    in_place: Annotated[bool, typer.Option("--in-place", help="Write the dtypes back into the pipeline configuration file (comments are not preserved)")] = False,
+):
+    """
+    Infer the column dtypes of Table data collections from a sample of their files and set them in polars_kwargs (schema_overrides).
+    """
+    pipeline_config = get_config(pipeline_config_path)
+    updated = {}
+
+    for workflow in pipeline_config["workflows"]:
+        if workflow_tag and workflow["workflow_tag"] != workflow_tag:
+            continue
+        table_dcs = [
+            dc
+            for dc in workflow["data_collections"]
+            if get_dc_type(dc) == "table" and (not data_collection_tag or dc["data_collection_tag"] == data_collection_tag)
+        ]
+        if not table_dcs:
+            continue
+
+        entries_by_dc = {}
+        for entry in scan_runs(discover_runs(workflow), table_dcs):
+            entries_by_dc.setdefault(entry["data_collection_tag"], []).append(entry)
+
+        for dc in table_dcs:
+            dc_tag = dc["data_collection_tag"]
+            entries = entries_by_dc.get(dc_tag, [])
+            if not entries:
+                logger.warning(f"No files found for data collection {dc_tag}, skipping it.")
+                continue
+
+            result = infer_data_collection_schema(dc, entries, max_files=max_files, n_rows=rows, max_workers=max_workers)
+            for path, error in result["errors"].items():
+                logger.warning(f"{dc_tag}: could not read {path}: {error}")
+            for path, divergence in result["divergent_files"].items():
+                logger.warning(f"{dc_tag}: {path} diverges from the columns of the other files: {divergence}")
+            if result["missing_columns"]:
+                logger.warning(f"{dc_tag}: keep_columns not found in any sampled file: {result['missing_columns']}")
+
+            properties = dc["config"].setdefault("dc_specific_properties", {})
+            polars_kwargs = properties.get("polars_kwargs") or {}
+            # Under the read_csv argument of polars >= 1.0, by dtype name: readers resolve the names with conversion.resolve_dtypes
+            polars_kwargs.pop("dtypes", None)
+            polars_kwargs["schema_overrides"] = result["dtypes"]
+            properties["polars_kwargs"] = polars_kwargs
+            updated[f"{workflow['workflow_tag']}/{dc_tag}"] = {"polars_kwargs": polars_kwargs}
+
+    typer.echo(yaml.safe_dump(updated, sort_keys=False))
+
+    if in_place and updated:
+        with open(pipeline_config_path, "w") as f:
+            yaml.safe_dump(pipeline_config, f, sort_keys=False)
+        logger.info(f"dtypes written to {pipeline_config_path}")
@@ -0,0 +1,152 @@
+import glob
+import os
+from typing import Annotated, List, Optional
+
+import typer
+
+from depictio_cli.logging import logger
+from depictio_cli.scanner import (
+    MANIFEST_EXTENSION,
+    discover_runs,
+    missing_shards,
+    parse_shard,
+    read_partial_manifests,
+    scan_runs,
+    select_shard,
+    shard_manifest_path,
+    write_partial_manifest,
+)
+from depictio_cli.utils import check_workflow_exists, get_config, login_headers, register_files_for_data_collection
+from depictio_cli.work_queue import WorkQueue, log_progress, worker_id
+
+app = typer.Typer()
+
+
+def _select_workflows(pipeline_config_path: str, workflow_tag: Optional[str]) -> List[dict]:
+    workflows = get_config(pipeline_config_path)["workflows"]
+    if workflow_tag:
+        workflows = [workflow for workflow in workflows if workflow["workflow_tag"] == workflow_tag]
+        if not workflows:
+            logger.error(f"Workflow {workflow_tag} not found in {pipeline_config_path}")
+            raise typer.Exit(code=1)
+    return workflows
+
+
+def _workflow_dir(output_dir: str, workflow: dict) -> str:
+    return os.path.join(output_dir, workflow["workflow_tag"].replace("/", "__"))
+
+
+@app.command()
+def plan(
+    pipeline_config_path: Annotated[str, typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")],
+    queue: Annotated[str, typer.Option("--queue", help="Path to the SQLite work queue, on a filesystem shared by the workers")],
+    workflow_tag: Annotated[Optional[str], typer.Option("--workflow-tag", help="Only plan the scan of this workflow")] = None,
+):
+    """
+    Coordinator: list the run directories of the workflows and add them to the shared work queue.
+    """
+    work_queue = WorkQueue(queue)
+    for workflow in _select_workflows(pipeline_config_path, workflow_tag):
+        runs = discover_runs(workflow)
+        added = work_queue.populate(workflow["workflow_tag"], runs)
+        logger.info(f"{workflow['workflow_tag']}: {len(runs)} runs found, {added} added to the queue")
+        log_progress(work_queue, workflow["workflow_tag"])
+
+
+@app.command()
+def worker(
+    pipeline_config_path: Annotated[str, typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")],
+    output_dir: Annotated[str, typer.Option("--output-dir", help="Shared directory where the partial manifests are written")],
+    shard: Annotated[Optional[str], typer.Option("--shard", help="Scan the shard i/n of the run directories")] = None,
+    queue: Annotated[Optional[str], typer.Option("--queue", help="Pull run directories from this SQLite work queue instead of a fixed shard")] = None,
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Number of runs claimed at once from the work queue")] = 10,
+    workflow_tag: Annotated[Optional[str], typer.Option("--workflow-tag", help="Only scan this workflow")] = None,
+):
+    """
+    Worker: scan a part of the run directories and write a partial manifest of the matched files.
+    """
+    if shard and queue:
+        logger.error("--shard and --queue are mutually exclusive.")
+        raise typer.Exit(code=1)
+
+    for workflow in _select_workflows(pipeline_config_path, workflow_tag):
+        workflow_dir = _workflow_dir(output_dir, workflow)
+        data_collections = workflow["data_collections"]
+
+        if queue:
+            work_queue = WorkQueue(queue)
+            worker_name = worker_id()
+            sequence = 0
+            while True:
+                runs = work_queue.claim(workflow["workflow_tag"], worker_name, batch_size=batch_size)
+                if not runs:
+                    break
+                manifest_path = os.path.join(workflow_dir, f"queue-{worker_name}-{sequence:05d}{MANIFEST_EXTENSION}")
+                count = write_partial_manifest(scan_runs(runs, data_collections), manifest_path)
+                work_queue.complete(workflow["workflow_tag"], [run_path for _, run_path in runs], manifest_path)
+                logger.info(f"{len(runs)} runs scanned, {count} files written to {manifest_path}")
+                sequence += 1
+            log_progress(work_queue, workflow["workflow_tag"])
+        else:
+            shard_index, shard_count = parse_shard(shard or "0/1")
+            runs = select_shard(discover_runs(workflow), shard_index, shard_count)
+            manifest_path = shard_manifest_path(workflow_dir, shard_index, shard_count)
+            count = write_partial_manifest(scan_runs(runs, data_collections), manifest_path)
+            logger.info(f"Shard {shard_index}/{shard_count}: {len(runs)} runs scanned, {count} files written to {manifest_path}")
+
+
+@app.command()
+def merge(
+    pipeline_config_path: Annotated[str, typer.Option("--pipeline-config-path", help="Path to the pipeline configuration file")],
+    output_dir: Annotated[str, typer.Option("--output-dir", help="Shared directory where the partial manifests were written")],
+    queue: Annotated[Optional[str], typer.Option("--queue", help="SQLite work queue used by the workers")] = None,
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    workflow_tag: Annotated[Optional[str], typer.Option("--workflow-tag", help="Only merge this workflow")] = None,
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="Merge and report without registering")] = False,
+):
+    """
+    Coordinator: merge the partial manifests once all the workers are done and register the files once per data collection.
+    """
+    workflows = _select_workflows(pipeline_config_path, workflow_tag)
+    if not dry_run:
+        agent_config, headers = login_headers(agent_config_path)
+
+    failed = False
+    for workflow in workflows:
+        workflow_dir = _workflow_dir(output_dir, workflow)
+        if queue:
+            work_queue = WorkQueue(queue)
+            counts = work_queue.progress(workflow["workflow_tag"])
+            if counts["pending"] or counts["claimed"]:
+                log_progress(work_queue, workflow["workflow_tag"])
+                logger.error(f"The scan of {workflow['workflow_tag']} is not complete yet.")
+                raise typer.Exit(code=1)
+            manifests = work_queue.manifests(workflow["workflow_tag"])
+        else:
+            missing = missing_shards(workflow_dir) if os.path.isdir(workflow_dir) else ["all"]
+            if missing:
+                logger.error(f"Missing shards for {workflow['workflow_tag']}: {', '.join(missing)}")
+                raise typer.Exit(code=1)
+            manifests = sorted(glob.glob(os.path.join(workflow_dir, f"shard-*{MANIFEST_EXTENSION}")))
+
+        entries_by_dc = read_partial_manifests(manifests)
+        for dc_tag, entries in entries_by_dc.items():
+            logger.info(f"{workflow['workflow_tag']}/{dc_tag}: {len(entries)} files from {len(manifests)} partial manifests")
+        if dry_run:
+            continue
+
+        exists, registered_workflow = check_workflow_exists(agent_config, workflow, headers)
+        if not exists:
+            logger.error(f"Workflow {workflow['workflow_tag']} is not registered, run 'data setup' first.")
+            raise typer.Exit(code=1)
+        dc_ids = {dc["data_collection_tag"]: str(dc["_id"]) for dc in registered_workflow["data_collections"]}
+        for dc_tag, entries in entries_by_dc.items():
+            if dc_tag not in dc_ids:
+                logger.error(f"Data collection {dc_tag} is not registered for workflow {workflow['workflow_tag']}.")
+                failed = True
+                continue
+            if not register_files_for_data_collection(agent_config, str(registered_workflow["_id"]), dc_ids[dc_tag], entries, headers):
+                failed = True
+
+    if failed:
+        raise typer.Exit(code=1)
@@ -0,0 +1,92 @@
+import signal
+import threading
+from typing import Annotated, List, Optional
+
+import typer
+
+from depictio_cli.logging import logger
+from depictio_cli.spool import DEFAULT_SPOOL_DIR, Spool, file_event, flush_spool
+from depictio_cli.utils import login_headers
+
+app = typer.Typer()
+
+
+@app.command()
+def add(
+    paths: Annotated[List[str], typer.Argument(help="Files that just finished")],
+    workflow_tag: Annotated[str, typer.Option("--workflow-tag", help="Workflow of the files")],
+    data_collection_tag: Annotated[str, typer.Option("--data-collection-tag", help="Data collection of the files")],
+    run_id: Annotated[Optional[str], typer.Option("--run-id", help="Run of the files (default: the run directory containing them)")] = None,
+    spool_dir: Annotated[str, typer.Option("--spool-dir", help="Directory of the local spool")] = DEFAULT_SPOOL_DIR,
+):
+    """
+    Announce finished files: append them to the local spool, without contacting the API. They are registered by the next flush.
+    """
+    spool = Spool(spool_dir)
+    for path in paths:
+        try:
+            spool.add(file_event(workflow_tag, data_collection_tag, path, run_id=run_id))
+        except FileNotFoundError:
+            logger.error(f"{path} does not exist")
+            raise typer.Exit(code=1)
+
+
+@app.command()
+def flush(
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    spool_dir: Annotated[str, typer.Option("--spool-dir", help="Directory of the local spool")] = DEFAULT_SPOOL_DIR,
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Files per registration request")] = 10000,
+):
+    """
+    Register the spooled files, in one bulk registration per data collection.
+    """
+    spool = Spool(spool_dir)
+    if not spool.pending()[0]:
+        logger.info("The spool is empty.")
+        return
+    agent_config, headers = login_headers(agent_config_path)
+    if flush_spool(agent_config, headers, spool, batch_size=batch_size) is False:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def daemon(
+    agent_config_path: Annotated[str, typer.Option("--agent-config-path", help="Path to the agent configuration file")] = "~/.depictio/agent.yaml",
+    spool_dir: Annotated[str, typer.Option("--spool-dir", help="Directory of the local spool")] = DEFAULT_SPOOL_DIR,
+    interval: Annotated[float, typer.Option("--interval", help="Seconds between two flushes")] = 10.0,
+    max_interval: Annotated[float, typer.Option("--max-interval", help="Maximum seconds between two flushes while the API is unavailable")] = 300.0,
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Files per registration request")] = 10000,
+):
+    """
+    Flush the spool periodically until stopped, backing off while the API is unavailable. The spool is flushed a last time on exit.
+    """
+    spool = Spool(spool_dir)
+    agent_config, headers = login_headers(agent_config_path)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    delay = interval
+    logger.info(f"Flushing {spool.root} every {interval:g}s")
+    while True:
+        stopping = stop.wait(delay)
+        if spool.pending()[0]:
+            success = flush_spool(agent_config, headers, spool, batch_size=batch_size)
+            delay = min(delay * 2, max_interval) if success is False else interval
+            if success is False:
+                logger.info(f"Next flush in {delay:g}s")
+        if stopping:
+            break
+
+
+@app.command()
+def status(
+    spool_dir: Annotated[str, typer.Option("--spool-dir", help="Directory of the local spool")] = DEFAULT_SPOOL_DIR,
+):
+    """
+    Show what is waiting in the spool.
+    """
+    spool = Spool(spool_dir)
+    segments, size = spool.pending()
+    events = sum(1 for _ in spool.read_events(spool.segments()))
+    typer.echo(f"{events} events in {segments} segments ({size} bytes) in {spool.root}")
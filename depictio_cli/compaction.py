@@ -0,0 +1,183 @@
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+from depictio_cli.logging import logger
+from depictio_cli.scheduler import get_dc_type
+from depictio_cli.utils import api_request, response_json
+
+MB = 1024 * 1024
+
+
+@dataclass
+class CompactionThresholds:
+    """
+    When compacting a table pays off: at least `min_small_files` files smaller than `small_file_size`, making up at least
+    `min_small_file_ratio` of its files. Small files are rewritten into files of about `target_file_size`.
+    """
+
+    target_file_size: int = 128 * MB
+    small_file_size: int = 32 * MB
+    min_small_files: int = 10
+    min_small_file_ratio: float = 0.2
+
+
+def plan_compaction(files: List[dict], thresholds: CompactionThresholds) -> dict:
+    """
+    Decide whether a table ([{"path", "size"}] data files) should be compacted and group its small files into target-sized rewrites.
+
+    Files are grouped in path order (i.e. roughly in write order), so rewrites keep related rows together.
+    """
+    small_files = sorted((file for file in files if file["size"] < thresholds.small_file_size), key=lambda file: file["path"])
+    plan = {"compact": False, "files": len(files), "small_files": len(small_files), "bytes": sum(file["size"] for file in small_files), "groups": []}
+
+    if len(small_files) < thresholds.min_small_files:
+        return {**plan, "reason": f"{len(small_files)} small files, below the minimum of {thresholds.min_small_files}"}
+    if len(small_files) < thresholds.min_small_file_ratio * len(files):
+        return {**plan, "reason": f"small files are only {len(small_files)} of {len(files)} files"}
+
+    groups, group, group_size = [], [], 0
+    for file in small_files:
+        if group and group_size + file["size"] > thresholds.target_file_size:
+            groups.append(group)
+            group, group_size = [], 0
+        group.append(file["path"])
+        group_size += file["size"]
+    if group:
+        groups.append(group)
+    # Rewriting a single file does not reduce the file count
+    groups = [group for group in groups if len(group) > 1]
+    if not groups:
+        return {**plan, "reason": "no group of small files to merge"}
+
+    rewritten = sum(len(group) for group in groups)
+    return {**plan, "compact": True, "groups": groups, "reason": f"{rewritten} small files into {len(groups)} files"}
+
+
+class LocalTableStore:
+    """
+    Table store backed by a local directory: one sub-directory per table, holding its data files (Parquet, or NDJSON).
+
+    Parquet files are rewritten with polars; NDJSON files (used for testing without polars) are concatenated.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.expanduser(root)
+
+    def list_tables(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def list_files(self, table: str) -> List[dict]:
+        directory = os.path.join(self.root, table)
+        files = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith((".parquet", ".ndjson")):
+                files.append({"path": name, "size": os.path.getsize(os.path.join(directory, name))})
+        return files
+
+    def compact(self, table: str, groups: List[List[str]], target_file_size: Optional[int] = None) -> bool:
+        # Groups are already sized by the plan, target_file_size is only used by the server
+        directory = os.path.join(self.root, table)
+        for group in groups:
+            paths = [os.path.join(directory, name) for name in group]
+            extension = os.path.splitext(group[0])[1]
+            if any(not name.endswith(extension) for name in group):
+                logger.error(f"Cannot compact files of different formats together in {table}: {', '.join(group)}")
+                return False
+            output_path = os.path.join(directory, f"part-{uuid.uuid4().hex}-compacted{extension}")
+            tmp_path = os.path.join(directory, f".{os.path.basename(output_path)}.tmp")
+            if extension == ".parquet":
+                import polars as pl
+
+                pl.concat([pl.read_parquet(path) for path in paths], how="diagonal_relaxed").write_parquet(tmp_path, compression="zstd")
+            else:
+                with open(tmp_path, "wb") as output:
+                    for path in paths:
+                        with open(path, "rb") as f:
+                            data = f.read()
+                        output.write(data if not data or data.endswith(b"\n") else data + b"\n")
+            # The compacted file is complete before the small files are removed, so no row is ever missing
+            os.replace(tmp_path, output_path)
+            for path in paths:
+                os.remove(path)
+        return True
+
+
+class RemoteTableStore:
+    """
+    Delta tables of the data collections of a registered workflow, compacted by the server.
+    """
+
+    def __init__(self, agent_config: dict, workflow_id: str, data_collections: Dict[str, str], headers: dict):
+        self.agent_config = agent_config
+        self.workflow_id = workflow_id
+        # Data collection tag -> id
+        self.data_collections = data_collections
+        self.headers = headers
+
+    def _url(self, action: str, table: str) -> str:
+        if table not in self.data_collections:
+            raise ValueError(f"No delta table for {table} in workflow {self.workflow_id}")
+        return f"{self.agent_config['api_base_url']}/depictio/api/v1/deltatables/{action}/{self.workflow_id}/{self.data_collections[table]}"
+
+    def list_tables(self) -> List[str]:
+        return sorted(self.data_collections)
+
+    def list_files(self, table: str) -> List[dict]:
+        response = api_request("GET", self._url("files", table), headers=self.headers, retries=2)
+        if response.status_code != 200:
+            raise ValueError(f"Cannot list the files of the delta table of {table}: {response.text}")
+        return [{"path": file["path"], "size": file["size"]} for file in response_json(response)]
+
+    def compact(self, table: str, groups: List[List[str]], target_file_size: int = 128 * MB) -> bool:
+        response = api_request(
+            "POST",
+            self._url("optimize", table),
+            json_body={"groups": groups, "target_file_size": target_file_size},
+            headers=self.headers,
+            timeout=60.0 * 30,
+        )
+        if response.status_code != 200:
+            logger.error(f"Error compacting the delta table of {table}: {response.text}")
+            return False
+        return True
+
+
+def workflow_table_store(agent_config: dict, workflow: dict, headers: dict, data_collection_tag: Optional[str] = None) -> RemoteTableStore:
+    """
+    Remote store of the Table data collections of a registered workflow (with its ids).
+    """
+    data_collections = {
+        dc["data_collection_tag"]: str(dc["_id"])
+        for dc in workflow["data_collections"]
+        if get_dc_type(dc) == "table" and (data_collection_tag is None or dc["data_collection_tag"] == data_collection_tag)
+    }
+    return RemoteTableStore(agent_config, str(workflow["_id"]), data_collections, headers)
+
+
+def compact_tables(store, thresholds: CompactionThresholds, tables: Optional[List[str]] = None, dry_run: bool = False) -> bool:
+    """
+    Compact the tables of a store that need it. Returns False if a compaction failed.
+
+    A table that cannot be listed or compacted (unknown table, API error) only fails itself: the other tables are still compacted.
+    """
+    success = True
+    for table in tables or store.list_tables():
+        try:
+            files = store.list_files(table)
+            plan = plan_compaction(files, thresholds)
+            if not plan["compact"]:
+                logger.info(f"{table}: no compaction needed ({plan['reason']})")
+                continue
+            logger.info(f"{table}: compacting {plan['reason']} ({plan['bytes'] / MB:.1f} MB){' [dry run]' if dry_run else ''}")
+            if dry_run:
+                continue
+            compacted = store.compact(table, plan["groups"], target_file_size=thresholds.target_file_size)
+        except (ValueError, OSError, httpx.HTTPError) as e:
+            logger.error(f"{table}: compaction failed: {e}")
+            compacted = False
+        success = compacted and success
+    return success
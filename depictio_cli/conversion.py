@@ -0,0 +1,179 @@
+import hashlib
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+from depictio_cli.journal import compute_config_hash
+from depictio_cli.logging import logger
+from depictio_cli.schema_inference import get_table_read_options
+
+DEFAULT_CACHE_DIR = "~/.depictio/cache/parquet"
+
+
+def get_read_kwargs(dc: dict) -> dict:
+    """
+    Return the polars.read_csv arguments of a Table data collection: its polars_kwargs, with the separator,
+    skipped rows and header resolved, and the kept columns.
+    """
+    properties = dc.get("config", {}).get("dc_specific_properties") or {}
+    options = get_table_read_options(dc)
+    read_kwargs = dict(properties.get("polars_kwargs") or {})
+    read_kwargs.update(separator=options["separator"], skip_rows=options["skip_rows"], has_header=options["has_header"])
+    if options["keep_columns"]:
+        read_kwargs["columns"] = options["keep_columns"]
+    return read_kwargs
+
+
+def resolve_dtypes(read_kwargs: dict) -> dict:
+    """
+    Turn the dtypes of polars_kwargs, given by name in the pipeline configuration (e.g. "Int64", "Utf8"), into polars dtypes,
+    passed under the argument name of the installed polars (`schema_overrides` since polars 1.0, `dtypes` before).
+    """
+    import polars as pl
+
+    read_kwargs = dict(read_kwargs)
+    dtypes = {**(read_kwargs.pop("dtypes", None) or {}), **(read_kwargs.pop("schema_overrides", None) or {})}
+    if not dtypes:
+        return read_kwargs
+    resolved = {}
+    for column, dtype in dtypes.items():
+        if isinstance(dtype, str):
+            if not isinstance(getattr(pl, dtype, None), (type, pl.DataType)):
+                raise ValueError(f"Unknown polars dtype {dtype!r} for column {column!r}")
+            dtype = getattr(pl, dtype)
+        resolved[column] = dtype
+    argument = "schema_overrides" if "schema_overrides" in inspect.signature(pl.read_csv).parameters else "dtypes"
+    read_kwargs[argument] = resolved
+    return read_kwargs
+
+
+def file_signature(stat: os.stat_result) -> List[int]:
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def signature_path(cache_dir: str, path: str, options_hash: str) -> str:
+    key = hashlib.blake2b(f"{os.path.abspath(path)}\0{options_hash}".encode("utf-8"), digest_size=20).hexdigest()
+    return os.path.join(os.path.expanduser(cache_dir), "signatures", key[:2], f"{key}.json")
+
+
+def content_fingerprint(path: str, options_hash: str, chunk_size: int = 1024 * 1024, cache_dir: Optional[str] = None) -> str:
+    """
+    Fingerprint of a file content and of the options it is converted with.
+
+    With `cache_dir`, the fingerprint is recorded with the (size, mtime_ns, inode) of the file, and the content is only
+    read again once one of those changes.
+    """
+    stat = os.stat(path)
+    record_path = signature_path(cache_dir, path, options_hash) if cache_dir else None
+    if record_path:
+        try:
+            with open(record_path) as f:
+                record = json.load(f)
+            if record["signature"] == file_signature(stat):
+                return record["fingerprint"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    digest = hashlib.blake2b(options_hash.encode("utf-8"), digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()
+
+    # Only recorded if the file was not modified while it was read
+    if record_path and file_signature(os.stat(path)) == file_signature(stat):
+        os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        tmp_path = f"{record_path}.tmp.{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump({"signature": file_signature(stat), "fingerprint": fingerprint}, f)
+        os.replace(tmp_path, record_path)
+    return fingerprint
+
+
+def cache_path(cache_dir: str, fingerprint: str) -> str:
+    return os.path.join(os.path.expanduser(cache_dir), fingerprint[:2], f"{fingerprint}.parquet")
+
+
+def convert_file(path: str, parquet_path: str, read_kwargs: dict, compression: str = "zstd") -> dict:
+    """
+    Convert a delimited file to Parquet. The Parquet file only appears once complete (written then renamed).
+    """
+    import polars as pl
+
+    try:
+        df = pl.read_csv(path, **resolve_dtypes(read_kwargs))
+        os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+        tmp_path = f"{parquet_path}.tmp.{os.getpid()}"
+        df.write_parquet(tmp_path, compression=compression)
+        os.replace(tmp_path, parquet_path)
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    return {"path": path, "parquet_path": parquet_path, "rows": df.height, "size": os.path.getsize(parquet_path)}
+
+
+def _convert_file(args) -> dict:
+    return convert_file(*args)
+
+
+def convert_data_collection(
+    dc: dict, paths: Iterable[str], cache_dir: str = DEFAULT_CACHE_DIR, max_workers: int = 4, compression: str = "zstd"
+) -> List[dict]:
+    """
+    Convert the input files of a Table data collection to Parquet in a process pool (requires polars).
+
+    Conversions are cached by content fingerprint, so only new or changed files (or files whose read options changed) are converted.
+    Files whose size, mtime and inode did not change since their last fingerprint are not read again.
+    """
+    if importlib.util.find_spec("polars") is None:
+        raise RuntimeError("polars is required to convert tables to Parquet, install it with `pip install depictio-cli[parquet]`")
+
+    read_kwargs = get_read_kwargs(dc)
+    options_hash = compute_config_hash(read_kwargs, compression)
+    results, to_convert = [], []
+    for path in paths:
+        fingerprint = content_fingerprint(path, options_hash, cache_dir=cache_dir)
+        parquet_path = cache_path(cache_dir, fingerprint)
+        if os.path.exists(parquet_path):
+            results.append({"path": path, "fingerprint": fingerprint, "parquet_path": parquet_path, "size": os.path.getsize(parquet_path), "cached": True})
+        else:
+            to_convert.append((path, fingerprint, parquet_path))
+
+    logger.info(f"{dc['data_collection_tag']}: {len(to_convert)} files to convert to Parquet, {len(results)} already converted")
+    if to_convert:
+        args = [(path, parquet_path, read_kwargs, compression) for path, _, parquet_path in to_convert]
+        # Spawned workers: the conversion runs from the threads of the DAG scheduler, where forking is unsafe
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            converted = executor.map(_convert_file, args, chunksize=max(1, len(args) // (max_workers * 4)))
+            for (_, fingerprint, _), result in zip(to_convert, converted):
+                results.append({**result, "fingerprint": fingerprint, "cached": False})
+    return results
+
+
+def uploaded_marker_path(cache_dir: str, workflow_id: str, data_collection_id: str, fingerprint: str) -> str:
+    return os.path.join(os.path.expanduser(cache_dir), "uploaded", workflow_id, data_collection_id, fingerprint)
+
+
+def is_uploaded(cache_dir: str, workflow_id: str, data_collection_id: str, fingerprint: str) -> bool:
+    return os.path.exists(uploaded_marker_path(cache_dir, workflow_id, data_collection_id, fingerprint))
+
+
+def mark_uploaded(cache_dir: str, workflow_id: str, data_collection_id: str, fingerprint: str) -> None:
+    path = uploaded_marker_path(cache_dir, workflow_id, data_collection_id, fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+def log_conversion_errors(dc_tag: str, results: List[dict], max_examples: int = 5) -> int:
+    errors = [f"{result['path']} ({result['error']})" for result in results if "error" in result]
+    if errors:
+        examples = ", ".join(errors[:max_examples]) + (", ..." if len(errors) > max_examples else "")
+        logger.error(f"{dc_tag}: {len(errors)} of {len(results)} files could not be converted to Parquet: {examples}")
+    return len(errors)
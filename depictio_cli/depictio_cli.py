@@ -1,11 +1,58 @@
 import typer
+from typing import Annotated, List, Optional
 
 from depictio_cli.commands.config import app as config
 from depictio_cli.commands.data import app as data
+from depictio_cli.commands.scan import app as scan
+from depictio_cli.commands.spool import app as spool
+from depictio_cli.http_cache import DEFAULT_HTTP_CACHE_DIR, configure_http_cache
+from depictio_cli.metrics import MetricsWriter, configure_metrics
+from depictio_cli.throttle import DEFAULT_THROTTLE_DIR, configure_throttle, parse_bandwidth_limits
 
 app = typer.Typer()
 app.add_typer(config, name="config")
 app.add_typer(data, name="data")
+app.add_typer(scan, name="scan")
+app.add_typer(spool, name="spool")
+
+
+@app.callback()
+def callback(
+    ctx: typer.Context,
+    no_cache: Annotated[bool, typer.Option("--no-cache", help="Do not use the local cache of API responses")] = False,
+    http_cache_dir: Annotated[str, typer.Option("--http-cache-dir", help="Directory of the local cache of API responses")] = DEFAULT_HTTP_CACHE_DIR,
+    http_cache_size: Annotated[int, typer.Option("--http-cache-size", help="Size of the local cache of API responses, in MB")] = 256,
+    max_bandwidth: Annotated[Optional[float], typer.Option("--max-bandwidth", help="Bandwidth cap of the uploads, in MB/s")] = None,
+    max_host_bandwidth: Annotated[
+        Optional[List[str]], typer.Option("--max-host-bandwidth", help="Bandwidth cap of the uploads to a host, as HOST=MB/s (* for every host), can be repeated")
+    ] = None,
+    throttle_dir: Annotated[
+        str, typer.Option("--throttle-dir", help="Directory of the bandwidth state shared by the concurrent depictio-cli processes")
+    ] = DEFAULT_THROTTLE_DIR,
+    metrics_file: Annotated[
+        Optional[str], typer.Option("--metrics-file", help="Write the metrics of the run to this file (Prometheus textfile collector format, *.prom)")
+    ] = None,
+    metrics_interval: Annotated[
+        Optional[float], typer.Option("--metrics-interval", help="Also write the metrics file every N seconds during the run")
+    ] = None,
+):
+    """
+    Depictio command line interface.
+    """
+    configure_http_cache(enabled=not no_cache, cache_dir=http_cache_dir, max_size=http_cache_size * 1024 * 1024)
+    try:
+        host_bandwidth = parse_bandwidth_limits(max_host_bandwidth or [])
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--max-host-bandwidth")
+    configure_throttle(max_bandwidth * 1024 * 1024 if max_bandwidth else None, host_bandwidth, throttle_dir)
+    if metrics_interval is not None and metrics_interval <= 0:
+        raise typer.BadParameter("must be positive", param_hint="--metrics-interval")
+    registry = configure_metrics(enabled=metrics_file is not None)
+    if registry is not None:
+        writer = MetricsWriter(registry, metrics_file, interval=metrics_interval)
+        writer.start()
+        # Written a last time when the command ends, whether it succeeded or not
+        ctx.call_on_close(writer.stop)
 
 
 def main():
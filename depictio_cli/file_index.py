@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from depictio_cli.journal import _strip_volatile
+from depictio_cli.logging import logger
+
+DEFAULT_INDEX_PATH = "~/.depictio/file_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workflows (
+    workflow_id TEXT PRIMARY KEY,
+    workflow_tag TEXT,
+    name TEXT,
+    engine TEXT,
+    indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS data_collections (
+    data_collection_id TEXT PRIMARY KEY,
+    workflow_id TEXT NOT NULL,
+    data_collection_tag TEXT,
+    type TEXT,
+    indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    workflow_id TEXT NOT NULL,
+    data_collection_id TEXT NOT NULL,
+    run_id TEXT,
+    filename TEXT,
+    file_location TEXT,
+    content_hash TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS file_wildcards (
+    file_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (file_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_workflows_tag ON workflows (workflow_tag);
+CREATE INDEX IF NOT EXISTS idx_data_collections_tag ON data_collections (workflow_id, data_collection_tag);
+CREATE INDEX IF NOT EXISTS idx_files_dc ON files (workflow_id, data_collection_id);
+CREATE INDEX IF NOT EXISTS idx_files_run ON files (run_id);
+CREATE INDEX IF NOT EXISTS idx_file_wildcards_value ON file_wildcards (name, value);
+"""
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _get_id(obj: dict) -> str:
+    return str(obj.get("_id", obj.get("id")))
+
+
+def get_file_wildcards(file: dict) -> Dict[str, str]:
+    """
+    Return the wildcard values of a registered file as a {name: value} dict.
+    """
+    wildcards = file.get("wildcards") or {}
+    if isinstance(wildcards, list):
+        return {str(wildcard["name"]): str(wildcard.get("value")) for wildcard in wildcards if "name" in wildcard}
+    return {str(name): str(value) for name, value in wildcards.items()}
+
+
+class FileIndex:
+    """
+    Local SQLite index of the workflows, data collections and files registered on the server.
+
+    The index is filled as data collections are scanned and lets files be queried by workflow,
+    data collection, run and wildcard values without a network call.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def index_workflow(self, workflow: dict) -> None:
+        """
+        Insert or update a workflow and its data collections.
+        """
+        workflow_id = _get_id(workflow)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workflows VALUES (?, ?, ?, ?, ?)",
+                (workflow_id, workflow.get("workflow_tag"), workflow.get("name"), workflow.get("engine"), _now()),
+            )
+            for dc in workflow.get("data_collections", []):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO data_collections VALUES (?, ?, ?, ?, ?)",
+                    (_get_id(dc), workflow_id, dc.get("data_collection_tag"), str(dc.get("config", {}).get("type", "")).lower(), _now()),
+                )
+
+    def refresh_data_collection_files(self, workflow_id: str, data_collection_id: str, files: Iterable[dict]) -> Dict[str, int]:
+        """
+        Incrementally synchronise the files of a data collection with the given (server-side) file records.
+
+        Only new or modified records are written; records no longer returned are removed.
+        """
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self._lock, self._conn:
+            existing = {
+                row["file_id"]: row["content_hash"]
+                for row in self._conn.execute(
+                    "SELECT file_id, content_hash FROM files WHERE workflow_id = ? AND data_collection_id = ?",
+                    (workflow_id, data_collection_id),
+                )
+            }
+            seen = set()
+            for file in files:
+                file_id = _get_id(file)
+                seen.add(file_id)
+                data = json.dumps(file, sort_keys=True, default=str)
+                # Registration times change on every rescan: they are not part of the content
+                stable_data = json.dumps(_strip_volatile(file), sort_keys=True, default=str)
+                content_hash = hashlib.sha1(stable_data.encode("utf-8")).hexdigest()
+                if existing.get(file_id) == content_hash:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated" if file_id in existing else "added"] += 1
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        file_id,
+                        workflow_id,
+                        data_collection_id,
+                        str(file.get("run_id", file.get("run_tag", ""))),
+                        file.get("filename"),
+                        file.get("file_location"),
+                        content_hash,
+                        data,
+                    ),
+                )
+                self._conn.execute("DELETE FROM file_wildcards WHERE file_id = ?", (file_id,))
+                self._conn.executemany(
+                    "INSERT INTO file_wildcards VALUES (?, ?, ?)",
+                    [(file_id, name, value) for name, value in get_file_wildcards(file).items()],
+                )
+
+            removed = [(file_id,) for file_id in existing if file_id not in seen]
+            self._conn.executemany("DELETE FROM files WHERE file_id = ?", removed)
+            self._conn.executemany("DELETE FROM file_wildcards WHERE file_id = ?", removed)
+            counts["removed"] = len(removed)
+
+        logger.info(f"File index refreshed for data collection {data_collection_id}: {counts}")
+        return counts
+
+    def query_files(
+        self,
+        workflow: Optional[str] = None,
+        data_collection: Optional[str] = None,
+        run_id: Optional[str] = None,
+        wildcards: Optional[Dict[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Return the indexed files matching the filters.
+
+        `workflow` and `data_collection` can be given either as ids or as tags.
+        """
+        query = """
+            SELECT f.file_id, f.run_id, f.filename, f.file_location, f.content_hash, f.data_collection_id, d.data_collection_tag, w.workflow_tag
+            FROM files f
+            LEFT JOIN data_collections d ON d.data_collection_id = f.data_collection_id
+            LEFT JOIN workflows w ON w.workflow_id = f.workflow_id
+            WHERE 1 = 1
+        """
+        params: list = []
+        if workflow:
+            query += " AND (f.workflow_id = ? OR w.workflow_tag = ? OR w.name = ?)"
+            params += [workflow, workflow, workflow]
+        if data_collection:
+            query += " AND (f.data_collection_id = ? OR d.data_collection_tag = ?)"
+            params += [data_collection, data_collection]
+        if run_id:
+            query += " AND f.run_id = ?"
+            params.append(run_id)
+        for name, value in (wildcards or {}).items():
+            query += " AND EXISTS (SELECT 1 FROM file_wildcards fw WHERE fw.file_id = f.file_id AND fw.name = ? AND fw.value = ?)"
+            params += [name, value]
+        query += " ORDER BY f.run_id, f.file_location"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            file_ids = [row["file_id"] for row in rows]
+            file_wildcards: Dict[str, Dict[str, str]] = {}
+            for start in range(0, len(file_ids), 500):
+                chunk = file_ids[start : start + 500]
+                for row in self._conn.execute(
+                    f"SELECT file_id, name, value FROM file_wildcards WHERE file_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    file_wildcards.setdefault(row["file_id"], {})[row["name"]] = row["value"]
+
+        return [dict(row, wildcards=file_wildcards.get(row["file_id"], {})) for row in rows]
+
+    def content_digest(self, workflow_id: str, data_collection_id: str) -> Optional[str]:
+        """
+        Digest of the content hashes of the indexed files of a data collection, None when none is indexed.
+        """
+        digest = hashlib.sha256()
+        count = 0
+        with self._lock:
+            for row in self._conn.execute(
+                "SELECT file_location, content_hash FROM files WHERE workflow_id = ? AND data_collection_id = ? ORDER BY file_location, file_id",
+                (workflow_id, data_collection_id),
+            ):
+                digest.update(f"{row['file_location']}\0{row['content_hash']}\n".encode("utf-8"))
+                count += 1
+        return digest.hexdigest() if count else None
+
+    def list_workflows(self) -> List[dict]:
+        """
+        Return the indexed workflows with their number of data collections and files.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT w.workflow_id, w.workflow_tag, w.name, w.engine, w.indexed_at,
+                    (SELECT COUNT(*) FROM data_collections d WHERE d.workflow_id = w.workflow_id) AS data_collections,
+                    (SELECT COUNT(*) FROM files f WHERE f.workflow_id = w.workflow_id) AS files
+                FROM workflows w
+                ORDER BY w.workflow_tag
+                """
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
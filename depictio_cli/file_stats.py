@@ -0,0 +1,137 @@
+import mmap
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from depictio_cli.logging import logger
+from depictio_cli.schema_inference import get_table_read_options, open_text
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def _count_lines_gzip(path: str, n_head_lines: int) -> Tuple[int, bool, List[bytes]]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    newlines, last_byte, head = 0, b"", b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data = decompressor.decompress(chunk)
+            if data:
+                newlines += data.count(b"\n")
+                last_byte = data[-1:]
+                if len(head) < 1024 * 1024:
+                    head += data[: 1024 * 1024]
+    data = decompressor.flush()
+    if data:
+        newlines += data.count(b"\n")
+        last_byte = data[-1:]
+    return newlines, last_byte in (b"", b"\n"), head.split(b"\n")[:n_head_lines]
+
+
+def count_lines(path: str, n_head_lines: int = 0) -> Tuple[int, bool, List[bytes]]:
+    """
+    Count the newlines of a file in bulk (memory-mapped, or streamed for gzip files).
+
+    Returns the newline count, whether the file ends with a newline (or is empty) and its first `n_head_lines` lines.
+    """
+    if path.endswith(".gz"):
+        return _count_lines_gzip(path, n_head_lines)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0, True, []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            newlines = 0
+            for start in range(0, size, CHUNK_SIZE):
+                newlines += mm[start : start + CHUNK_SIZE].count(b"\n")
+            head, position = [], 0
+            while len(head) < n_head_lines and position < size:
+                end = mm.find(b"\n", position)
+                end = size if end == -1 else end
+                head.append(mm[position:end])
+                position = end + 1
+            return newlines, mm[size - 1 : size] == b"\n", head
+
+
+def split_header(line: str, separator: str) -> List[str]:
+    return [column.strip().strip('"') for column in line.rstrip("\r\n").split(separator)]
+
+
+def parse_header(line: bytes, separator: str) -> List[str]:
+    return split_header(line.decode("utf-8", errors="replace"), separator)
+
+
+def read_header(path: str, separator: str = "\t", skip_rows: int = 0) -> Optional[List[str]]:
+    """
+    Read the header columns of a delimited file (None if the file cannot be read or is empty).
+    """
+    try:
+        with open_text(path) as f:
+            for _ in range(skip_rows):
+                f.readline()
+            line = f.readline()
+    except (OSError, UnicodeDecodeError):
+        return None
+    return split_header(line, separator) if line else None
+
+
+def compute_file_stats(path: str, separator: str = "\t", skip_rows: int = 0, has_header: bool = True, keep_columns: Optional[List[str]] = None) -> dict:
+    """
+    Row count, size and header check of a delimited file, without parsing it.
+
+    A file not ending with a newline is flagged as possibly truncated.
+    """
+    try:
+        size = os.path.getsize(path)
+        newlines, ends_with_newline, head = count_lines(path, n_head_lines=skip_rows + 1)
+    except (OSError, ValueError, zlib.error) as e:
+        return {"path": path, "error": str(e)}
+
+    lines = newlines + (0 if ends_with_newline else 1)
+    rows = max(0, lines - skip_rows - (1 if has_header else 0))
+    stats = {"path": path, "size": size, "rows": rows, "truncated": not ends_with_newline}
+    if has_header:
+        columns = parse_header(head[skip_rows], separator) if len(head) > skip_rows else []
+        stats["columns"] = columns
+        stats["missing_columns"] = [column for column in keep_columns or [] if column not in columns]
+    return stats
+
+
+def compute_data_collection_stats(dc: dict, paths: Iterable[str], max_workers: int = 8) -> Dict[str, dict]:
+    """
+    Compute the stats of the input files of a Table data collection in a thread pool.
+    """
+    options = get_table_read_options(dc)
+    paths = list(paths)
+
+    def compute(path: str) -> dict:
+        return compute_file_stats(path, options["separator"], options["skip_rows"], options["has_header"], options["keep_columns"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stats = {item["path"]: item for item in executor.map(compute, paths)}
+
+    log_stats_problems(dc["data_collection_tag"], stats)
+    return stats
+
+
+def log_stats_problems(dc_tag: str, stats: Dict[str, dict], max_examples: int = 5) -> None:
+    """
+    Log one warning per kind of problem found in the files of a data collection, with a few example paths.
+    """
+    problems: Dict[str, List[str]] = {}
+    for path, item in stats.items():
+        if "error" in item:
+            problems.setdefault("cannot be read", []).append(f"{path} ({item['error']})")
+            continue
+        if item["truncated"]:
+            problems.setdefault("do not end with a newline (possibly truncated)", []).append(path)
+        if item.get("missing_columns"):
+            problems.setdefault("miss some of the keep_columns", []).append(f"{path} ({', '.join(item['missing_columns'])})")
+        if item["rows"] == 0:
+            problems.setdefault("have no data rows", []).append(path)
+    for problem, paths in problems.items():
+        examples = ", ".join(paths[:max_examples]) + (", ..." if len(paths) > max_examples else "")
+        logger.warning(f"{dc_tag}: {len(paths)} of {len(stats)} files {problem}: {examples}")
@@ -0,0 +1,354 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, ContextManager, Dict, Iterator, Optional
+
+import httpx
+
+from depictio_cli.logging import logger
+
+DEFAULT_HTTP_CACHE_DIR = "~/.depictio/cache/http"
+DEFAULT_MAX_HTTP_CACHE_SIZE = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+# Response headers kept with a cached body (the body is stored decoded)
+STORED_HEADERS = ["content-type", "etag", "last-modified", "cache-control"]
+
+
+def cache_scope(agent_config: dict) -> str:
+    """
+    Digest of the server and user of an agent configuration, scoping cached responses and tables.
+    """
+    key = f"{agent_config['api_base_url'].rstrip('/')}\0{agent_config['user']['email']}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(url: str, params: Optional[dict], headers: Optional[dict], user: Optional[str] = None) -> str:
+    """
+    Key of a GET request: its URL, its parameters and the user it is sent for, so responses are never shared between users.
+
+    The user is its cache_scope when known, which survives token refreshes; otherwise a digest of the request credentials.
+    """
+    if user is None:
+        user = hashlib.sha256((headers or {}).get("Authorization", "").encode("utf-8")).hexdigest()
+    params = sorted((str(name), str(value)) for name, value in (params or {}).items())
+    return hashlib.sha256(json.dumps([url, params, user]).encode("utf-8")).hexdigest()
+
+
+def _cache_control(response: httpx.Response) -> Dict[str, str]:
+    directives = {}
+    for directive in response.headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _expires_at(response: httpx.Response) -> Optional[float]:
+    max_age = _cache_control(response).get("max-age")
+    try:
+        return time.time() + int(max_age) if max_age else None
+    except ValueError:
+        return None
+
+
+def is_cacheable(response: httpx.Response) -> bool:
+    """
+    Only successful responses that can be revalidated (ETag, Last-Modified) or have a lifetime (max-age) are cached.
+    """
+    directives = _cache_control(response)
+    if response.status_code != 200 or "no-store" in directives:
+        return False
+    return bool(response.headers.get("etag") or response.headers.get("last-modified") or directives.get("max-age"))
+
+
+def _response(status_code: int, headers, content: bytes, request: Optional[httpx.Request]) -> httpx.Response:
+    # The content is already decoded: drop the headers describing the encoded body
+    headers = {name: value for name, value in dict(headers).items() if name.lower() not in ["content-encoding", "content-length", "transfer-encoding"]}
+    return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[httpx.Response] = None
+        self.error: Optional[BaseException] = None
+
+
+class HTTPCache:
+    """
+    Disk cache of GET responses, revalidated with If-None-Match / If-Modified-Since so an unchanged response costs
+    a 304 instead of its full body (or no request at all within its max-age).
+
+    Bodies are stored as files indexed in SQLite; beyond `max_size`, the least recently used responses are evicted.
+    Concurrent identical requests share a single in-flight fetch.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_HTTP_CACHE_DIR, max_size: int = DEFAULT_MAX_HTTP_CACHE_SIZE):
+        self.root = os.path.expanduser(cache_dir)
+        self.max_size = max_size
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "coalesced": 0}
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.body")
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return the cached entry of a request, if its body is still on disk.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or not os.path.exists(self._body_path(key)):
+            return None
+        return dict(row, headers=json.loads(row["headers"]))
+
+    def touch(self, key: str, expires_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE responses SET last_used = ?, expires_at = COALESCE(?, expires_at) WHERE key = ?", (time.time(), expires_at, key))
+            self._conn.commit()
+
+    def _commit(self, key: str, url: str, response: httpx.Response, tmp_path: str) -> None:
+        # The body only replaces the cached one once complete
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, status_code, headers, etag, last_modified, expires_at, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    response.status_code,
+                    json.dumps(headers),
+                    response.headers.get("etag"),
+                    response.headers.get("last-modified"),
+                    _expires_at(response),
+                    os.path.getsize(path),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.root, f".{uuid.uuid4().hex}.tmp")
+
+    def store(self, key: str, url: str, response: httpx.Response) -> None:
+        tmp_path = self._tmp_path()
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+        self._commit(key, url, response, tmp_path)
+
+    def evict(self) -> None:
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_size:
+                return
+            evicted = []
+            for row in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                if total <= self.max_size:
+                    break
+                evicted.append(row["key"])
+                total -= row["size"]
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in evicted])
+            self._conn.commit()
+        for key in evicted:
+            try:
+                os.remove(self._body_path(key))
+            except FileNotFoundError:
+                pass
+        logger.debug(f"Evicted {len(evicted)} responses from the HTTP cache")
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = [row["key"] for row in self._conn.execute("SELECT key FROM responses").fetchall()]
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+        for key in keys:
+            try:
+                os.remove(self._body_path(key))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _is_fresh(entry: Optional[dict]) -> bool:
+        return entry is not None and entry["expires_at"] is not None and time.time() < entry["expires_at"]
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[dict], headers: Optional[dict]) -> dict:
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+        return request_headers
+
+    def _read(self, key: str, entry: dict, request: Optional[httpx.Request] = None) -> httpx.Response:
+        with open(self._body_path(key), "rb") as f:
+            content = f.read()
+        return _response(entry["status_code"], entry["headers"], content, request)
+
+    def _fetch(self, key: str, url: str, headers: Optional[dict], send: Callable[[dict], httpx.Response]) -> httpx.Response:
+        entry = self.get(key)
+        if self._is_fresh(entry):
+            self.stats["hits"] += 1
+            self.touch(key)
+            return self._read(key, entry)
+
+        response = send(self._conditional_headers(entry, headers))
+        if response.status_code == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            self.touch(key, expires_at=_expires_at(response))
+            return self._read(key, entry, response.request)
+
+        self.stats["misses"] += 1
+        if is_cacheable(response):
+            self.store(key, url, response)
+        return response
+
+    def request(
+        self, url: str, params: Optional[dict], headers: Optional[dict], send: Callable[[dict], httpx.Response], user: Optional[str] = None
+    ) -> httpx.Response:
+        """
+        Send a GET request through the cache. `send` sends it with the given headers (adding the validators of the cached response).
+        """
+        key = cache_key(url, params, headers, user)
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[key] = _InFlight()
+
+        if not leader:
+            in_flight.done.wait()
+            self.stats["coalesced"] += 1
+            if in_flight.error is not None:
+                raise in_flight.error
+            response = in_flight.response
+            return _response(response.status_code, response.headers, response.content, response.request)
+
+        try:
+            in_flight.response = self._fetch(key, url, headers, send)
+            return in_flight.response
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.done.set()
+
+    def stream(
+        self,
+        url: str,
+        params: Optional[dict],
+        headers: Optional[dict],
+        open_stream: Callable[[dict], ContextManager[httpx.Response]],
+        chunk_size: int = 1024 * 1024,
+        user: Optional[str] = None,
+    ) -> Iterator[bytes]:
+        """
+        Yield the body of a GET response in chunks, from the cache when unchanged. Bodies downloaded in full are cached
+        as they stream, and only once complete.
+        """
+        key = cache_key(url, params, headers, user)
+        entry = self.get(key)
+        if self._is_fresh(entry):
+            self.stats["hits"] += 1
+            self.touch(key)
+            yield from self._iter_body(key, chunk_size)
+            return
+
+        with open_stream(self._conditional_headers(entry, headers)) as response:
+            if response.status_code == 304 and entry is not None:
+                self.stats["revalidated"] += 1
+                self.touch(key, expires_at=_expires_at(response))
+                yield from self._iter_body(key, chunk_size)
+                return
+            if response.status_code != 200:
+                response.read()
+                raise httpx.HTTPStatusError(message=f"Error fetching {url}: {response.text}", request=response.request, response=response)
+
+            self.stats["misses"] += 1
+            if not is_cacheable(response):
+                yield from response.iter_bytes()
+                return
+            tmp_path = self._tmp_path()
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_bytes():
+                        f.write(chunk)
+                        yield chunk
+                self._commit(key, url, response, tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _iter_body(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        with open(self._body_path(key), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+_http_cache: Optional[HTTPCache] = None
+_http_cache_settings = {"enabled": True, "cache_dir": DEFAULT_HTTP_CACHE_DIR, "max_size": DEFAULT_MAX_HTTP_CACHE_SIZE}
+_http_cache_lock = threading.Lock()
+
+
+def configure_http_cache(enabled: bool = True, cache_dir: str = DEFAULT_HTTP_CACHE_DIR, max_size: int = DEFAULT_MAX_HTTP_CACHE_SIZE) -> None:
+    global _http_cache
+    with _http_cache_lock:
+        _http_cache_settings.update(enabled=enabled, cache_dir=cache_dir, max_size=max_size)
+        _http_cache = None
+
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """
+    Return the shared HTTP cache, or None when it is disabled (--no-cache) or cannot be opened.
+    """
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None and _http_cache_settings["enabled"]:
+            try:
+                _http_cache = HTTPCache(_http_cache_settings["cache_dir"], _http_cache_settings["max_size"])
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"HTTP cache disabled, cannot open {_http_cache_settings['cache_dir']}: {e}")
+                _http_cache_settings["enabled"] = False
+        return _http_cache
+
+
+def get_open_http_cache() -> Optional[HTTPCache]:
+    """
+    Return the shared HTTP cache if a request already opened it, without opening it.
+    """
+    return _http_cache
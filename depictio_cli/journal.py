@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Optional
+
+from depictio_cli.logging import logger
+
+DEFAULT_JOURNAL_PATH = "~/.depictio/journal.sqlite"
+
+# Keys that change on every registration without changing the content
+VOLATILE_KEYS = {"registration_time"}
+
+
+def _strip_volatile(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: _strip_volatile(v) for k, v in obj.items() if k not in VOLATILE_KEYS}
+    if isinstance(obj, list):
+        return [_strip_volatile(v) for v in obj]
+    return obj
+
+
+def compute_config_hash(*objects: Any) -> str:
+    """
+    Compute a stable hash of the given (JSON-like) objects, ignoring volatile keys.
+    """
+    payload = json.dumps([_strip_volatile(obj) for obj in objects], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    SQLite-backed journal of the completed (workflow, data collection, stage) units of a setup run.
+
+    An entry is only considered valid for a later run if the hash of its inputs is unchanged.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completed_stages (
+                workflow TEXT NOT NULL,
+                data_collection TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                config_hash TEXT NOT NULL,
+                result TEXT,
+                duration REAL,
+                completed_at TEXT NOT NULL,
+                PRIMARY KEY (workflow, data_collection, stage)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, workflow: str, data_collection: str, stage: str, config_hash: str) -> Optional[dict]:
+        """
+        Return the journal entry of a completed stage if its inputs did not change, None otherwise.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, duration, completed_at FROM completed_stages WHERE workflow = ? AND data_collection = ? AND stage = ? AND config_hash = ?",
+                (workflow, data_collection, stage, config_hash),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"result": json.loads(row[0]) if row[0] else None, "duration": row[1], "completed_at": row[2]}
+
+    def is_completed(self, workflow: str, data_collection: str, stage: str, config_hash: str) -> bool:
+        return self.get(workflow, data_collection, stage, config_hash) is not None
+
+    def record(self, workflow: str, data_collection: str, stage: str, config_hash: str, result: Any = None, duration: Optional[float] = None) -> None:
+        """
+        Record a completed stage, replacing any previous entry.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completed_stages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    workflow,
+                    data_collection,
+                    stage,
+                    config_hash,
+                    json.dumps(result, default=str) if result is not None else None,
+                    duration,
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                ),
+            )
+            self._conn.commit()
+        logger.debug(f"Journal: recorded {workflow}/{data_collection}/{stage}")
+
+    def invalidate(self, workflow: str, data_collection: Optional[str] = None, stage: Optional[str] = None) -> None:
+        """
+        Remove the entries of a workflow, optionally restricted to a data collection and stage.
+        """
+        query = "DELETE FROM completed_stages WHERE workflow = ?"
+        params = [workflow]
+        if data_collection is not None:
+            query += " AND data_collection = ?"
+            params.append(data_collection)
+        if stage is not None:
+            query += " AND stage = ?"
+            params.append(stage)
+        with self._lock:
+            self._conn.execute(query, params)
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
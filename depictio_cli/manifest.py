@@ -0,0 +1,386 @@
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+MAGIC = b"DPMF"
+VERSION = 1
+
+# Code of a missing wildcard value
+MISSING = -1
+
+# A wildcard column is stored as plain strings once it has more than this many distinct values and they
+# make up more than half of the rows (e.g. one value per cell): a dictionary would only add overhead
+MAX_DICTIONARY_SIZE = 4096
+
+
+class _Dictionary:
+    """
+    Dictionary encoding of a string column: distinct values plus one int32 code per row.
+    """
+
+    def __init__(self, values: Optional[List[str]] = None, codes: Optional[array] = None):
+        self.values: List[str] = values or []
+        self.index: Dict[str, int] = {value: i for i, value in enumerate(self.values)}
+        self.codes = codes if codes is not None else array("i")
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return MISSING
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value: Optional[str]) -> None:
+        self.codes.append(self.code(value))
+
+    def get(self, i: int) -> Optional[str]:
+        code = self.codes[i]
+        return None if code == MISSING else self.values[code]
+
+
+class _Strings:
+    """
+    Plain string column: the UTF-8 values concatenated in one buffer, with offsets and a validity byte per row.
+    """
+
+    def __init__(self, data: Optional[bytearray] = None, offsets: Optional[array] = None, valid: Optional[bytearray] = None):
+        self.data = data if data is not None else bytearray()
+        self.offsets = offsets if offsets is not None else array("I", [0])
+        self.valid = valid if valid is not None else bytearray()
+
+    @classmethod
+    def from_dictionary(cls, column: _Dictionary) -> "_Strings":
+        strings = cls()
+        for i in range(len(column.codes)):
+            strings.append(column.get(i))
+        return strings
+
+    def append(self, value: Optional[str]) -> None:
+        if value is not None:
+            self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+        self.valid.append(value is not None)
+
+    def get(self, i: int) -> Optional[str]:
+        if not self.valid[i]:
+            return None
+        return self.data[self.offsets[i] : self.offsets[i + 1]].decode("utf-8")
+
+
+class Manifest:
+    """
+    Columnar manifest of discovered files, for millions of files on scan nodes.
+
+    Directories are interned, file names are stored in one bytes buffer with offsets, sizes and mtimes in
+    typed arrays and run ids, run directories, data collection tags and wildcard values are dictionary-encoded.
+    A file costs a few tens of bytes instead of several hundred for a dict.
+    """
+
+    def __init__(self):
+        self.directories = _Dictionary()
+        self.names = bytearray()
+        self.name_offsets = array("I", [0])
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.runs = _Dictionary()
+        self.run_paths = _Dictionary()
+        self.data_collections = _Dictionary()
+        self.wildcards: Dict[str, Union[_Dictionary, _Strings]] = {}
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def append(
+        self,
+        data_collection_tag: str,
+        run_id: str,
+        path: str,
+        size: int,
+        mtime: float,
+        wildcards: Optional[Dict[str, str]] = None,
+        run_path: Optional[str] = None,
+    ) -> None:
+        directory, name = os.path.split(path)
+        row = len(self)
+        self.directories.append(directory)
+        self.names += name.encode("utf-8")
+        self.name_offsets.append(len(self.names))
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.runs.append(run_id)
+        self.run_paths.append(run_path)
+        self.data_collections.append(data_collection_tag)
+
+        wildcards = wildcards or {}
+        for wildcard_name in wildcards:
+            if wildcard_name not in self.wildcards:
+                # Rows added before this wildcard first appeared have no value for it
+                self.wildcards[wildcard_name] = _Dictionary(codes=array("i", [MISSING]) * row)
+        for wildcard_name, column in self.wildcards.items():
+            column.append(wildcards.get(wildcard_name))
+            if isinstance(column, _Dictionary) and len(column.values) > MAX_DICTIONARY_SIZE and 2 * len(column.values) > row + 1:
+                self.wildcards[wildcard_name] = _Strings.from_dictionary(column)
+
+    def extend(self, entries: Iterable[dict]) -> "Manifest":
+        for entry in entries:
+            self.append(
+                entry["data_collection_tag"], entry["run_id"], entry["path"], entry["size"], entry["mtime"], entry.get("wildcards"), entry.get("run_path")
+            )
+        return self
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict]) -> "Manifest":
+        return cls().extend(entries)
+
+    def path(self, i: int) -> str:
+        name = self.names[self.name_offsets[i] : self.name_offsets[i + 1]].decode("utf-8")
+        return os.path.join(self.directories.get(i), name)
+
+    def run_path(self, i: int) -> Optional[str]:
+        """
+        Return the run directory a file was found in (None for manifests written without it).
+        """
+        return self.run_paths.get(i)
+
+    def entry(self, i: int) -> dict:
+        wildcards = {}
+        for name, column in self.wildcards.items():
+            value = column.get(i)
+            if value is not None:
+                wildcards[name] = value
+        return {
+            "data_collection_tag": self.data_collections.get(i),
+            "run_id": self.runs.get(i),
+            "path": self.path(i),
+            "size": self.sizes[i],
+            "mtime": self.mtimes[i],
+            "wildcards": wildcards,
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.entry(i)
+
+    def paths(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.path(i)
+
+    def slice(self, start: int, stop: int) -> "ManifestSlice":
+        return ManifestSlice(self, start, min(stop, len(self)))
+
+    def batches(self, batch_size: int) -> Iterator["ManifestSlice"]:
+        """
+        Split the manifest into consecutive slices of at most `batch_size` files, without copying it.
+        """
+        for start in range(0, len(self), batch_size):
+            yield self.slice(start, start + batch_size)
+
+    def split_by_data_collection(self) -> Dict[str, "Manifest"]:
+        """
+        Return one manifest per data collection, so each one can be sliced into contiguous upload batches.
+        """
+        manifests: Dict[str, Manifest] = {}
+        for i in range(len(self)):
+            manifests.setdefault(self.data_collections.get(i), Manifest()).append_from(self, i)
+        return manifests
+
+    def append_from(self, other: "Manifest", i: int) -> None:
+        wildcards = {name: column.get(i) for name, column in other.wildcards.items() if column.get(i) is not None}
+        self.append(other.data_collections.get(i), other.runs.get(i), other.path(i), other.sizes[i], other.mtimes[i], wildcards, other.run_path(i))
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the columns (excluding the dictionaries of distinct values).
+        """
+        return len(self.names) + sum(a.itemsize * len(a) for _, a in self._arrays())
+
+    def _arrays(self) -> List[tuple]:
+        arrays = [
+            ("directories", self.directories.codes),
+            ("name_offsets", self.name_offsets),
+            ("sizes", self.sizes),
+            ("mtimes", self.mtimes),
+            ("runs", self.runs.codes),
+            ("run_paths", self.run_paths.codes),
+            ("data_collections", self.data_collections.codes),
+        ]
+        for name, column in self.wildcards.items():
+            if isinstance(column, _Dictionary):
+                arrays.append((f"wildcard:{name}", column.codes))
+            else:
+                arrays += [
+                    (f"wildcard:{name}:offsets", column.offsets),
+                    (f"wildcard:{name}:data", array("B", column.data)),
+                    (f"wildcard:{name}:valid", array("B", column.valid)),
+                ]
+        return arrays
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialise the manifest to a compact binary format: a JSON header (dictionaries, array layout) followed by the raw columns.
+        """
+        arrays = self._arrays()
+        header = {
+            "count": len(self),
+            "byteorder": sys.byteorder,
+            "dictionaries": {
+                "directories": self.directories.values,
+                "runs": self.runs.values,
+                "run_paths": self.run_paths.values,
+                "data_collections": self.data_collections.values,
+                **{f"wildcard:{name}": column.values for name, column in self.wildcards.items() if isinstance(column, _Dictionary)},
+            },
+            "wildcards": list(self.wildcards),
+            "arrays": [[name, a.typecode, len(a)] for name, a in arrays] + [["names", "B", len(self.names)]],
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        parts = [struct.pack("<4sII", MAGIC, VERSION, len(header_bytes)), header_bytes]
+        parts += [a.tobytes() for _, a in arrays]
+        parts.append(bytes(self.names))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Manifest":
+        magic, version, header_length = struct.unpack_from("<4sII", data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a depictio manifest (or unsupported version)")
+        offset = struct.calcsize("<4sII")
+        header = json.loads(data[offset : offset + header_length])
+        offset += header_length
+
+        view = memoryview(data)
+        columns = {}
+        for name, typecode, length in header["arrays"]:
+            column = array(typecode)
+            nbytes = column.itemsize * length
+            column.frombytes(view[offset : offset + nbytes])
+            if header["byteorder"] != sys.byteorder and column.itemsize > 1:
+                column.byteswap()
+            columns[name] = column
+            offset += nbytes
+
+        manifest = cls()
+        dictionaries = header["dictionaries"]
+        manifest.directories = _Dictionary(dictionaries["directories"], columns["directories"])
+        manifest.name_offsets = columns["name_offsets"]
+        manifest.names = bytearray(columns["names"].tobytes())
+        manifest.sizes = columns["sizes"]
+        manifest.mtimes = columns["mtimes"]
+        manifest.runs = _Dictionary(dictionaries["runs"], columns["runs"])
+        # Manifests written before run directories were recorded have none
+        if "run_paths" in columns:
+            manifest.run_paths = _Dictionary(dictionaries["run_paths"], columns["run_paths"])
+        else:
+            manifest.run_paths = _Dictionary(codes=array("i", [MISSING]) * header["count"])
+        manifest.data_collections = _Dictionary(dictionaries["data_collections"], columns["data_collections"])
+        for name in header["wildcards"]:
+            key = f"wildcard:{name}"
+            if key in dictionaries:
+                manifest.wildcards[name] = _Dictionary(dictionaries[key], columns[key])
+            else:
+                data, valid = (bytearray(columns[f"{key}:{part}"].tobytes()) for part in ["data", "valid"])
+                manifest.wildcards[name] = _Strings(data, columns[f"{key}:offsets"], valid)
+        return manifest
+
+    def to_arrow(self):
+        """
+        Convert the manifest to a pyarrow Table with dictionary-encoded columns (requires pyarrow).
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        def large_offsets(offsets: array):
+            return pa.array(offsets, type=pa.int64()).buffers()[1]
+
+        def dictionary_column(column: Union[_Dictionary, _Strings]):
+            if isinstance(column, _Strings):
+                validity = pa.array([bool(valid) for valid in column.valid], type=pa.bool_()).buffers()[1]
+                return pa.LargeStringArray.from_buffers(len(column.offsets) - 1, large_offsets(column.offsets), pa.py_buffer(column.data), validity)
+            codes = pa.array(column.codes, type=pa.int32())
+            codes = pc.if_else(pc.equal(codes, MISSING), pa.nulls(len(codes), pa.int32()), codes)
+            return pa.DictionaryArray.from_arrays(codes, pa.array(column.values, type=pa.string()))
+
+        columns = {
+            "directory": dictionary_column(self.directories),
+            "name": pa.LargeStringArray.from_buffers(len(self), large_offsets(self.name_offsets), pa.py_buffer(self.names)),
+            "size": pa.array(self.sizes, type=pa.int64()),
+            "mtime": pa.array(self.mtimes, type=pa.float64()),
+            "run_id": dictionary_column(self.runs),
+            "run_path": dictionary_column(self.run_paths),
+            "data_collection_tag": dictionary_column(self.data_collections),
+        }
+        for name, column in self.wildcards.items():
+            columns[f"wildcard:{name}"] = dictionary_column(column)
+        return pa.table(columns)
+
+    def write(self, path: str) -> None:
+        """
+        Write the manifest atomically, as Arrow IPC if the path ends with .arrow (requires pyarrow), in the binary format otherwise.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        if path.endswith(".arrow"):
+            import pyarrow as pa
+
+            table = self.to_arrow()
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def read(cls, path: str) -> "Manifest":
+        if path.endswith(".arrow"):
+            import pyarrow as pa
+
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            manifest = cls()
+            wildcard_columns = [name for name in table.column_names if name.startswith("wildcard:")]
+            for row in table.to_pylist():
+                wildcards = {name.split(":", 1)[1]: row[name] for name in wildcard_columns if row[name] is not None}
+                path_ = os.path.join(row["directory"], row["name"])
+                manifest.append(row["data_collection_tag"], row["run_id"], path_, row["size"], row["mtime"], wildcards, row.get("run_path"))
+            return manifest
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class ManifestSlice:
+    """
+    Zero-copy view on consecutive rows of a manifest, used as an upload batch.
+    """
+
+    def __init__(self, manifest: Manifest, start: int, stop: int):
+        self.manifest = manifest
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(self.start, self.stop):
+            yield self.manifest.entry(i)
+
+    @property
+    def sizes(self) -> memoryview:
+        return memoryview(self.manifest.sizes)[self.start : self.stop]
+
+    @property
+    def mtimes(self) -> memoryview:
+        return memoryview(self.manifest.mtimes)[self.start : self.stop]
+
+    def paths(self) -> Iterator[str]:
+        for i in range(self.start, self.stop):
+            yield self.manifest.path(i)
+
+    def to_records(self) -> List[dict]:
+        return list(self)
@@ -0,0 +1,249 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from depictio_cli.logging import logger
+
+# Name: (type, help)
+METRICS = {
+    "depictio_run_start_time_seconds": ("gauge", "Start time of the run, in seconds since the epoch"),
+    "depictio_run_duration_seconds": ("gauge", "Time elapsed since the start of the run when the metrics were written"),
+    "depictio_metrics_write_time_seconds": ("gauge", "Time the metrics were last written, in seconds since the epoch"),
+    "depictio_workflow_success": ("gauge", "Whether the last processing of a workflow succeeded"),
+    "depictio_stage_duration_seconds": ("gauge", "Duration of the last run of a data collection stage"),
+    "depictio_stage_runs_total": ("counter", "Data collection stages run, by stage and status"),
+    "depictio_stage_seconds_total": ("counter", "Total time spent in data collection stages, by stage"),
+    "depictio_files_scanned_total": ("counter", "Files scanned, by data collection"),
+    "depictio_requests_total": ("counter", "API requests, by method, endpoint and status (error: no response)"),
+    "depictio_request_seconds_total": ("counter", "Total duration of the API requests, by method and endpoint"),
+    "depictio_request_retries_total": ("counter", "Retried API requests, by method and endpoint"),
+    "depictio_uploaded_bytes_total": ("counter", "Request body bytes sent to the API, by endpoint"),
+    "depictio_cache_requests_total": ("counter", "Cache lookups, by cache and result"),
+    "depictio_cache_hit_ratio": ("gauge", "Share of the cache lookups answered without downloading the response"),
+    "depictio_throttle_wait_seconds_total": ("counter", "Time spent waiting for bandwidth, by priority class"),
+    "depictio_throttle_bytes_total": ("counter", "Bytes sent through the bandwidth limits, by priority class"),
+}
+
+# Cache results that did not download the response
+CACHE_HIT_RESULTS = ["hit", "revalidated", "coalesced"]
+
+ID_SEGMENT = re.compile(r"^([0-9a-f]{24}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+)$", re.IGNORECASE)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def endpoint_label(url: str) -> str:
+    """
+    Endpoint of an API URL with its ids replaced by ":id" (e.g. "files/scan/:id/:id"), so labels stay few.
+    """
+    path = urlsplit(url).path.split("/depictio/api/v1/", 1)[-1]
+    return "/".join(":id" if ID_SEGMENT.match(segment) else segment for segment in path.strip("/").split("/"))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    Counters and gauges of a run, rendered in the Prometheus text format (for the node_exporter textfile collector).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[Labels, float]] = {}
+        self._collectors: List[Callable[["MetricsRegistry"], None]] = []
+        self.start_time = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def add_collector(self, collector: Callable[["MetricsRegistry"], None]) -> None:
+        """
+        Add a function setting metrics from another component's state, called before each rendering.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.debug(f"Metrics collector {collector} failed: {e}")
+        now = time.time()
+        self.set("depictio_run_start_time_seconds", self.start_time)
+        self.set("depictio_run_duration_seconds", now - self.start_time)
+        self.set("depictio_metrics_write_time_seconds", now)
+
+        lines = []
+        with self._lock:
+            for name in sorted(self._values):
+                metric_type, help_text = METRICS.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in sorted(self._values[name].items()):
+                    label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """
+        Write the metrics to a file atomically: the collector only ever reads a complete file.
+        """
+        path = os.path.expanduser(path)
+        # The temporary file does not end with .prom, so the collector ignores it
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+def _collect_http_cache(registry: MetricsRegistry) -> None:
+    from depictio_cli.http_cache import get_open_http_cache
+
+    # Rendering the metrics never opens the cache: a run that made no GET request has no cache metrics
+    http_cache = get_open_http_cache()
+    if http_cache is None:
+        return
+    stats = {"hit": http_cache.stats["hits"], "revalidated": http_cache.stats["revalidated"], "miss": http_cache.stats["misses"]}
+    stats["coalesced"] = http_cache.stats["coalesced"]
+    for result, count in stats.items():
+        registry.set("depictio_cache_requests_total", count, cache="http", result=result)
+
+
+def _collect_throttle(registry: MetricsRegistry) -> None:
+    from depictio_cli.throttle import get_throttle
+
+    throttle = get_throttle()
+    if throttle is None:
+        return
+    for priority, stats in throttle.stats.items():
+        registry.set("depictio_throttle_bytes_total", stats["bytes"], priority=priority)
+        registry.set("depictio_throttle_wait_seconds_total", stats["wait"], priority=priority)
+
+
+def _collect_hit_ratios(registry: MetricsRegistry) -> None:
+    lookups: Dict[str, List[float]] = {}
+    with registry._lock:
+        series = dict(registry._values.get("depictio_cache_requests_total", {}))
+    for labels, count in series.items():
+        labels = dict(labels)
+        totals = lookups.setdefault(labels["cache"], [0.0, 0.0])
+        totals[1] += count
+        if labels["result"] in CACHE_HIT_RESULTS:
+            totals[0] += count
+    for cache, (hits, total) in lookups.items():
+        if total:
+            registry.set("depictio_cache_hit_ratio", hits / total, cache=cache)
+
+
+class MetricsWriter:
+    """
+    Write the metrics to a file every `interval` seconds during the run (if set), and once more when stopped.
+    """
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: Optional[float] = None):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        try:
+            self.registry.write(self.path)
+        except OSError as e:
+            logger.warning(f"Could not write the metrics to {self.path}: {e}")
+
+    def start(self) -> None:
+        if self.interval:
+            self._thread = threading.Thread(target=self._run, name="depictio-metrics", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+
+_metrics: Optional[MetricsRegistry] = None
+
+
+def configure_metrics(enabled: bool = True) -> Optional[MetricsRegistry]:
+    """
+    Start collecting the metrics of the process (or stop, with enabled=False). Returns the registry.
+    """
+    global _metrics
+    _metrics = MetricsRegistry() if enabled else None
+    if _metrics is not None:
+        for collector in (_collect_http_cache, _collect_throttle, _collect_hit_ratios):
+            _metrics.add_collector(collector)
+    return _metrics
+
+
+def get_metrics() -> Optional[MetricsRegistry]:
+    return _metrics
+
+
+def record_request(method: str, url: str, status: str, duration: float, uploaded: int = 0, retried: bool = False) -> None:
+    metrics = _metrics
+    if metrics is None:
+        return
+    endpoint = endpoint_label(url)
+    metrics.inc("depictio_requests_total", method=method, endpoint=endpoint, status=status)
+    metrics.inc("depictio_request_seconds_total", duration, method=method, endpoint=endpoint)
+    if uploaded:
+        metrics.inc("depictio_uploaded_bytes_total", uploaded, endpoint=endpoint)
+    if retried:
+        metrics.inc("depictio_request_retries_total", method=method, endpoint=endpoint)
+
+
+def record_files_scanned(workflow: str, data_collection: str, count: int) -> None:
+    if _metrics is not None:
+        _metrics.inc("depictio_files_scanned_total", count, workflow=workflow, data_collection=data_collection)
+
+
+def record_cache_lookup(cache: str, result: str) -> None:
+    if _metrics is not None:
+        _metrics.inc("depictio_cache_requests_total", cache=cache, result=result)
+
+
+@contextmanager
+def stage_timer(workflow: str, data_collection: str, stage: str) -> Iterator[dict]:
+    """
+    Time a data collection stage. The stage fails unless the caller sets outcome["success"].
+    """
+    outcome = {"success": False}
+    start = time.monotonic()
+    try:
+        yield outcome
+    finally:
+        metrics = _metrics
+        if metrics is not None:
+            duration = time.monotonic() - start
+            status = "success" if outcome["success"] else "failed"
+            metrics.set("depictio_stage_duration_seconds", duration, workflow=workflow, data_collection=data_collection, stage=stage)
+            metrics.inc("depictio_stage_runs_total", stage=stage, status=status)
+            metrics.inc("depictio_stage_seconds_total", duration, stage=stage)
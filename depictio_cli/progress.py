@@ -0,0 +1,306 @@
+import contextvars
+import json
+import logging
+import shutil
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from depictio_cli.logging import handler, logger
+
+_current_task: contextvars.ContextVar = contextvars.ContextVar("depictio_progress_task", default=None)
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+def iter_sse_events(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse server-sent events ({"event", "data"}, data decoded as JSON when possible) from the lines of a response.
+    """
+    event, data = "message", []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            if data:
+                yield {"event": event, "data": _decode("\n".join(data))}
+            event, data = "message", []
+            continue
+        if line.startswith(":"):
+            # Comment, used as heartbeat
+            continue
+        name, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if name == "event":
+            event = value
+        elif name == "data":
+            data.append(value)
+    if data:
+        yield {"event": event, "data": _decode("\n".join(data))}
+
+
+def iter_ndjson_events(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse chunked NDJSON progress events, each line being an object with an "event" key.
+    """
+    for line in lines:
+        if line.strip():
+            data = json.loads(line)
+            yield {"event": data.get("event", "progress"), "data": data}
+
+
+def _decode(data: str):
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data
+
+
+@dataclass
+class ProgressTask:
+    """
+    Progress of a (data collection, stage) unit of work, updated from the progress events of its requests.
+    """
+
+    dc_tag: str
+    stage: str
+    status: str = "running"  # running, success, failed, cancelled
+    files: Optional[int] = None
+    files_total: Optional[int] = None
+    rows: Optional[int] = None
+    eta: Optional[float] = None
+    message: str = ""
+    straggler: bool = False
+    cancel_reason: Optional[str] = None
+    start_time: float = field(default_factory=time.monotonic)
+    end_time: Optional[float] = None
+    _cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _on_cancel: Optional[Callable[[], None]] = field(default=None, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def update(self, data: dict) -> None:
+        self.files = data.get("files_scanned", self.files)
+        self.files_total = data.get("files_total", self.files_total)
+        self.rows = data.get("rows_written", self.rows)
+        self.message = data.get("message", self.message)
+        if data.get("eta_seconds") is not None:
+            self.eta = data["eta_seconds"]
+        elif self.files and self.files_total:
+            # Estimated from the scan rate so far
+            self.eta = self.elapsed * (self.files_total - self.files) / self.files
+
+    def on_cancel(self, callback: Optional[Callable[[], None]]) -> None:
+        """
+        Set the callback interrupting the current request of the task when it is cancelled.
+        """
+        self._on_cancel = callback
+
+    def cancel(self, reason: str) -> None:
+        if self.cancelled:
+            return
+        self.cancel_reason = reason
+        self._cancel_event.set()
+        if self._on_cancel:
+            self._on_cancel()
+
+
+def current_task() -> Optional[ProgressTask]:
+    return _current_task.get()
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 else f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def format_task(task: ProgressTask) -> str:
+    parts = [f"{task.dc_tag}:{task.stage}", task.status, _format_duration(task.elapsed)]
+    if task.files is not None:
+        parts.append(f"files {task.files}{f'/{task.files_total}' if task.files_total else ''}")
+    if task.rows is not None:
+        parts.append(f"rows {task.rows}")
+    if task.status == "running" and task.eta is not None:
+        parts.append(f"ETA {_format_duration(task.eta)}")
+    if task.straggler and task.status == "running":
+        parts.append("STRAGGLER")
+    if task.cancel_reason:
+        parts.append(f"({task.cancel_reason})")
+    elif task.message and task.status == "running":
+        parts.append(task.message)
+    return " | ".join(parts)
+
+
+class _ClearDisplayFilter(logging.Filter):
+    def __init__(self, display: "ProgressDisplay"):
+        super().__init__()
+        self.display = display
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Log lines are written above the display, which is redrawn at the next refresh
+        self.display.clear()
+        return True
+
+
+class ProgressDisplay:
+    """
+    Live progress of the data collections of a run: redrawn in place on a terminal, logged as plain lines every
+    `plain_interval` seconds otherwise.
+
+    A running task is a straggler when it has run `straggler_factor` times longer than the median of the finished tasks
+    of its stage (and at least `min_straggler_time`). Stragglers are reported, and cancelled with `cancel_stragglers`;
+    tasks running longer than `stage_timeout` are cancelled. A cancelled task only fails its own data collection.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        tty: Optional[bool] = None,
+        refresh_interval: float = 0.5,
+        plain_interval: float = 30.0,
+        straggler_factor: float = 3.0,
+        min_straggler_time: float = 60.0,
+        cancel_stragglers: bool = False,
+        stage_timeout: Optional[float] = None,
+    ):
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty() if tty is None else tty
+        self.refresh_interval = refresh_interval
+        self.plain_interval = plain_interval
+        self.straggler_factor = straggler_factor
+        self.min_straggler_time = min_straggler_time
+        self.cancel_stragglers = cancel_stragglers
+        self.stage_timeout = stage_timeout
+        self.tasks: Dict[Tuple[str, str], ProgressTask] = {}
+        self._lock = threading.RLock()
+        self._drawn_lines = 0
+        self._last_plain = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._filter = _ClearDisplayFilter(self)
+
+    def start(self) -> None:
+        self.tasks = {}
+        if self.tty:
+            handler.addFilter(self._filter)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, name="depictio-progress", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.tty:
+            handler.removeFilter(self._filter)
+            with self._lock:
+                self.clear()
+                self._draw()
+                # Keep the final state on screen
+                self._drawn_lines = 0
+
+    def __enter__(self) -> "ProgressDisplay":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def run(self, dc_tag: str, stage: str, function: Callable[[], bool]) -> bool:
+        """
+        Run a unit of work as a progress task: its requests report their progress to it and can be cancelled through it.
+        """
+        task = ProgressTask(dc_tag=dc_tag, stage=stage)
+        with self._lock:
+            self.tasks[(dc_tag, stage)] = task
+        token = _current_task.set(task)
+        try:
+            success = function()
+            task.status = "success" if success else "failed"
+            return success
+        except TaskCancelled:
+            task.status = "cancelled"
+            raise
+        except Exception:
+            task.status = "failed"
+            raise
+        finally:
+            task.end_time = time.monotonic()
+            task.on_cancel(None)
+            _current_task.reset(token)
+
+    def check_stragglers(self) -> None:
+        with self._lock:
+            tasks = list(self.tasks.values())
+        durations: Dict[str, List[float]] = {}
+        for task in tasks:
+            if task.status == "success":
+                durations.setdefault(task.stage, []).append(task.elapsed)
+        for task in tasks:
+            if task.status != "running" or task.cancelled:
+                continue
+            if self.stage_timeout and task.elapsed > self.stage_timeout:
+                logger.warning(f"{task.dc_tag}:{task.stage} has been running for {_format_duration(task.elapsed)}, cancelling it")
+                task.cancel(f"timed out after {_format_duration(self.stage_timeout)}")
+                continue
+            finished = durations.get(task.stage, [])
+            if task.straggler or len(finished) < 2:
+                continue
+            threshold = max(self.min_straggler_time, self.straggler_factor * statistics.median(finished))
+            if task.elapsed > threshold:
+                task.straggler = True
+                logger.warning(
+                    f"{task.dc_tag}:{task.stage} is a straggler: running for {_format_duration(task.elapsed)}, "
+                    f"median of its stage {_format_duration(statistics.median(finished))}"
+                )
+                if self.cancel_stragglers:
+                    task.cancel("straggler")
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._drawn_lines:
+                self.stream.write(f"\x1b[{self._drawn_lines}F\x1b[J")
+                self.stream.flush()
+                self._drawn_lines = 0
+
+    def _draw(self) -> None:
+        with self._lock:
+            tasks = sorted(self.tasks.values(), key=lambda task: (task.status != "running", task.start_time))
+            max_lines = max(3, shutil.get_terminal_size().lines // 2)
+            lines = [format_task(task) for task in tasks[:max_lines]]
+            if len(tasks) > max_lines:
+                lines.append(f"... and {len(tasks) - max_lines} more")
+            width = shutil.get_terminal_size().columns
+            self.stream.write("".join(f"{line[:width - 1]}\n" for line in lines))
+            self.stream.flush()
+            self._drawn_lines = len(lines)
+
+    def refresh(self) -> None:
+        if self.tty:
+            with self._lock:
+                self.clear()
+                self._draw()
+        elif time.monotonic() - self._last_plain >= self.plain_interval:
+            self._last_plain = time.monotonic()
+            with self._lock:
+                running = [task for task in self.tasks.values() if task.status == "running"]
+            for task in running:
+                logger.info(f"Progress: {format_task(task)}")
+
+    def _monitor(self) -> None:
+        self._last_plain = time.monotonic()
+        while not self._stop.wait(self.refresh_interval):
+            self.check_stragglers()
+            self.refresh()
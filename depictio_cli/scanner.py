@@ -0,0 +1,178 @@
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from depictio_cli.logging import logger
+from depictio_cli.manifest import Manifest
+from depictio_cli.validation import compile_dc_pattern
+
+MANIFEST_EXTENSION = ".dpm"
+
+
+def get_parent_runs_locations(workflow: dict) -> List[str]:
+    """
+    Return the parent runs locations of a workflow, with environment variables expanded.
+    """
+    return [os.path.expandvars(os.path.expanduser(location)) for location in workflow["config"]["parent_runs_location"]]
+
+
+def discover_runs(workflow: dict) -> List[Tuple[str, str]]:
+    """
+    Return the (run_id, run_path) of the run directories matching the runs_regex of a workflow, sorted by path.
+    """
+    runs_regex = re.compile(workflow["config"].get("runs_regex") or ".*")
+    runs = []
+    for location in get_parent_runs_locations(workflow):
+        if not os.path.isdir(location):
+            logger.warning(f"Parent runs location {location} does not exist, skipping it.")
+            continue
+        with os.scandir(location) as entries:
+            for entry in entries:
+                if entry.is_dir() and runs_regex.fullmatch(entry.name):
+                    runs.append((entry.name, entry.path))
+    return sorted(runs, key=lambda run: run[1])
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parse a shard specification "i/n" (0 <= i < n).
+    """
+    try:
+        index, count = (int(value) for value in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{shard}', expected i/n")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{shard}', expected 0 <= i < n")
+    return index, count
+
+
+def shard_of(run_path: str, shard_count: int) -> int:
+    """
+    Return the shard a run belongs to. Only depends on the run path, so every node computes the same split.
+    """
+    return int(hashlib.md5(run_path.encode("utf-8")).hexdigest(), 16) % shard_count
+
+
+def select_shard(runs: Iterable[Tuple[str, str]], shard_index: int, shard_count: int) -> List[Tuple[str, str]]:
+    return [run for run in runs if shard_of(run[1], shard_count) == shard_index]
+
+
+def get_dc_matcher(dc: dict) -> Optional[Tuple[re.Pattern, str]]:
+    """
+    Return the compiled pattern of a data collection and what it applies to ("file-based": the file name,
+    "path-based": the path relative to the run directory).
+    """
+    config = dc.get("config", {})
+    if isinstance(config.get("regex"), dict):
+        return compile_dc_pattern(config["regex"]), config["regex"].get("type", "file-based")
+    if config.get("files_regex"):
+        return re.compile(config["files_regex"]), "file-based"
+    return None
+
+
+def scan_run(run_id: str, run_path: str, data_collections: List[dict]) -> Iterator[dict]:
+    """
+    Walk a run directory once and yield a manifest entry for every file matching a data collection.
+    """
+    matchers = []
+    for dc in data_collections:
+        matcher = get_dc_matcher(dc)
+        if matcher:
+            matchers.append((dc["data_collection_tag"], *matcher))
+
+    stack = [run_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            logger.warning(f"Cannot list {directory}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+                continue
+            relative_path = os.path.relpath(entry.path, run_path)
+            for dc_tag, pattern, regex_type in matchers:
+                match = pattern.fullmatch(relative_path if regex_type == "path-based" else entry.name)
+                if not match:
+                    continue
+                stat = entry.stat()
+                yield {
+                    "data_collection_tag": dc_tag,
+                    "run_id": run_id,
+                    "run_path": run_path,
+                    "path": entry.path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "wildcards": {name: value for name, value in match.groupdict().items() if value is not None},
+                }
+
+
+def scan_runs(runs: Iterable[Tuple[str, str]], data_collections: List[dict]) -> Iterator[dict]:
+    for run_id, run_path in runs:
+        logger.info(f"Scanning run {run_id}")
+        yield from scan_run(run_id, run_path, data_collections)
+
+
+def write_partial_manifest(entries: Iterable[dict], path: str) -> int:
+    """
+    Write manifest entries as a columnar manifest. The file only appears once complete (written then renamed).
+    """
+    manifest = Manifest.from_entries(entries)
+    manifest.write(path)
+    return len(manifest)
+
+
+def run_directory(path: str, run_id: str) -> str:
+    """
+    Guess the run directory of a file from its path: its first ancestor named after the run (the parent directory if there is none).
+    Only used for manifests written before the run directory was recorded with each file.
+    """
+    parts = path.split(os.sep)
+    if run_id in parts[:-1]:
+        return os.sep.join(parts[: parts.index(run_id) + 1])
+    return os.path.dirname(path)
+
+
+def read_partial_manifests(paths: Iterable[str]) -> Dict[str, Manifest]:
+    """
+    Merge partial manifests into one manifest per data collection.
+
+    A run scanned twice (e.g. re-claimed from the work queue after its lease expired) is only kept from the first manifest.
+    Runs are told apart by their directory, so runs of the same name under different parent runs locations are all kept.
+    """
+    merged: Dict[str, Manifest] = {}
+    run_sources: Dict[str, str] = {}
+    for path in paths:
+        manifest = Manifest.read(path)
+        for i in range(len(manifest)):
+            run_path = manifest.run_path(i) or run_directory(manifest.path(i), manifest.runs.get(i))
+            if run_sources.setdefault(run_path, path) != path:
+                continue
+            merged.setdefault(manifest.data_collections.get(i), Manifest()).append_from(manifest, i)
+    return merged
+
+
+def shard_manifest_path(output_dir: str, shard_index: int, shard_count: int) -> str:
+    return os.path.join(output_dir, f"shard-{shard_index:05d}-of-{shard_count:05d}{MANIFEST_EXTENSION}")
+
+
+def missing_shards(output_dir: str) -> List[str]:
+    """
+    Return the shard manifests not written yet, based on the shard count of the manifests present.
+    """
+    counts = set()
+    for name in os.listdir(output_dir):
+        match = re.fullmatch(r"shard-\d+-of-(\d+)" + re.escape(MANIFEST_EXTENSION), name)
+        if match:
+            counts.add(int(match.group(1)))
+    if len(counts) > 1:
+        raise ValueError(f"Manifests of different shard counts found in {output_dir}: {sorted(counts)}")
+    missing = []
+    for count in counts:
+        for index in range(count):
+            if not os.path.exists(shard_manifest_path(output_dir, index, count)):
+                missing.append(f"{index}/{count}")
+    return missing
@@ -0,0 +1,311 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from depictio_cli.logging import logger
+
+# Stages a data collection goes through, in execution order
+STAGES = ["scan", "convert", "aggregate"]
+
+NodeKey = Tuple[str, str]
+
+
+@dataclass
+class StageNode:
+    """
+    A (data collection, stage) unit of work in the workflow DAG.
+    """
+
+    dc_tag: str
+    stage: str
+    dc: dict
+    upstream: List[NodeKey] = field(default_factory=list)
+    downstream: List[NodeKey] = field(default_factory=list)
+    status: str = "pending"  # pending, running, success, skipped, failed, cancelled
+    error: Optional[str] = None
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+    @property
+    def key(self) -> NodeKey:
+        return (self.dc_tag, self.stage)
+
+    @property
+    def duration(self) -> float:
+        if self.start_time is None or self.end_time is None:
+            return 0.0
+        return self.end_time - self.start_time
+
+
+def get_dc_type(dc: dict) -> str:
+    return str(dc.get("config", {}).get("type", "")).lower()
+
+
+def get_dc_join_references(dc: dict) -> List[str]:
+    """
+    Return the tags of the data collections a data collection is joined with (table join).
+    """
+    config = dc.get("config", {})
+    references = []
+    for key in ["join", "table_join"]:
+        join = config.get(key) or {}
+        references.extend(join.get("with_dc") or [])
+    return list(dict.fromkeys(references))
+
+
+def get_dc_wildcards(dc: dict) -> List[dict]:
+    """
+    Return the wildcard definitions of a data collection, from regex.wildcards and the legacy regex_wildcards.
+    """
+    config = dc.get("config", {})
+    wildcards = list(config.get("regex_wildcards") or [])
+    if isinstance(config.get("regex"), dict):
+        wildcards.extend(config["regex"].get("wildcards") or [])
+    return wildcards
+
+
+def get_dc_wildcard_references(dc: dict) -> List[str]:
+    """
+    Return the tags of the data collections a data collection takes wildcard values from.
+    """
+    references = [wildcard["join_data_collection"] for wildcard in get_dc_wildcards(dc) if wildcard.get("join_data_collection")]
+    return list(dict.fromkeys(references))
+
+
+def get_dc_stages(dc: dict, scan_files: bool = True, convert_tables: bool = False, aggregate: bool = True) -> List[str]:
+    """
+    Return the stages that apply to a data collection. Without `aggregate`, the builds are left out (e.g. submitted as a batch).
+    """
+    stages = []
+    if scan_files:
+        stages.append("scan")
+    if convert_tables and get_dc_type(dc) == "table":
+        stages.append("convert")
+    if aggregate and get_dc_type(dc) in ["table", "jbrowse2"]:
+        stages.append("aggregate")
+    return stages
+
+
+def build_workflow_dag(
+    data_collections: List[dict], scan_files: bool = True, convert_tables: bool = False, aggregate: bool = True
+) -> Dict[NodeKey, StageNode]:
+    """
+    Build the DAG of (data collection, stage) nodes of a workflow.
+
+    - scan(dc) -> convert(dc) -> aggregate(dc), for the stages that apply to dc
+    - scan(ref) -> scan(dc) when dc takes wildcard values from ref
+    - aggregate(ref) -> aggregate(dc) when dc is joined with ref
+
+    References to data collections that are not part of the run are considered already satisfied.
+    """
+    nodes: Dict[NodeKey, StageNode] = {}
+    dcs_by_tag = {dc["data_collection_tag"]: dc for dc in data_collections}
+
+    for tag, dc in dcs_by_tag.items():
+        for stage in get_dc_stages(dc, scan_files=scan_files, convert_tables=convert_tables, aggregate=aggregate):
+            nodes[(tag, stage)] = StageNode(dc_tag=tag, stage=stage, dc=dc)
+
+    def add_edge(upstream: NodeKey, downstream: NodeKey):
+        if upstream in nodes and downstream in nodes and upstream not in nodes[downstream].upstream:
+            nodes[downstream].upstream.append(upstream)
+            nodes[upstream].downstream.append(downstream)
+
+    def last_stage_until(tag: str, stage: str) -> Optional[NodeKey]:
+        # The latest existing node of a data collection up to (and including) the given stage
+        for candidate in reversed(STAGES[: STAGES.index(stage) + 1]):
+            if (tag, candidate) in nodes:
+                return (tag, candidate)
+        return None
+
+    for tag, dc in dcs_by_tag.items():
+        stages = [stage for stage in STAGES if (tag, stage) in nodes]
+        for upstream_stage, downstream_stage in zip(stages, stages[1:]):
+            add_edge((tag, upstream_stage), (tag, downstream_stage))
+
+        for reference in get_dc_wildcard_references(dc):
+            if reference == tag:
+                continue
+            if reference not in dcs_by_tag:
+                logger.warning(f"Data collection {tag} references {reference} which is not part of the run, assuming it is ready.")
+                continue
+            add_edge((reference, "scan"), (tag, "scan"))
+
+        for reference in get_dc_join_references(dc):
+            if reference == tag:
+                continue
+            if reference not in dcs_by_tag:
+                logger.warning(f"Data collection {tag} is joined with {reference} which is not part of the run, assuming it is ready.")
+                continue
+            upstream = last_stage_until(reference, "aggregate")
+            if upstream:
+                add_edge(upstream, (tag, "aggregate"))
+
+    check_acyclic(nodes)
+    return nodes
+
+
+def topological_order(nodes: Dict[NodeKey, StageNode]) -> List[NodeKey]:
+    """
+    Return the nodes in topological order (Kahn's algorithm), keeping the declaration order for ties.
+    """
+    indegree = {key: len(node.upstream) for key, node in nodes.items()}
+    ready = [key for key in nodes if indegree[key] == 0]
+    order = []
+    while ready:
+        key = ready.pop(0)
+        order.append(key)
+        for child in nodes[key].downstream:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    return order
+
+
+def check_acyclic(nodes: Dict[NodeKey, StageNode]) -> None:
+    order = topological_order(nodes)
+    if len(order) != len(nodes):
+        cycle = sorted(f"{tag}:{stage}" for tag, stage in set(nodes) - set(order))
+        raise ValueError(f"Circular dependency between data collections: {', '.join(cycle)}")
+
+
+def critical_path(nodes: Dict[NodeKey, StageNode]) -> Tuple[List[NodeKey], float]:
+    """
+    Return the longest chain of dependent nodes (by measured duration) and its total duration.
+    """
+    best: Dict[NodeKey, Tuple[float, Optional[NodeKey]]] = {}
+    for key in topological_order(nodes):
+        node = nodes[key]
+        previous = max(node.upstream, key=lambda upstream: best[upstream][0], default=None)
+        elapsed = best[previous][0] if previous else 0.0
+        best[key] = (elapsed + node.duration, previous)
+
+    if not best:
+        return [], 0.0
+
+    key = max(best, key=lambda k: best[k][0])
+    total = best[key][0]
+    path = []
+    while key:
+        path.append(key)
+        key = best[key][1]
+    return list(reversed(path)), total
+
+
+class DAGScheduler:
+    """
+    Run the nodes of a workflow DAG as soon as their upstream nodes are done, using a thread pool.
+
+    A failing node cancels its downstream nodes only; independent branches keep running.
+
+    If `is_done` is given, a node whose upstream nodes were all skipped and for which `is_done` returns True
+    is skipped instead of run (e.g. completed in a previous run). `on_success` is called after each node that ran successfully.
+    """
+
+    def __init__(
+        self,
+        nodes: Dict[NodeKey, StageNode],
+        run_node: Callable[[StageNode], bool],
+        max_workers: int = 4,
+        is_done: Optional[Callable[[StageNode], bool]] = None,
+        on_success: Optional[Callable[[StageNode], None]] = None,
+    ):
+        self.nodes = nodes
+        self.run_node = run_node
+        self.max_workers = max(1, max_workers)
+        self.is_done = is_done
+        self.on_success = on_success
+
+    def _can_skip(self, node: StageNode) -> bool:
+        if not self.is_done:
+            return False
+        if any(self.nodes[upstream].status != "skipped" for upstream in node.upstream):
+            return False
+        return bool(self.is_done(node))
+
+    def _release_downstream(self, node: StageNode, remaining: Dict[NodeKey, int], ready: List[NodeKey]) -> None:
+        for child in node.downstream:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                ready.append(child)
+
+    def _execute(self, node: StageNode) -> bool:
+        node.start_time = time.monotonic()
+        try:
+            return bool(self.run_node(node))
+        finally:
+            node.end_time = time.monotonic()
+
+    def _cancel_downstream(self, key: NodeKey) -> None:
+        stack = list(self.nodes[key].downstream)
+        while stack:
+            child = self.nodes[stack.pop()]
+            if child.status == "pending":
+                child.status = "cancelled"
+                child.error = f"upstream {key[0]}:{key[1]} failed"
+                logger.warning(f"Cancelling {child.dc_tag}:{child.stage} ({child.error})")
+                stack.extend(child.downstream)
+
+    def run(self) -> Dict[NodeKey, StageNode]:
+        remaining = {key: len(node.upstream) for key, node in self.nodes.items()}
+        ready = [key for key in topological_order(self.nodes) if remaining[key] == 0]
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while ready or running:
+                while ready:
+                    key = ready.pop(0)
+                    node = self.nodes[key]
+                    if node.status != "pending":
+                        continue
+                    if self._can_skip(node):
+                        node.status = "skipped"
+                        logger.info(f"Skipping {node.dc_tag}:{node.stage} (already completed)")
+                        self._release_downstream(node, remaining, ready)
+                        continue
+                    node.status = "running"
+                    logger.info(f"Starting {node.dc_tag}:{node.stage}")
+                    running[executor.submit(self._execute, node)] = key
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    node = self.nodes[key]
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        success = False
+                        node.error = str(e)
+
+                    if success:
+                        node.status = "success"
+                        logger.info(f"Finished {node.dc_tag}:{node.stage} in {node.duration:.2f}s")
+                        if self.on_success:
+                            self.on_success(node)
+                        self._release_downstream(node, remaining, ready)
+                    else:
+                        node.status = "failed"
+                        logger.error(f"Failed {node.dc_tag}:{node.stage}{f': {node.error}' if node.error else ''}")
+                        self._cancel_downstream(key)
+
+        return self.nodes
+
+    def log_summary(self) -> None:
+        """
+        Log the status of every node and the critical path of the run.
+        """
+        for key in topological_order(self.nodes):
+            node = self.nodes[key]
+            logger.info(f"{node.dc_tag}:{node.stage} - {node.status} ({node.duration:.2f}s){f' - {node.error}' if node.error else ''}")
+
+        path, total = critical_path(self.nodes)
+        if path:
+            chain = " -> ".join(f"{tag}:{stage} ({self.nodes[(tag, stage)].duration:.2f}s)" for tag, stage in path)
+            logger.info(f"Critical path ({total:.2f}s): {chain}")
+
+    @property
+    def success(self) -> bool:
+        return all(node.status in ["success", "skipped"] for node in self.nodes.values())
@@ -0,0 +1,168 @@
+import csv
+import gzip
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from depictio_cli.logging import logger
+
+NULL_VALUES = {"", "na", "nan", "null", "none", "n/a"}
+BOOLEAN_VALUES = {"true", "false"}
+
+# Order used to reconcile the dtypes of a column across files: a column is promoted to the most general dtype seen
+DTYPE_RANK = {"Boolean": 0, "Int64": 1, "Float64": 2, "Utf8": 3}
+
+
+def get_table_read_options(dc: dict) -> dict:
+    """
+    Return the separator, number of skipped rows and kept columns of a Table data collection.
+    """
+    properties = dc.get("config", {}).get("dc_specific_properties") or {}
+    polars_kwargs = properties.get("polars_kwargs") or {}
+    default_separator = "\t" if str(properties.get("format", "")).upper() == "TSV" else ","
+    return {
+        "separator": polars_kwargs.get("separator", default_separator),
+        "skip_rows": int(polars_kwargs.get("skip_rows", 0)),
+        "has_header": polars_kwargs.get("has_header", True),
+        "keep_columns": properties.get("keep_columns"),
+    }
+
+
+def open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="")
+    return open(path, "r", newline="")
+
+
+def infer_value_dtype(value: str) -> Optional[str]:
+    value = value.strip()
+    if value.lower() in NULL_VALUES:
+        return None
+    if value.lower() in BOOLEAN_VALUES:
+        return "Boolean"
+    try:
+        int(value)
+        return "Int64"
+    except ValueError:
+        pass
+    try:
+        float(value)
+        return "Float64"
+    except ValueError:
+        return "Utf8"
+
+
+def promote(dtypes: Iterable[Optional[str]]) -> Optional[str]:
+    """
+    Return the most general dtype compatible with all the given dtypes (None values are ignored).
+    """
+    seen = {dtype for dtype in dtypes if dtype}
+    if not seen:
+        return None
+    if "Boolean" in seen and len(seen) > 1:
+        # Booleans mixed with numbers or strings can only be read as strings
+        return "Utf8"
+    return max(seen, key=DTYPE_RANK.get)
+
+
+def infer_file_schema(path: str, separator: str = "\t", skip_rows: int = 0, has_header: bool = True, n_rows: int = 1000) -> dict:
+    """
+    Infer the column dtypes of a delimited file from its first rows.
+    """
+    try:
+        with open_text(path) as f:
+            for _ in range(skip_rows):
+                f.readline()
+            reader = csv.reader(f, delimiter=separator)
+            header = next(reader, None)
+            if header is None:
+                return {"path": path, "error": "empty file"}
+            rows = [] if has_header else [header]
+            columns = header if has_header else [f"column_{i + 1}" for i in range(len(header))]
+            for row in reader:
+                if len(rows) >= n_rows:
+                    break
+                rows.append(row)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return {"path": path, "error": str(e)}
+
+    dtypes = {}
+    for i, column in enumerate(columns):
+        dtypes[column] = promote(infer_value_dtype(row[i]) for row in rows if i < len(row))
+    return {"path": path, "columns": columns, "dtypes": dtypes, "rows_sampled": len(rows)}
+
+
+def _infer_file_schema(args) -> dict:
+    return infer_file_schema(*args)
+
+
+def stratified_sample(entries: List[dict], max_files: int, seed: int = 0) -> List[dict]:
+    """
+    Pick up to `max_files` entries, spread evenly across runs (round-robin over shuffled runs).
+    """
+    by_run: Dict[str, List[dict]] = {}
+    for entry in sorted(entries, key=lambda entry: entry["path"]):
+        by_run.setdefault(entry.get("run_id", ""), []).append(entry)
+
+    rng = random.Random(seed)
+    for run_entries in by_run.values():
+        rng.shuffle(run_entries)
+
+    sample = []
+    queues = [by_run[run] for run in sorted(by_run)]
+    while len(sample) < max_files and any(queues):
+        for queue in queues:
+            if queue and len(sample) < max_files:
+                sample.append(queue.pop())
+    return sample
+
+
+def reconcile_schemas(file_schemas: List[dict], keep_columns: Optional[List[str]] = None) -> dict:
+    """
+    Reconcile the schemas inferred for several files.
+
+    Returns the dtype of every column, the reference column set (the most common one) and the files diverging from it.
+    """
+    valid = [schema for schema in file_schemas if "error" not in schema]
+    errors = {schema["path"]: schema["error"] for schema in file_schemas if "error" in schema}
+    if not valid:
+        return {"dtypes": {}, "columns": [], "divergent_files": {}, "missing_columns": list(keep_columns or []), "errors": errors}
+
+    column_sets = Counter(tuple(schema["columns"]) for schema in valid)
+    reference_columns = list(column_sets.most_common(1)[0][0])
+
+    divergent_files = {}
+    for schema in valid:
+        if schema["columns"] != reference_columns:
+            missing = [column for column in reference_columns if column not in schema["columns"]]
+            extra = [column for column in schema["columns"] if column not in reference_columns]
+            divergent_files[schema["path"]] = {"missing": missing, "extra": extra, "reordered": not missing and not extra}
+
+    columns = keep_columns or reference_columns
+    all_columns = {column for schema in valid for column in schema["columns"]}
+    missing_columns = [column for column in columns if column not in all_columns]
+    dtypes = {}
+    for column in columns:
+        dtype = promote(schema["dtypes"].get(column) for schema in valid)
+        # Columns that are always empty in the sample are read as strings
+        dtypes[column] = dtype or "Utf8"
+
+    return {"dtypes": dtypes, "columns": reference_columns, "divergent_files": divergent_files, "missing_columns": missing_columns, "errors": errors}
+
+
+def infer_data_collection_schema(dc: dict, entries: List[dict], max_files: int = 200, n_rows: int = 1000, max_workers: int = 4, seed: int = 0) -> dict:
+    """
+    Infer the dtypes of a Table data collection from a stratified sample of its files, in a process pool.
+    """
+    options = get_table_read_options(dc)
+    sample = stratified_sample(entries, max_files=max_files, seed=seed)
+    logger.info(f"Inferring the schema of {dc['data_collection_tag']} from {len(sample)} of {len(entries)} files")
+
+    args = [(entry["path"], options["separator"], options["skip_rows"], options["has_header"], n_rows) for entry in sample]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        file_schemas = list(executor.map(_infer_file_schema, args, chunksize=max(1, len(args) // (max_workers * 4))))
+
+    result = reconcile_schemas(file_schemas, keep_columns=options["keep_columns"])
+    result["files_sampled"] = len(sample)
+    return result
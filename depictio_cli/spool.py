@@ -0,0 +1,266 @@
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from depictio_cli.logging import logger
+from depictio_cli.manifest import Manifest
+from depictio_cli.scanner import get_dc_matcher, get_parent_runs_locations
+from depictio_cli.utils import list_workflows, register_files_for_data_collection
+
+DEFAULT_SPOOL_DIR = "~/.depictio/spool"
+DEFAULT_MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+SEGMENT_EXTENSION = ".ndjson"
+RETRY_SUFFIX = "-retry"
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _segment_seq(name: str) -> int:
+    return int(name[:12])
+
+
+class Spool:
+    """
+    Durable local queue of pipeline events, as append-only NDJSON segments: every event is fsync'd before `add`
+    returns, so an announced file is never lost, even if the machine crashes or the API is down.
+
+    Appends go to the last segment. A flush seals the current segments (later appends start a new one), registers
+    their events and deletes them; the events that could not be registered are written back to a retry segment
+    and replayed by the next flush. Concurrent writers and flushers are serialised with file locks.
+    """
+
+    def __init__(self, spool_dir: str = DEFAULT_SPOOL_DIR, max_segment_size: int = DEFAULT_MAX_SEGMENT_SIZE):
+        self.root = os.path.expanduser(spool_dir)
+        self.max_segment_size = max_segment_size
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextmanager
+    def lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold the "append" lock (writers) or the "flush" lock (flushers). Yields False if not blocking and already held.
+        """
+        with open(os.path.join(self.root, f"{name}.lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def segments(self) -> List[str]:
+        """
+        Return the paths of the segments, oldest first.
+        """
+        names = sorted(name for name in os.listdir(self.root) if name.endswith(SEGMENT_EXTENSION) and name[:12].isdigit())
+        return [os.path.join(self.root, name) for name in names]
+
+    def _next_segment(self) -> str:
+        seqs = [_segment_seq(os.path.basename(path)) for path in self.segments()]
+        path = os.path.join(self.root, f"{max(seqs, default=0) + 1:012d}{SEGMENT_EXTENSION}")
+        open(path, "ab").close()
+        _fsync_dir(self.root)
+        return path
+
+    def _active_segment(self) -> str:
+        appendable = [path for path in self.segments() if not path.endswith(f"{RETRY_SUFFIX}{SEGMENT_EXTENSION}")]
+        if not appendable or os.path.getsize(appendable[-1]) >= self.max_segment_size:
+            return self._next_segment()
+        return appendable[-1]
+
+    def add(self, event: dict) -> None:
+        """
+        Append an event to the spool, durably.
+        """
+        line = json.dumps(event, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.lock("append"):
+            path = self._active_segment()
+            with open(path, "ab+") as f:
+                # A writer killed mid-line left a partial line: terminate it so it is skipped alone on replay
+                if os.path.getsize(path):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def seal(self) -> List[str]:
+        """
+        Seal the current segments: later events go to a new segment. Returns the sealed segments.
+        """
+        with self.lock("append"):
+            sealed = self.segments()
+            if sealed:
+                self._next_segment()
+        return sealed
+
+    @staticmethod
+    def read_events(paths: List[str]) -> Iterator[dict]:
+        for path in paths:
+            with open(path, "rb") as f:
+                for number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skipping the truncated event at {path}:{number}")
+
+    def release(self, sealed: List[str], retry_events: List[dict]) -> None:
+        """
+        Delete flushed segments, after writing the events to retry to a retry segment (replacing the previous one).
+        """
+        retry_path = None
+        if sealed and retry_events:
+            retry_path = os.path.join(self.root, f"{_segment_seq(os.path.basename(sealed[0])):012d}{RETRY_SUFFIX}{SEGMENT_EXTENSION}")
+            tmp_path = f"{retry_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                for event in retry_events:
+                    f.write(json.dumps(event, separators=(",", ":")).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, retry_path)
+        for path in sealed:
+            if path != retry_path:
+                os.remove(path)
+        _fsync_dir(self.root)
+
+    def pending(self) -> Tuple[int, int]:
+        """
+        Return the number of segments and of bytes waiting to be flushed.
+        """
+        segments = [path for path in self.segments() if os.path.getsize(path)]
+        return len(segments), sum(os.path.getsize(path) for path in segments)
+
+
+def file_event(workflow_tag: str, data_collection_tag: str, path: str, run_id: Optional[str] = None) -> dict:
+    """
+    Event announcing a finished file, with its size and modification time at that point.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return {
+        "workflow_tag": workflow_tag,
+        "data_collection_tag": data_collection_tag,
+        "path": path,
+        "run_id": run_id,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "time": time.time(),
+    }
+
+
+def find_run(workflow: dict, path: str) -> Optional[Tuple[str, str]]:
+    """
+    Return the (run_id, run_path) of a file: the directory under one of the parent runs locations of the workflow that contains it.
+    """
+    for location in get_parent_runs_locations(workflow):
+        relative_path = os.path.relpath(path, location)
+        if not relative_path.startswith(os.pardir) and os.sep in relative_path:
+            run_id = relative_path.split(os.sep, 1)[0]
+            return run_id, os.path.join(location, run_id)
+    return None
+
+
+def coalesce_events(events: List[dict]) -> Dict[Tuple[str, str], Dict[str, dict]]:
+    """
+    Group events by (workflow, data collection), keeping the last event of each file.
+    """
+    groups: Dict[Tuple[str, str], Dict[str, dict]] = {}
+    for event in events:
+        groups.setdefault((event["workflow_tag"], event["data_collection_tag"]), {})[event["path"]] = event
+    return groups
+
+
+def build_manifest(workflow: dict, dc: dict, events: List[dict]) -> Manifest:
+    """
+    Build the manifest entries of the files of a data collection, with their run and the wildcards of its pattern.
+    Files not matching the data collection are dropped.
+    """
+    matcher = get_dc_matcher(dc)
+    manifest = Manifest()
+    for event in events:
+        run = find_run(workflow, event["path"])
+        run_id = event.get("run_id") or (run[0] if run else None)
+        if run_id is None:
+            logger.warning(f"Dropping {event['path']}: not in a run directory of workflow {workflow['workflow_tag']}")
+            continue
+        wildcards = {}
+        if matcher is not None:
+            pattern, regex_type = matcher
+            if regex_type == "path-based" and run is None:
+                logger.warning(f"Dropping {event['path']}: not in a run directory of workflow {workflow['workflow_tag']}")
+                continue
+            match = pattern.fullmatch(os.path.relpath(event["path"], run[1]) if regex_type == "path-based" else os.path.basename(event["path"]))
+            if not match:
+                logger.warning(f"Dropping {event['path']}: does not match data collection {dc['data_collection_tag']}")
+                continue
+            wildcards = {name: value for name, value in match.groupdict().items() if value is not None}
+        manifest.append(dc["data_collection_tag"], run_id, event["path"], event["size"], event["mtime"], wildcards, run[1] if run else None)
+    return manifest
+
+
+def flush_spool(agent_config: dict, headers: dict, spool: Spool, batch_size: int = 10000) -> Optional[bool]:
+    """
+    Register the spooled events, coalesced into one bulk registration per data collection. Events that could not be
+    registered (API down, workflow not registered yet) are kept for the next flush.
+
+    Returns True if everything was registered, False if events are kept, None if another flush is running.
+    """
+    with spool.lock("flush", blocking=False) as locked:
+        if not locked:
+            logger.info("Another flush of the spool is running")
+            return None
+        sealed = spool.seal()
+        events = list(spool.read_events(sealed))
+        if not events:
+            spool.release(sealed, [])
+            return True
+        groups = coalesce_events(events)
+        logger.info(f"Flushing {len(events)} events: {sum(len(files) for files in groups.values())} files in {len(groups)} data collections")
+
+        try:
+            workflows = {workflow["workflow_tag"]: workflow for workflow in list_workflows(agent_config, headers)}
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Cannot list workflows ({e}), keeping {len(events)} events for the next flush")
+            spool.release(sealed, [event for files in groups.values() for event in files.values()])
+            return False
+
+        retry_events = []
+        for (workflow_tag, dc_tag), files in groups.items():
+            workflow = workflows.get(workflow_tag)
+            dc = next((dc for dc in (workflow or {}).get("data_collections", []) if dc["data_collection_tag"] == dc_tag), None)
+            if dc is None:
+                logger.warning(f"Data collection {workflow_tag}/{dc_tag} is not registered, keeping its {len(files)} events for the next flush")
+                retry_events.extend(files.values())
+                continue
+            manifest = build_manifest(workflow, dc, list(files.values()))
+            if not len(manifest):
+                continue
+            try:
+                success = register_files_for_data_collection(agent_config, str(workflow["_id"]), str(dc["_id"]), manifest, headers, batch_size=batch_size)
+            except httpx.HTTPError as e:
+                logger.warning(f"Cannot register the files of {workflow_tag}/{dc_tag}: {e}")
+                success = False
+            if success:
+                logger.info(f"Registered {len(manifest)} files for {workflow_tag}/{dc_tag}")
+            else:
+                retry_events.extend(files[path] for path in manifest.paths())
+        spool.release(sealed, retry_events)
+        if retry_events:
+            logger.warning(f"Kept {len(retry_events)} events for the next flush")
+        return not retry_events
@@ -0,0 +1,128 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional, Set, Tuple
+from urllib.parse import quote
+
+from depictio_cli.logging import logger
+
+DEFAULT_LOCK_DIR = "~/.depictio/locks"
+OVERLAP_MODES = ["wait", "defer"]
+
+
+class StageLocks:
+    """
+    Advisory file locks coalescing the runs of the same (workflow, data collection, stage) by concurrent processes,
+    so overlapping `data setup` runs do not scan or build the same data collection twice.
+
+    The first process to lock a stage runs it. A process finding the stage locked either:
+    - "wait": waits for the lock and reuses the result of the other process (a pass that succeeded with the same
+      configuration and started after this run did), or runs the stage itself;
+    - "defer": marks the stage dirty and returns at once; the holder runs one follow-up pass once done, covering
+      everything that changed since its pass started. The later stages of the data collection are left to the holder too.
+
+    Lock files are released by the system if the process dies, so a crashed run never blocks the next ones.
+    """
+
+    def __init__(self, lock_dir: str = DEFAULT_LOCK_DIR, on_overlap: str = "wait", max_follow_ups: int = 1):
+        if on_overlap not in OVERLAP_MODES:
+            raise ValueError(f"Invalid overlap mode {on_overlap!r}, expected one of {', '.join(OVERLAP_MODES)}")
+        self.root = os.path.expanduser(lock_dir)
+        self.on_overlap = on_overlap
+        self.max_follow_ups = max_follow_ups
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._deferred: Set[Tuple[str, str]] = set()
+
+    def is_deferred(self, workflow: str, data_collection: str) -> bool:
+        """
+        Whether the stages of a data collection were left to another process (and so not run by this one).
+        """
+        with self._lock:
+            return (workflow, data_collection) in self._deferred
+
+    def _paths(self, workflow: str, data_collection: str, stage: str) -> str:
+        directory = os.path.join(self.root, quote(workflow, safe=""), quote(data_collection, safe=""))
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, stage)
+
+    @staticmethod
+    def _read_result(path: str) -> Optional[dict]:
+        try:
+            with open(f"{path}.result", "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_result(path: str, result: dict) -> None:
+        tmp_path = f"{path}.result.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, f"{path}.result")
+
+    @staticmethod
+    def _mark_dirty(path: str) -> None:
+        with open(f"{path}.dirty", "w") as f:
+            f.write(str(os.getpid()))
+
+    @staticmethod
+    def _take_dirty(path: str) -> bool:
+        try:
+            os.remove(f"{path}.dirty")
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _run_passes(self, path: str, name: str, config_hash: Optional[str], function: Callable[[], bool]) -> bool:
+        follow_ups = 0
+        while True:
+            started_at = time.time()
+            # Requests marked before this point are covered by this pass
+            self._take_dirty(path)
+            success = False
+            try:
+                success = function()
+            finally:
+                self._write_result(path, {"config_hash": config_hash, "started_at": started_at, "finished_at": time.time(), "success": success})
+            if not success or not os.path.exists(f"{path}.dirty"):
+                return success
+            if follow_ups == self.max_follow_ups:
+                logger.warning(f"{name} was requested again during its follow-up pass, leaving it to the next run")
+                return success
+            follow_ups += 1
+            logger.info(f"{name} was requested by another run meanwhile, running a follow-up pass")
+
+    def run(self, workflow: str, data_collection: str, stage: str, config_hash: Optional[str], function: Callable[[], bool]) -> bool:
+        """
+        Run a stage, unless a concurrent run of the same stage covers it. Without a configuration hash (unknown inputs), results are never reused.
+        """
+        name = f"{data_collection}:{stage}"
+        if self.is_deferred(workflow, data_collection):
+            logger.info(f"{name} is left to the process running the earlier stages of {data_collection}")
+            return True
+        path = self._paths(workflow, data_collection, stage)
+        with open(f"{path}.lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if self.on_overlap == "defer":
+                    self._mark_dirty(path)
+                    with self._lock:
+                        self._deferred.add((workflow, data_collection))
+                    logger.info(f"{name} is running in another process, deferred to its follow-up pass")
+                    return True
+                logger.info(f"{name} is running in another process, waiting for it")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.on_overlap == "wait":
+                    result = self._read_result(path)
+                    # A pass that started before this run may have missed the files created since
+                    if config_hash is not None and result and result["success"] and result["config_hash"] == config_hash and result["started_at"] >= self.started_at:
+                        logger.info(f"{name} was run by another process after this run started, reusing its result")
+                        return True
+                return self._run_passes(path, name, config_hash, function)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,143 @@
+import codecs
+import json
+import sys
+from typing import Any, Callable, Iterable, Iterator, List, Optional, TextIO
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array from a stream of byte chunks, yielding its items as they are complete.
+
+    Only the item being parsed is buffered, so memory does not grow with the size of the array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    finished = False
+
+    def more() -> bool:
+        nonlocal buffer, position
+        for chunk in chunk_iterator:
+            text = utf8.decode(chunk)
+            if text:
+                buffer = buffer[position:] + text
+                position = 0
+                return True
+        return False
+
+    chunk_iterator = iter(chunks)
+    exhausted = False
+    while not finished:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        if position >= len(buffer):
+            if exhausted or not more():
+                exhausted = True
+                break
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError(f"Expected a JSON array, got {buffer[position:position + 20]!r}")
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == ",":
+            position += 1
+            continue
+        if buffer[position] == "]":
+            finished = True
+            break
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Incomplete item, read more data
+            if exhausted or not more():
+                raise
+            continue
+
+        if end >= len(buffer) and not exhausted:
+            # A scalar at the end of the buffer may continue in the next chunk
+            if more():
+                continue
+            exhausted = True
+        position = end
+        yield item
+
+    if not finished:
+        raise ValueError("Truncated JSON array")
+    # Read the stream to its end (trailing whitespace), so the response is complete for its consumers (e.g. the HTTP cache)
+    for _ in chunk_iterator:
+        pass
+
+
+def iter_pages(fetch_page: Callable[[int, int], Iterable[Any]], page_size: int) -> Iterator[Any]:
+    """
+    Yield the items of a paginated listing, fetching `page_size` items at a time with fetch_page(skip, limit).
+
+    Stops on the first short page, or after the first page if the endpoint ignores the pagination parameters.
+    """
+    skip = 0
+    while True:
+        count = 0
+        for item in fetch_page(skip, page_size):
+            count += 1
+            yield item
+        if count < page_size:
+            return
+        if count > page_size:
+            # The endpoint does not paginate and returned everything at once
+            return
+        skip += count
+
+
+def _format_tsv_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+class RowWriter:
+    """
+    Write rows to `out` (stdout by default) as NDJSON or TSV, flushing after each row.
+
+    For TSV, the columns default to the keys of the first row.
+    """
+
+    def __init__(self, output_format: str = "ndjson", columns: Optional[List[str]] = None, out: Optional[TextIO] = None):
+        if output_format not in ["ndjson", "tsv"]:
+            raise ValueError(f"Unknown output format '{output_format}', expected 'ndjson' or 'tsv'")
+        self.output_format = output_format
+        self.columns = columns
+        self.out = out or sys.stdout
+        self.count = 0
+
+    def write(self, row: dict) -> None:
+        if self.output_format == "ndjson":
+            self.out.write(json.dumps(row, default=str) + "\n")
+        else:
+            if self.columns is None:
+                self.columns = list(row.keys())
+            if self.count == 0:
+                self.out.write("\t".join(self.columns) + "\n")
+            self.out.write("\t".join(_format_tsv_value(row.get(column)) for column in self.columns) + "\n")
+        self.out.flush()
+        self.count += 1
+
+
+def write_rows(rows: Iterable[dict], output_format: str = "ndjson", columns: Optional[List[str]] = None, out: Optional[TextIO] = None) -> int:
+    """
+    Write rows as they arrive and return the number of rows written.
+    """
+    writer = RowWriter(output_format=output_format, columns=columns, out=out)
+    for row in rows:
+        writer.write(row)
+    return writer.count
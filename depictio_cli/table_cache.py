@@ -0,0 +1,250 @@
+import importlib.util
+import json
+import operator
+import os
+import re
+import sys
+import uuid
+from typing import List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from depictio_cli.logging import logger
+from depictio_cli.metrics import record_cache_lookup
+from depictio_cli.token_manager import authorize_headers
+from depictio_cli.utils import stream_request
+
+DEFAULT_TABLE_CACHE_DIR = "~/.depictio/cache/tables"
+DEFAULT_MAX_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+ARROW_FILE_MAGIC = b"ARROW1"
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Entries of tables served without a version are always downloaded again
+UNVERSIONED = "unversioned"
+
+FILTER_PATTERN = re.compile(r"^\s*(?P<column>[^\s=!<>]+)\s*(?P<op>==|!=|>=|<=|>|<|\bin\b)\s*(?P<value>.+?)\s*$")
+FILTER_OPERATORS = {"==": operator.eq, "!=": operator.ne, ">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+
+
+def _require_pyarrow() -> None:
+    if importlib.util.find_spec("pyarrow") is None:
+        raise RuntimeError("pyarrow is required to read cached tables, install it with `pip install depictio-cli[arrow]`")
+
+
+class TableCache:
+    """
+    Local cache of aggregated tables as Arrow IPC files, one per table, named after the table version.
+
+    Tables are cached under the scope of a server and user (see http_cache.cache_scope), so the tables of the same workflow and
+    data collection tags on another server, or for another user, are never mixed up.
+    The modification time of an entry is its last use: beyond `max_size`, the least recently used entries are evicted first.
+    """
+
+    def __init__(self, scope: str, cache_dir: str = DEFAULT_TABLE_CACHE_DIR, max_size: int = DEFAULT_MAX_CACHE_SIZE):
+        self.scope = scope
+        self.root = os.path.expanduser(cache_dir)
+        self.max_size = max_size
+
+    def table_dir(self, workflow: str, data_collection: str) -> str:
+        return os.path.join(self.root, self.scope, quote(workflow, safe=""), quote(data_collection, safe=""))
+
+    def get_entry(self, workflow: str, data_collection: str) -> Optional[Tuple[str, str]]:
+        """
+        Return the (version, path) of the cached table, if any.
+        """
+        directory = self.table_dir(workflow, data_collection)
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(".arrow")]
+        except FileNotFoundError:
+            return None
+        if not names:
+            return None
+        name = max(names, key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+        return unquote(name[: -len(".arrow")]), os.path.join(directory, name)
+
+    def touch(self, path: str) -> None:
+        os.utime(path, None)
+
+    def put(self, workflow: str, data_collection: str, version: str, source_path: str) -> str:
+        """
+        Move a complete Arrow file into the cache as the given version of a table, dropping its previous versions.
+        """
+        directory = self.table_dir(workflow, data_collection)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{quote(version, safe='')}.arrow")
+        os.replace(source_path, path)
+        for name in os.listdir(directory):
+            if name.endswith(".arrow") and os.path.join(directory, name) != path:
+                os.remove(os.path.join(directory, name))
+        self.evict(keep=path)
+        return path
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".arrow"):
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            # Tables already memory-mapped by a reader stay readable until unmapped
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            logger.debug(f"Evicted {path} from the table cache")
+
+
+def _stream_to_file(path: str) -> None:
+    """
+    Rewrite an Arrow IPC stream as an Arrow IPC file, which can be memory-mapped and read without copies.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+
+    tmp_path = f"{path}.file"
+    with pa.OSFile(path, "rb") as source:
+        reader = pa.ipc.open_stream(source)
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    os.replace(tmp_path, path)
+
+
+def fetch_table(
+    agent_config: dict,
+    workflow: dict,
+    data_collection: dict,
+    headers: dict,
+    cache: TableCache,
+    offline: bool = False,
+) -> str:
+    """
+    Return the path of the cached Arrow file of the aggregated table of a data collection, downloading the table only
+    when the server has a newer version than the cached one (conditional request on the cached version).
+
+    Tables are cached by workflow and data collection tags, so `offline` reads need no request at all.
+    """
+    workflow_tag, dc_tag = workflow["workflow_tag"], data_collection["data_collection_tag"]
+    entry = cache.get_entry(workflow_tag, dc_tag)
+    if offline:
+        if entry is None:
+            raise ValueError(f"Table of {workflow_tag}/{dc_tag} is not cached")
+        record_cache_lookup("table", "hit")
+        cache.touch(entry[1])
+        return entry[1]
+
+    request_headers = {**authorize_headers(headers), "Accept": f"{ARROW_FILE_MEDIA_TYPE}, {ARROW_STREAM_MEDIA_TYPE}"}
+    if entry is not None and entry[0] != UNVERSIONED:
+        request_headers["If-None-Match"] = entry[0]
+    url = f"{agent_config['api_base_url']}/depictio/api/v1/deltatables/get/{workflow['_id']}/{data_collection['_id']}"
+
+    directory = cache.table_dir(workflow_tag, dc_tag)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+    try:
+        with stream_request("GET", url, request_headers, timeout=30 * 60) as response:
+            if response.status_code == 304 and entry is not None:
+                logger.info(f"Cached table of {workflow_tag}/{dc_tag} is up to date (version {entry[0]})")
+                record_cache_lookup("table", "revalidated")
+                cache.touch(entry[1])
+                return entry[1]
+            if response.status_code != 200:
+                response.read()
+                raise ValueError(f"Error fetching the table of {workflow_tag}/{dc_tag}: {response.text}")
+            version = response.headers.get("ETag") or UNVERSIONED
+            record_cache_lookup("table", "miss")
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_bytes(1024 * 1024):
+                    f.write(chunk)
+        with open(tmp_path, "rb") as f:
+            if f.read(len(ARROW_FILE_MAGIC)) != ARROW_FILE_MAGIC:
+                _stream_to_file(tmp_path)
+        logger.info(f"Downloaded the table of {workflow_tag}/{dc_tag} (version {version}, {os.path.getsize(tmp_path)} bytes)")
+        return cache.put(workflow_tag, dc_tag, version, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _parse_value(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text.strip("\"'")
+
+
+def parse_filters(filters: List[str]):
+    """
+    Parse `column <op> value` filters (op in ==, !=, >, >=, <, <= and `in` with comma-separated values) into a pyarrow
+    expression matching all of them. Returns the expression and the columns it reads.
+    """
+    _require_pyarrow()
+    import pyarrow.compute as pc
+
+    expression, columns = None, []
+    for text in filters:
+        match = FILTER_PATTERN.match(text)
+        if not match:
+            raise ValueError(f"Invalid filter {text!r}, expected `column <op> value` with op in ==, !=, >, >=, <, <=, in")
+        field = pc.field(match["column"])
+        if match["op"] == "in":
+            condition = field.isin([_parse_value(value.strip()) for value in match["value"].split(",")])
+        else:
+            condition = FILTER_OPERATORS[match["op"]](field, _parse_value(match["value"]))
+        expression = condition if expression is None else expression & condition
+        columns.append(match["column"])
+    return expression, columns
+
+
+def read_table(path: str, columns: Optional[List[str]] = None, filters: Optional[List[str]] = None):
+    """
+    Read a cached table, memory-mapped: unselected columns are never read, and only the filtered rows are copied.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+
+    # The memory map stays open as long as the table references its buffers
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    expression, filter_columns = parse_filters(filters) if filters else (None, [])
+    if columns:
+        table = table.select(list(dict.fromkeys(columns + filter_columns)))
+    if expression is not None:
+        table = table.filter(expression)
+    if columns:
+        table = table.select(columns)
+    return table
+
+
+def write_table(table, output: Optional[str] = None) -> None:
+    """
+    Write a table to a file, in the format given by its extension (.parquet, .arrow/.feather, .csv, .tsv), or as CSV to stdout.
+    """
+    import pyarrow as pa
+    import pyarrow.csv
+
+    if output is None or output == "-":
+        pyarrow.csv.write_csv(table, sys.stdout.buffer)
+        return
+    extension = os.path.splitext(output)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(table, output, compression="zstd")
+    elif extension in (".arrow", ".feather", ".ipc"):
+        with pa.OSFile(output, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif extension in (".csv", ".tsv"):
+        pyarrow.csv.write_csv(table, output, pyarrow.csv.WriteOptions(delimiter="\t" if extension == ".tsv" else ","))
+    else:
+        raise ValueError(f"Unsupported output format {extension!r}, use .parquet, .arrow, .csv or .tsv")
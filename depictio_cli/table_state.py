@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from depictio_cli.journal import compute_config_hash
+from depictio_cli.scheduler import get_dc_wildcards
+
+DEFAULT_TABLE_STATE_PATH = "~/.depictio/table_state.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS table_versions (
+    workflow TEXT NOT NULL,
+    data_collection TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    schema_hash TEXT NOT NULL,
+    columns TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (workflow, data_collection)
+);
+CREATE TABLE IF NOT EXISTS table_files (
+    workflow TEXT NOT NULL,
+    data_collection TEXT NOT NULL,
+    path TEXT NOT NULL,
+    fingerprint TEXT,
+    PRIMARY KEY (workflow, data_collection, path)
+);
+"""
+
+
+def get_dc_wildcard_names(dc: dict) -> List[str]:
+    return list(dict.fromkeys(wildcard["name"] for wildcard in get_dc_wildcards(dc) if wildcard.get("name")))
+
+
+def compute_table_schema_hash(dc: dict) -> str:
+    """
+    Hash of the parts of a data collection configuration that shape its table (read options, kept columns, wildcards).
+    """
+    config = dc.get("config", {})
+    return compute_config_hash(config.get("dc_specific_properties"), get_dc_wildcard_names(dc))
+
+
+class TableState:
+    """
+    SQLite-backed record of the last table version written for each data collection and of the files it was built from.
+    """
+
+    def __init__(self, path: str = DEFAULT_TABLE_STATE_PATH):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def get_version(self, workflow: str, data_collection: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, schema_hash, columns, updated_at FROM table_versions WHERE workflow = ? AND data_collection = ?",
+                (workflow, data_collection),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(row, columns=json.loads(row["columns"]) if row["columns"] else None)
+
+    def get_files(self, workflow: str, data_collection: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, fingerprint FROM table_files WHERE workflow = ? AND data_collection = ?", (workflow, data_collection)
+            ).fetchall()
+        return {row["path"]: row["fingerprint"] for row in rows}
+
+    def record(
+        self,
+        workflow: str,
+        data_collection: str,
+        version: int,
+        schema_hash: str,
+        files: Dict[str, str],
+        columns: Optional[List[str]] = None,
+        replace: bool = False,
+    ) -> None:
+        """
+        Record a new table version and the files written into it. With `replace` (full rebuild), the previous files are forgotten.
+        """
+        with self._lock:
+            if replace:
+                self._conn.execute("DELETE FROM table_files WHERE workflow = ? AND data_collection = ?", (workflow, data_collection))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO table_files (workflow, data_collection, path, fingerprint) VALUES (?, ?, ?, ?)",
+                [(workflow, data_collection, path, fingerprint) for path, fingerprint in files.items()],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO table_versions (workflow, data_collection, version, schema_hash, columns, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (workflow, data_collection, version, schema_hash, json.dumps(columns) if columns is not None else None, datetime.now().isoformat()),
+            )
+            self._conn.commit()
+
+    def invalidate(self, workflow: str, data_collection: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM table_versions WHERE workflow = ? AND data_collection = ?", (workflow, data_collection))
+            self._conn.execute("DELETE FROM table_files WHERE workflow = ? AND data_collection = ?", (workflow, data_collection))
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def plan_table_update(
+    state: TableState,
+    workflow: str,
+    dc: dict,
+    files: Dict[str, str],
+    read_columns: Optional[Callable[[str], Optional[List[str]]]] = None,
+    full_rebuild: bool = False,
+) -> dict:
+    """
+    Decide how to bring the table of a data collection up to date with its current files ({path: fingerprint}).
+
+    Returns a plan with a mode ("create": full rebuild, "append": new files only, "upsert": new or changed files,
+    keyed on the wildcard columns, "noop": nothing to do), the files to write and the reason of the decision.
+    """
+    data_collection = str(dc["_id"])
+    schema_hash = compute_table_schema_hash(dc)
+    plan = {"schema_hash": schema_hash, "files": sorted(files), "new": [], "changed": [], "columns": None}
+
+    if full_rebuild:
+        return {**plan, "mode": "create", "reason": "full rebuild requested"}
+    previous = state.get_version(workflow, data_collection)
+    if previous is None:
+        return {**plan, "mode": "create", "reason": "no previous table version"}
+    if previous["schema_hash"] != schema_hash:
+        return {**plan, "mode": "create", "reason": "table configuration changed"}
+
+    previous_files = state.get_files(workflow, data_collection)
+    removed = [path for path in previous_files if path not in files]
+    if removed:
+        return {**plan, "mode": "create", "reason": f"{len(removed)} files removed"}
+
+    new = sorted(path for path in files if path not in previous_files)
+    changed = sorted(path for path in files if path in previous_files and previous_files[path] != files[path])
+    plan.update(new=new, changed=changed, columns=previous["columns"])
+    if not new and not changed:
+        return {**plan, "mode": "noop", "reason": "no new or changed files"}
+    if changed and not get_dc_wildcard_names(dc):
+        return {**plan, "mode": "create", "reason": "changed files but no wildcard columns to upsert on"}
+
+    if read_columns is not None and previous["columns"]:
+        for path in new + changed:
+            columns = read_columns(path)
+            if columns is not None and columns != previous["columns"]:
+                return {**plan, "mode": "create", "reason": f"columns of {path} differ from the table"}
+
+    return {**plan, "mode": "upsert" if changed else "append", "reason": f"{len(new)} new and {len(changed)} changed files"}
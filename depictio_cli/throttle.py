@@ -0,0 +1,224 @@
+import fcntl
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote, urlsplit
+
+from depictio_cli.logging import logger
+
+DEFAULT_THROTTLE_DIR = "~/.depictio/throttle"
+
+# Priority classes, most urgent first. Each class leaves a share of the bucket to the more urgent ones,
+# so small calls always find bandwidth left even when bulk transfers of other processes saturate the cap.
+PRIORITY_CLASSES = ["interactive", "metadata", "bulk"]
+PRIORITY_RESERVES = {"interactive": 0.0, "metadata": 0.1, "bulk": 0.3}
+# Request bodies up to this size are metadata, larger ones bulk transfers
+METADATA_MAX_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+
+def request_priority(content: Optional[bytes]) -> str:
+    return "metadata" if not content or len(content) <= METADATA_MAX_SIZE else "bulk"
+
+
+def parse_bandwidth_limits(limits: List[str]) -> Dict[str, float]:
+    """
+    Parse per-host limits "HOST=MB/s" ("*=MB/s" for every host) into bytes per second.
+    """
+    parsed = {}
+    for limit in limits:
+        host, _, value = limit.rpartition("=")
+        try:
+            rate = float(value)
+        except ValueError:
+            rate = 0.0
+        if not host or rate <= 0:
+            raise ValueError(f"Invalid bandwidth limit {limit!r}, expected HOST=MB/s")
+        parsed[host] = rate * 1024 * 1024
+    return parsed
+
+
+class TokenBucket:
+    """
+    Token bucket of `rate` bytes per second, holding at most `burst` bytes. With a state directory, the bucket is
+    shared by every process using it: its state lives in a file, updated under an exclusive lock.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None, state_dir: Optional[str] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or rate
+        self.state_path = os.path.join(state_dir, f"{quote(name, safe='')}.bucket") if state_dir else None
+        self._state = (self.burst, time.time())
+
+    def _read_state(self, f) -> tuple:
+        f.seek(0)
+        try:
+            tokens, last = (float(value) for value in f.read().split())
+            return tokens, last
+        except ValueError:
+            return self.burst, time.time()
+
+    def _write_state(self, f, state: tuple) -> None:
+        f.seek(0)
+        f.truncate()
+        f.write(f"{state[0]!r} {state[1]!r}")
+        f.flush()
+
+    def lock(self, stack: ExitStack):
+        """
+        Lock the shared state for the duration of the stack. Returns the open state file, or None for a local bucket.
+        """
+        if self.state_path is None:
+            return None
+        f = stack.enter_context(open(self.state_path, "a+"))
+        fcntl.flock(f, fcntl.LOCK_EX)
+        stack.callback(fcntl.flock, f, fcntl.LOCK_UN)
+        return f
+
+    def available(self, f) -> float:
+        tokens, last = self._read_state(f) if f is not None else self._state
+        now = time.time()
+        return min(self.burst, tokens + max(0.0, now - last) * self.rate)
+
+    def set_tokens(self, f, tokens: float) -> None:
+        state = (tokens, time.time())
+        if f is not None:
+            self._write_state(f, state)
+        else:
+            self._state = state
+
+
+class _Waiter:
+    def __init__(self, priority: str, seq: int):
+        self.key = (PRIORITY_CLASSES.index(priority), seq)
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class Throttle:
+    """
+    Bandwidth limiter of the request bodies sent to the API: a global cap and per-host caps, as token buckets
+    shared by the threads of the process and, through lock files in `state_dir`, by concurrent processes.
+
+    Within a process, waiting transfers are served by priority class (interactive, metadata, then bulk);
+    across processes, each class leaves a reserve of the buckets to the more urgent ones.
+    """
+
+    def __init__(
+        self,
+        max_bandwidth: Optional[float] = None,
+        host_bandwidth: Optional[Dict[str, float]] = None,
+        state_dir: Optional[str] = DEFAULT_THROTTLE_DIR,
+    ):
+        self.state_dir = os.path.expanduser(state_dir) if state_dir else None
+        if self.state_dir:
+            os.makedirs(self.state_dir, exist_ok=True)
+        self.global_bucket = TokenBucket("global", max_bandwidth, state_dir=self.state_dir) if max_bandwidth else None
+        self.host_bandwidth = host_bandwidth or {}
+        self._host_buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._condition = threading.Condition()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.stats = {priority: {"bytes": 0, "wait": 0.0} for priority in PRIORITY_CLASSES}
+
+    def buckets(self, host: str) -> List[TokenBucket]:
+        with self._condition:
+            if host not in self._host_buckets:
+                rate = self.host_bandwidth.get(host, self.host_bandwidth.get("*"))
+                self._host_buckets[host] = TokenBucket(f"host-{host}", rate, state_dir=self.state_dir) if rate else None
+            host_bucket = self._host_buckets[host]
+        return [bucket for bucket in (self.global_bucket, host_bucket) if bucket is not None]
+
+    def chunk_size(self, host: str) -> int:
+        buckets = self.buckets(host)
+        if not buckets:
+            return MAX_CHUNK_SIZE
+        # A chunk must fit in what the bulk class may take from the smallest bucket
+        smallest = min(bucket.burst for bucket in buckets) * (1 - PRIORITY_RESERVES["bulk"])
+        return max(16 * 1024, min(MAX_CHUNK_SIZE, int(smallest)))
+
+    def _try_take(self, buckets: List[TokenBucket], nbytes: int, priority: str) -> float:
+        """
+        Take `nbytes` from every bucket at once, or from none. Returns 0 when taken, otherwise the time to wait.
+        """
+        with ExitStack() as stack:
+            # Buckets are always locked in the same order (global, then host)
+            files = [bucket.lock(stack) for bucket in buckets]
+            available = [bucket.available(f) for bucket, f in zip(buckets, files)]
+            wait = 0.0
+            for bucket, tokens in zip(buckets, available):
+                # Larger transfers than the bucket go into debt once it is full
+                needed = min(nbytes + PRIORITY_RESERVES[priority] * bucket.burst, bucket.burst)
+                wait = max(wait, (needed - tokens) / bucket.rate)
+            if wait > 0:
+                return wait
+            for bucket, f, tokens in zip(buckets, files, available):
+                bucket.set_tokens(f, tokens - nbytes)
+            return 0.0
+
+    def acquire(self, host: str, nbytes: int, priority: str = "bulk") -> None:
+        """
+        Wait until `nbytes` can be sent to a host.
+        """
+        buckets = self.buckets(host)
+        if not buckets or nbytes <= 0:
+            return
+        start = time.monotonic()
+        waiter = _Waiter(priority, next(self._seq))
+        with self._condition:
+            heapq.heappush(self._waiters, waiter)
+            self._condition.notify_all()
+            try:
+                while True:
+                    if self._waiters[0] is not waiter:
+                        self._condition.wait()
+                        continue
+                    wait = self._try_take(buckets, nbytes, priority)
+                    if wait == 0:
+                        break
+                    # Woken early when a more urgent transfer arrives
+                    self._condition.wait(timeout=min(wait, 1.0))
+                waited = time.monotonic() - start
+                self.stats[priority]["bytes"] += nbytes
+                self.stats[priority]["wait"] += waited
+            finally:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+        if waited > 5:
+            logger.debug(f"Waited {waited:.1f}s for {nbytes} bytes of {priority} bandwidth to {host}")
+
+    def iter_content(self, url: str, content: bytes, priority: str = "bulk") -> Iterator[bytes]:
+        """
+        Yield a request body in chunks, each sent once the buckets allow it.
+        """
+        host = urlsplit(url).hostname or ""
+        chunk_size = self.chunk_size(host)
+        view = memoryview(content)
+        for start in range(0, len(content), chunk_size):
+            chunk = view[start : start + chunk_size]
+            self.acquire(host, len(chunk), priority)
+            yield bytes(chunk)
+
+
+_throttle: Optional[Throttle] = None
+
+
+def configure_throttle(
+    max_bandwidth: Optional[float] = None, host_bandwidth: Optional[Dict[str, float]] = None, state_dir: Optional[str] = DEFAULT_THROTTLE_DIR
+) -> None:
+    """
+    Limit the bandwidth of the requests of the process (bytes per second), or remove the limits.
+    """
+    global _throttle
+    _throttle = Throttle(max_bandwidth, host_bandwidth, state_dir) if max_bandwidth or host_bandwidth else None
+
+
+def get_throttle() -> Optional[Throttle]:
+    return _throttle
@@ -0,0 +1,148 @@
+import contextvars
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from depictio_cli.logging import logger
+
+EXPIRE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_expire_datetime(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, EXPIRE_DATETIME_FORMAT).timestamp()
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class TokenManager:
+    """
+    Keep the access token of the agent valid during long runs. The token is refreshed `refresh_margin` seconds before
+    it expires, when it is used or by a background timer, and after a request saw it rejected.
+
+    `refresh` takes the current access token and returns the new token ({"access_token", "expire_datetime"}).
+    `user` identifies the user the token is for (see http_cache.cache_scope), unchanged by refreshes.
+    Requests read the token without locking: a refresh swaps it in a single assignment, and concurrent refreshes
+    of the same stale token result in a single call to `refresh`.
+    """
+
+    def __init__(
+        self,
+        token: dict,
+        refresh: Callable[[str], dict],
+        refresh_margin: float = 300.0,
+        on_refresh: Optional[Callable[[dict], None]] = None,
+        user: Optional[str] = None,
+    ):
+        self.user = user
+        self._token = (token["access_token"], parse_expire_datetime(token.get("expire_datetime")))
+        self._refresh = refresh
+        self.refresh_margin = refresh_margin
+        self.on_refresh = on_refresh
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        return self._token[1]
+
+    def needs_refresh(self) -> bool:
+        expires_at = self._token[1]
+        return expires_at is not None and time.time() >= expires_at - self.refresh_margin
+
+    def access_token(self) -> str:
+        """
+        Return the current access token, refreshing it first when it is about to expire.
+        """
+        token, expires_at = self._token
+        if self.needs_refresh():
+            try:
+                return self.refresh(stale_token=token)
+            except Exception as e:
+                if time.time() >= expires_at:
+                    raise
+                logger.warning(f"Could not refresh the access token ({e}), using it until it expires")
+        return token
+
+    def refresh(self, stale_token: Optional[str] = None) -> str:
+        """
+        Refresh the access token. Given the token a request used, nothing is done if it was already replaced meanwhile.
+        """
+        with self._lock:
+            token, _ = self._token
+            if stale_token is not None and token != stale_token:
+                return token
+            new_token = self._refresh(token)
+            self._token = (new_token["access_token"], parse_expire_datetime(new_token.get("expire_datetime")))
+            self.refreshes += 1
+        logger.info(f"Access token refreshed, valid until {new_token.get('expire_datetime')}")
+        if self.on_refresh:
+            self.on_refresh(new_token)
+        return new_token["access_token"]
+
+    def start(self) -> None:
+        """
+        Refresh the token in the background before it expires, so it stays valid through long local stages.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="depictio-token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            expires_at = self.expires_at
+            delay = 3600.0 if expires_at is None else max(0.0, expires_at - self.refresh_margin - time.time())
+            if self._stop.wait(delay):
+                return
+            if expires_at is None or self.expires_at != expires_at:
+                continue
+            try:
+                self.refresh(stale_token=self._token[0])
+            except Exception as e:
+                logger.warning(f"Could not refresh the access token ({e}), retrying in a minute")
+                if self._stop.wait(60.0):
+                    return
+
+
+_token_manager: Optional[TokenManager] = None
+# Token manager of the API client the current call runs for (see DepictioClient), used instead of the one of the process
+_context_token_manager: contextvars.ContextVar = contextvars.ContextVar("depictio_token_manager", default=None)
+
+
+def set_token_manager(token_manager: Optional[TokenManager]) -> None:
+    global _token_manager
+    if _token_manager is not None and _token_manager is not token_manager:
+        _token_manager.stop()
+    _token_manager = token_manager
+
+
+def set_context_token_manager(token_manager: Optional[TokenManager]) -> None:
+    _context_token_manager.set(token_manager)
+
+
+def get_token_manager() -> Optional[TokenManager]:
+    token_manager = _context_token_manager.get()
+    return token_manager if token_manager is not None else _token_manager
+
+
+def authorize_headers(headers: Optional[dict]) -> dict:
+    """
+    Return the headers with the current access token, for requests carrying the agent token (e.g. streamed ones).
+    """
+    headers = dict(headers or {})
+    token_manager = get_token_manager()
+    if token_manager is not None and headers.get("Authorization", "").startswith("Bearer "):
+        headers["Authorization"] = f"Bearer {token_manager.access_token()}"
+    return headers
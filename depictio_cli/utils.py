@@ -1,9 +1,33 @@
-import json
+import contextvars
+import hashlib
+import logging
+import stat
 import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from depictio_cli import codec
+from depictio_cli.build_jobs import track_build_jobs
 from depictio_cli.models import AgentConfig
 import os, yaml, typer, httpx
-from typing import Dict, Optional, Tuple, List
+from typing import Any, Dict, Iterator, Optional, Tuple, List, Union
+from depictio_cli.conversion import DEFAULT_CACHE_DIR, convert_data_collection, is_uploaded, log_conversion_errors, mark_uploaded
+from depictio_cli.file_stats import compute_data_collection_stats, read_header
+from depictio_cli.http_cache import cache_scope, get_http_cache
+from depictio_cli.journal import compute_config_hash
 from depictio_cli.logging import logger
+from depictio_cli.manifest import Manifest
+from depictio_cli.metrics import record_files_scanned, record_request, stage_timer
+from depictio_cli.progress import TaskCancelled, current_task, iter_ndjson_events, iter_sse_events
+from depictio_cli.scanner import discover_runs, scan_runs
+from depictio_cli.schema_inference import get_table_read_options
+from depictio_cli.scheduler import DAGScheduler, build_workflow_dag, get_dc_join_references, get_dc_type
+from depictio_cli.streaming import iter_json_array, iter_pages
+from depictio_cli.token_manager import TokenManager, authorize_headers, get_token_manager, set_context_token_manager, set_token_manager
+from depictio_cli.table_state import TableState, get_dc_wildcard_names, plan_table_update
+from depictio_cli.throttle import get_throttle, request_priority
+from depictio_cli.validation import validate_pipeline_config_locally
+from depictio_cli.wire import encode_manifest
 
 
 def get_config(filename: str):
@@ -36,6 +60,18 @@ def load_depictio_config(config_path="~/.depictio/agent.yaml"):
         raise typer.Exit(code=1)
 
 
+def load_agent_identity(config_path: str = "~/.depictio/agent.yaml") -> dict:
+    """
+    Read the server and user of an agent configuration file, without validating its token (which may have expired),
+    e.g. to select the local caches of the user offline.
+    """
+    agent_config = get_config(os.path.expanduser(config_path))
+    try:
+        return {"api_base_url": agent_config["api_base_url"], "user": {"email": agent_config["user"]["email"]}}
+    except (KeyError, TypeError):
+        raise ValueError(f"{config_path} is not an agent configuration: api_base_url and user.email are required")
+
+
 def validate_depictio_agent_config(depictio_agent_config):
     # Validate the Depictio agent configuration
     config = AgentConfig(**depictio_agent_config)
@@ -44,20 +80,374 @@ def validate_depictio_agent_config(depictio_agent_config):
     return config.dict()
 
 
+# Status codes for which a request is worth retrying
+RETRY_STATUS_CODES = [502, 503, 504]
+# Stage lock of the batched builds of a workflow (see process_workflow), in place of a data collection tag
+BATCH_BUILDS_LOCK = "_batch_builds"
+# Connection pool of the API client the current call runs for (see DepictioClient); elsewhere, each request opens its own connection
+_http_client: contextvars.ContextVar = contextvars.ContextVar("depictio_http_client", default=None)
+
+
+def use_api_session(http_client: Optional[httpx.Client], token_manager: Optional[TokenManager]) -> None:
+    """
+    Send the requests of the current context through a connection pool, with the token of the given token manager.
+    """
+    _http_client.set(http_client)
+    set_context_token_manager(token_manager)
+
+
+def _http() -> Any:
+    http_client = _http_client.get()
+    return http_client if http_client is not None else httpx
+
+
+def _send_request(
+    method: str,
+    url: str,
+    headers: dict,
+    content: Optional[bytes],
+    params: Optional[dict],
+    timeout: float,
+    retries: int,
+    backoff: float,
+    priority: Optional[str] = None,
+) -> httpx.Response:
+    throttle = get_throttle()
+    if throttle is not None and content:
+        # The body is sent in chunks as the bandwidth limits allow, with its length known upfront
+        headers = {**headers, "Content-Length": str(len(content))}
+    for attempt in range(retries + 1):
+        body = throttle.iter_content(url, content, priority or request_priority(content)) if throttle is not None and content else content
+        start = time.monotonic()
+        try:
+            response = _http().request(method, url, headers=headers, content=body, params=params, timeout=timeout)
+        except httpx.TransportError as e:
+            record_request(method, url, "error", time.monotonic() - start, len(content or b""), retried=attempt > 0)
+            if attempt == retries:
+                raise
+            logger.warning(f"{method} {url} failed ({e}), retrying ({attempt + 1}/{retries})")
+        else:
+            record_request(method, url, str(response.status_code), time.monotonic() - start, len(content or b""), retried=attempt > 0)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return response
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying ({attempt + 1}/{retries})")
+        time.sleep(backoff * 2**attempt)
+
+
+def _send_authorized(
+    method: str,
+    url: str,
+    headers: dict,
+    content: Optional[bytes],
+    params: Optional[dict],
+    timeout: float,
+    retries: int,
+    backoff: float,
+    priority: Optional[str] = None,
+) -> httpx.Response:
+    """
+    Send a request with the current access token. A request rejected with 401 is retried exactly once, after a token refresh.
+    """
+    token_manager = get_token_manager()
+    if token_manager is None or not headers.get("Authorization", "").startswith("Bearer "):
+        return _send_request(method, url, headers, content, params, timeout, retries, backoff, priority)
+
+    token = token_manager.access_token()
+    response = _send_request(method, url, {**headers, "Authorization": f"Bearer {token}"}, content, params, timeout, retries, backoff, priority)
+    if response.status_code != 401:
+        return response
+    try:
+        # Concurrent requests rejected with the same token share a single refresh
+        token = token_manager.refresh(stale_token=token)
+    except Exception as e:
+        logger.error(f"Could not refresh the access token: {e}")
+        return response
+    logger.info(f"{method} {url} was not authorized, retrying with a refreshed token")
+    return _send_request(method, url, {**headers, "Authorization": f"Bearer {token}"}, content, params, timeout, retries, backoff, priority)
+
+
+def _cache_user() -> Optional[str]:
+    # Cached responses are keyed by the user of the token manager rather than by its token, which changes on every refresh
+    token_manager = get_token_manager()
+    return token_manager.user if token_manager is not None else None
+
+
+def api_request(
+    method: str,
+    url: str,
+    headers: Optional[dict] = None,
+    json_body: Any = None,
+    params: Optional[dict] = None,
+    timeout: float = 30.0,
+    retries: int = 0,
+    backoff: float = 1.0,
+    content: Optional[bytes] = None,
+    priority: Optional[str] = None,
+) -> httpx.Response:
+    """
+    Send a request to the Depictio API.
+
+    The JSON body is encoded once with the fast codec, so retries (on connection errors and 502/503/504)
+    reuse the same bytes instead of re-serialising the body. Only idempotent requests (GET, DELETE) should be retried:
+    a POST answered with a gateway error may still have been processed by the server. Raw bodies (e.g. Parquet files) are passed as `content`.
+    GET requests go through the HTTP cache (unless disabled with --no-cache): cached responses are revalidated
+    instead of downloaded again, and concurrent identical requests share one fetch.
+    With bandwidth limits (--max-bandwidth), bodies are sent at the pace of their priority class
+    (interactive, metadata, bulk), by default metadata for small bodies and bulk for large ones.
+    """
+    headers = dict(headers or {})
+    if json_body is not None:
+        content = codec.dumps(json_body)
+        headers["Content-Type"] = "application/json"
+
+    if method == "GET" and content is None:
+        http_cache = get_http_cache()
+        if http_cache is not None:
+            return http_cache.request(
+                url,
+                params,
+                headers,
+                lambda request_headers: _send_authorized(method, url, request_headers, None, params, timeout, retries, backoff),
+                user=_cache_user(),
+            )
+    return _send_authorized(method, url, headers, content, params, timeout, retries, backoff, priority)
+
+
+@contextmanager
+def stream_request(
+    method: str,
+    url: str,
+    headers: dict,
+    content: Optional[bytes] = None,
+    params: Optional[dict] = None,
+    timeout: Any = 30.0,
+    priority: Optional[str] = None,
+    retried: bool = False,
+) -> Iterator[httpx.Response]:
+    """
+    Open a streamed request, its body sent within the bandwidth limits. The request is recorded in the metrics once the stream is closed.
+
+    As with api_request, a request rejected with 401 is sent again exactly once, after a token refresh.
+    """
+    throttle = get_throttle()
+    if throttle is not None and content:
+        headers = {**headers, "Content-Length": str(len(content))}
+
+    def open_stream(request_headers: dict):
+        body = throttle.iter_content(url, content, priority or request_priority(content)) if throttle is not None and content else content
+        return _http().stream(method, url, headers=request_headers, content=body, params=params, timeout=timeout)
+
+    token_manager = get_token_manager()
+    authorization = headers.get("Authorization", "")
+    start = time.monotonic()
+    status = "error"
+    try:
+        with ExitStack() as stack:
+            response = stack.enter_context(open_stream(headers))
+            if response.status_code == 401 and token_manager is not None and authorization.startswith("Bearer "):
+                try:
+                    # Concurrent requests rejected with the same token share a single refresh
+                    token = token_manager.refresh(stale_token=authorization[len("Bearer ") :])
+                except Exception as e:
+                    logger.error(f"Could not refresh the access token: {e}")
+                else:
+                    logger.info(f"{method} {url} was not authorized, retrying with a refreshed token")
+                    record_request(method, url, "401", time.monotonic() - start, len(content or b""), retried=retried)
+                    stack.close()
+                    start = time.monotonic()
+                    response = stack.enter_context(open_stream({**headers, "Authorization": f"Bearer {token}"}))
+            status = str(response.status_code)
+            yield response
+    finally:
+        record_request(method, url, status, time.monotonic() - start, len(content or b""), retried=retried)
+
+
+def progress_request(
+    method: str, url: str, headers: Optional[dict] = None, json_body: Any = None, timeout: float = 30.0, retries: int = 2, backoff: float = 1.0
+) -> httpx.Response:
+    """
+    Send a long-running request, following its progress events (server-sent events or chunked NDJSON) when it runs
+    in a progress task. The final result event is returned as a regular response; servers not streaming progress answer as usual.
+
+    `timeout` bounds the wait between two events. A cancelled task closes the stream, cancels the server job and raises TaskCancelled.
+    Connection errors and 502/503/504 answers before the first event are retried (scans and builds converge to the same
+    state when sent again); once events arrive, the request is followed to its end.
+    """
+    task = current_task()
+    if task is None:
+        return api_request(method, url, headers=headers, json_body=json_body, timeout=timeout, retries=retries, backoff=backoff)
+
+    request_headers = {**authorize_headers(headers), "Accept": "text/event-stream, application/x-ndjson;q=0.9, application/json;q=0.5"}
+    content = None
+    if json_body is not None:
+        content = codec.dumps(json_body)
+        request_headers["Content-Type"] = "application/json"
+
+    job_id = None
+    response = None
+    for attempt in range(retries + 1):
+        received = False
+        try:
+            with stream_request(method, url, request_headers, content, timeout=timeout, retried=attempt > 0) as response:
+                if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                    response.read()
+                    logger.warning(f"{method} {url} returned {response.status_code}, retrying ({attempt + 1}/{retries})")
+                else:
+                    content_type = response.headers.get("content-type", "")
+                    if content_type.startswith("text/event-stream"):
+                        events = iter_sse_events(response.iter_lines())
+                    elif content_type.startswith("application/x-ndjson"):
+                        events = iter_ndjson_events(response.iter_lines())
+                    else:
+                        response.read()
+                        return response
+
+                    task.on_cancel(response.close)
+                    try:
+                        for event in events:
+                            received = True
+                            data = event["data"] if isinstance(event["data"], dict) else {"message": str(event["data"])}
+                            if event["event"] == "progress":
+                                job_id = data.get("job_id", job_id)
+                                task.update(data)
+                            elif event["event"] == "result":
+                                return httpx.Response(data.get("status_code", 200), json=data.get("body"), request=response.request)
+                            elif event["event"] == "error":
+                                return httpx.Response(data.get("status_code", 500), json={"detail": data.get("detail", data.get("message"))}, request=response.request)
+                    finally:
+                        task.on_cancel(None)
+                    break
+        except (httpx.StreamError, httpx.TransportError) as e:
+            if task.cancelled:
+                break
+            if received or attempt == retries:
+                raise
+            logger.warning(f"{method} {url} failed ({e}), retrying ({attempt + 1}/{retries})")
+        if task.cancelled:
+            break
+        time.sleep(backoff * 2**attempt)
+
+    if task.cancelled:
+        if job_id:
+            cancel_response = api_request("POST", f"{_api_base_url(url)}/depictio/api/v1/jobs/cancel/{job_id}", headers=headers)
+            if cancel_response.status_code != 200:
+                logger.warning(f"Could not cancel server job {job_id}: {cancel_response.text}")
+        raise TaskCancelled(f"{task.dc_tag}:{task.stage} cancelled ({task.cancel_reason})")
+    return httpx.Response(502, json={"detail": "progress stream ended without a result"}, request=response.request)
+
+
+def _api_base_url(url: str) -> str:
+    return url.split("/depictio/api/v1/", 1)[0]
+
+
+def response_json(response: httpx.Response) -> Any:
+    """
+    Decode the JSON body of a response with the fast codec.
+    """
+    return codec.loads(response.content)
+
+
+def refresh_access_token(agent_config: dict, access_token: str, config_path: Optional[str] = None) -> dict:
+    """
+    Get a new access token from the auth endpoint. If the server cannot refresh it, the token of the agent configuration
+    file is used instead when it was renewed there (e.g. by another process).
+    """
+    response = _send_request(
+        "POST",
+        f"{agent_config['api_base_url']}/depictio/api/v1/auth/refresh_token",
+        {"Authorization": f"Bearer {access_token}"},
+        None,
+        None,
+        30.0,
+        2,
+        1.0,
+    )
+    if response.status_code == 200:
+        body = response_json(response)
+        return {"access_token": body["access_token"], "expire_datetime": body["expire_datetime"]}
+    if config_path:
+        with open(os.path.expanduser(config_path), "r") as f:
+            token = (yaml.safe_load(f) or {}).get("user", {}).get("token") or {}
+        if token.get("access_token") and token["access_token"] != access_token:
+            logger.info(f"Using the access token renewed in {config_path}")
+            return {"access_token": token["access_token"], "expire_datetime": token.get("expire_datetime")}
+    raise ValueError(f"Cannot refresh the access token: {response.status_code} {response.text}")
+
+
+def save_agent_token(config_path: str, token: dict) -> None:
+    """
+    Write a refreshed token to the agent configuration file (atomically), so the next runs start with it.
+    """
+    path = os.path.expanduser(config_path)
+    with open(path, "r") as f:
+        config = yaml.safe_load(f)
+    config["user"]["token"].update(access_token=token["access_token"], expire_datetime=token["expire_datetime"])
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    # The file holds credentials: the temporary file is never readable by others, and gets the mode of the original
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        os.fchmod(f.fileno(), mode)
+        yaml.dump(config, f, default_flow_style=False)
+    os.replace(tmp_path, path)
+
+
+def create_token_manager(agent_config: dict, config_path: Optional[str] = None) -> TokenManager:
+    """
+    Create the token manager of an agent: refreshed tokens are written back to its configuration (and file, if any).
+    """
+
+    def on_refresh(token: dict) -> None:
+        agent_config["user"]["token"].update(access_token=token["access_token"], expire_datetime=token["expire_datetime"])
+        if config_path:
+            try:
+                save_agent_token(config_path, token)
+            except (OSError, KeyError, TypeError, yaml.YAMLError) as e:
+                logger.warning(f"Could not save the refreshed token to {config_path}: {e}")
+
+    return TokenManager(
+        agent_config["user"]["token"],
+        refresh=lambda access_token: refresh_access_token(agent_config, access_token, config_path),
+        on_refresh=on_refresh,
+        user=cache_scope(agent_config),
+    )
+
+
+def start_token_manager(agent_config: dict, config_path: Optional[str] = None) -> TokenManager:
+    """
+    Manage the token of the agent for the rest of the run: requests use the current token, refreshed before it expires.
+    """
+    token_manager = create_token_manager(agent_config, config_path)
+    set_token_manager(token_manager)
+    token_manager.start()
+    return token_manager
+
+
 def login(config_path: str = "~/.depictio/agent.yaml"):
     depictio_agent_config = load_depictio_config(config_path=config_path)
     logger.info(f"Depict.io agent configuration loaded: {depictio_agent_config}")
 
     # Connect to depictio API
-    response = httpx.post(f"{depictio_agent_config['api_base_url']}/depictio/api/v1/cli/validate_agent_config", json=depictio_agent_config)
+    response = api_request("POST", f"{depictio_agent_config['api_base_url']}/depictio/api/v1/cli/validate_agent_config", json_body=depictio_agent_config, priority="interactive")
     if response.status_code == 200:
         logger.info("Agent configuration is valid.")
+        start_token_manager(depictio_agent_config, config_path)
         return {"success": True, "agent_config": depictio_agent_config}
     else:
         logger.info(f"Agent configuration is invalid: {response.text}")
         return {"success": False}
 
 
+def login_headers(config_path: str = "~/.depictio/agent.yaml") -> Tuple[dict, dict]:
+    """
+    Log in and return the agent configuration and the authorization headers, exiting if the login fails.
+    """
+    login_response = login(config_path)
+    if not login_response["success"]:
+        raise typer.Exit(code=1)
+    agent_config = login_response["agent_config"]
+    return agent_config, {"Authorization": f"Bearer {agent_config['user']['token']['access_token']}"}
+
+
 def remote_validate_pipeline_config(agent_config: dict, pipeline_config_path: str):
     # Load the pipeline configuration
     pipeline_config = get_config(pipeline_config_path)
@@ -66,10 +456,23 @@ def remote_validate_pipeline_config(agent_config: dict, pipeline_config_path: st
     logger.info(f"Agent config: {agent_config}")
     logger.info(f"Pipeline config: {pipeline_config}")
 
+    # Only configurations passing the local checks are sent to the server
+    errors = validate_pipeline_config_locally(pipeline_config)
+    if errors:
+        for error in errors:
+            logger.error(error)
+        logger.error(f"Pipeline configuration failed the local validation with {len(errors)} error(s).")
+        return {"success": False, "errors": errors}
+
     token = agent_config["user"]["token"]["access_token"]
 
     try:
-        response = httpx.post(f"{agent_config['api_base_url']}/depictio/api/v1/cli/validate_pipeline_config", json=pipeline_config, headers={"Authorization": f"Bearer {token}"})
+        response = api_request(
+            "POST",
+            f"{agent_config['api_base_url']}/depictio/api/v1/cli/validate_pipeline_config",
+            json_body=pipeline_config,
+            headers={"Authorization": f"Bearer {token}"},
+        )
         # Log the response status, headers, and content
         logger.info(f"Status code: {response.status_code}")
         logger.info(f"Response Headers: {response.headers}")
@@ -80,15 +483,16 @@ def remote_validate_pipeline_config(agent_config: dict, pipeline_config_path: st
 
         # Attempt to parse the response JSON if the status is 200
         if response.status_code == 200:
-            response_json = response.json()
-            logger.info(f"Response JSON: {json.dumps(response_json, indent=2)}")
-            return {"success": True, "config": response_json.get("config", {})}
+            response_content = response_json(response)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Response JSON: {codec.dumps_pretty(response_content)}")
+            return {"success": True, "config": response_content.get("config", {})}
         else:
             logger.error("Failed to validate the pipeline configuration.")
             return {"success": False}
     except httpx.RequestError as e:
         logger.error(f"Request error occurred: {e}")
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         logger.error(f"JSON decoding failed: {e}")
         logger.error(f"Raw Response Content: {response.text if response else 'No response'}")
     except Exception as e:
@@ -115,13 +519,7 @@ def send_workflow_request(agent_config: dict, endpoint: str, workflow_data_dict:
     url = f"{agent_config['api_base_url']}/depictio/api/v1/workflows/{endpoint}"
     json_body = None if request_method == "DELETE" else workflow_data_dict
 
-    response = httpx.request(
-        method=request_method,
-        url=url,
-        headers=headers,
-        json=json_body,
-        timeout=30.0,
-    )
+    response = api_request(request_method, url, headers=headers, json_body=json_body, timeout=30.0)
     # logger.info(response.json() if response.status_code != 204 else "")
 
     logger.info(f"Response status code: {response.status_code}")
@@ -129,8 +527,9 @@ def send_workflow_request(agent_config: dict, endpoint: str, workflow_data_dict:
 
     # Check response status
     if response.status_code in [200, 204]:  # 204 for successful DELETE requests
-        logger.info(f"Workflow {workflow_data_dict.get('workflow_tag', 'N/A')} successfully {endpoint}d! : {response.json() if response.status_code != 204 else ''}")
-        return response.json() if response.status_code != 204 else None
+        response_content = response_json(response) if response.status_code != 204 else None
+        logger.info(f"Workflow {workflow_data_dict.get('workflow_tag', 'N/A')} successfully {endpoint}d! : {response_content if response_content is not None else ''}")
+        return response_content
     else:
         logger.info(f"Error during {endpoint}d: {response.text}")
         raise httpx.HTTPStatusError(message=f"Error during {endpoint}d: {response.text}", request=response.request, response=response)
@@ -141,18 +540,20 @@ def check_workflow_exists(agent_config: dict, workflow_dict: dict, headers: dict
     Check if the workflow exists and return its details if it does.
     """
 
-    response = httpx.get(
+    response = api_request(
+        "GET",
         f"{agent_config['api_base_url']}/depictio/api/v1/workflows/get/from_args",
         params={"name": workflow_dict["name"], "engine": workflow_dict["engine"]},
         headers=headers,
         timeout=30.0,
+        retries=2,
     )
     if response.status_code == 200:
-        return True, response.json()
+        return True, response_json(response)
     return False, None
 
 
-def compare_models(agent_config: dict, new_workflow: dict, existing_workflow: dict, headers: dict) -> bool:
+def compare_models(agent_config: dict, new_workflow: dict, existing_workflow: dict, headers: dict) -> dict:
     """
     Compare the models of two workflows.
     """
@@ -165,18 +566,43 @@ def compare_models(agent_config: dict, new_workflow: dict, existing_workflow: di
         return {"exists": False, "match": False, "message": "Empty existing workflow."}
     if not new_workflow:
         return {"exists": True, "match": False, "message": "Empty new workflow."}
-    response = httpx.post(
+    response = api_request(
+        "POST",
         f"{agent_config['api_base_url']}/depictio/api/v1/workflows/compare_workflow_models",
-        json={"new_workflow": new_workflow, "existing_workflow": existing_workflow},
+        json_body={"new_workflow": new_workflow, "existing_workflow": existing_workflow},
         headers=headers,
     )
     if response.status_code == 200:
-        return {"exists": True, "match": response.json()["match"], "message": response.json()["message"]}
+        response_content = response_json(response)
+        return {"exists": True, "match": response_content["match"], "message": response_content["message"]}
 
     else:
         return {"exists": True, "match": False, "message": response.text}
 
 
+def register_workflow(agent_config: dict, workflow_data_dict: dict, headers: dict, update: bool = False) -> dict:
+    """
+    Register a workflow. An existing workflow is returned as is when its configuration matches, replaced with `update`,
+    and a ValueError is raised otherwise.
+    """
+    exists, existing_workflow = check_workflow_exists(agent_config, workflow_data_dict, headers)
+    if not exists:
+        logger.info(f"Workflow {workflow_data_dict['name']} does not exist, creating it.")
+        return send_workflow_request(agent_config, "create", workflow_data_dict, headers)
+
+    check_modif = compare_models(agent_config, workflow_data_dict, existing_workflow, headers)
+    logger.info(f"Check modification: {check_modif}")
+    if check_modif["match"]:
+        logger.info(f"Workflow {workflow_data_dict['workflow_tag']} already exists, skipping creation.")
+        return existing_workflow
+    if not update:
+        raise ValueError(
+            f"Workflow {workflow_data_dict['workflow_tag']} already exists but with different configuration. Please use the --update flag to update the existing workflow."
+        )
+    logger.info(f"Workflow {workflow_data_dict['workflow_tag']} already exists, updating it.")
+    return send_workflow_request(agent_config, "update", workflow_data_dict, headers)
+
+
 def create_update_delete_workflow(
     agent_config: dict,
     workflow_data_dict: dict,
@@ -186,70 +612,26 @@ def create_update_delete_workflow(
     """
     Create or update a workflow based on the update flag.
     """
-    logger.info(f"Workflow data dict: {workflow_data_dict}")
-
-    endpoint = "update" if update else "create"
-
-    exists, _ = check_workflow_exists(agent_config, workflow_data_dict, headers)
-
-    logger.info(f"Workflow {exists}")
-    logger.info(f"Update: {update}")
-
-    logger.info(f"Endpoint: {endpoint}")
-    logger.info(f"Agent config: {agent_config}")
-
-    logger.info(f"Headers: {headers}")
-    logger.info(f"_ : {_}")
-    typer.Exit(code=1)
-
-    # Check if the workflow exists
-    if exists:
-        # If the workflow exists, check if there is a conflict with the existing workflow
-        logger.info(f"Existing workflow: {_}")
-        logger.info(f"New workflow: {workflow_data_dict}")
-
-        check_modif = compare_models(agent_config, workflow_data_dict, _, headers)
-
-        logger.info(f"Check modification: {check_modif}")
-        typer.Exit(code=1)
-
-        # If the workflow exists but there is a conflict, check if the user wants to update the existing workflow
-        if not check_modif:
-            # If the user does not want to update the existing workflow, exit
-            if not update:
-                sys.exit(
-                    f"Workflow {workflow_data_dict['workflow_tag']} already exists but with different configuration. Please use the --update flag to update the existing workflow."
-                )
-
-            # If the user wants to update the existing workflow, update it
-            else:
-                logger.info(f"Workflow {workflow_data_dict['workflow_tag']} already exists, updating it.")
-                return send_workflow_request(agent_config, endpoint, workflow_data_dict, headers)
-
-        # If the workflow exists and there is no conflict, skip the creation
-        else:
-            logger.info(f"Workflow {workflow_data_dict['workflow_tag']} already exists, skipping creation.")
-            # return_dict = {str(_["_id"]): [str(data_collection["_id"]) for data_collection in _["data_collections"]]}
-            # logger.info(f"Return dict: {return_dict}")
-            # return return_dict
-
-            return _
-
-    # If the workflow does not exist, create it
-    logger.info(f"Workflow {workflow_data_dict['name']} does not exist, creating it.")
-    logger.info(f"Endpoint: {endpoint}")
-    workflow_json = send_workflow_request(agent_config, endpoint, workflow_data_dict, headers)
-    return workflow_json
+    try:
+        return register_workflow(agent_config, workflow_data_dict, headers, update=update)
+    except ValueError as e:
+        sys.exit(str(e))
 
 
 # TODO: change logic to just initiate the scan and not wait for the completion (thousands of files can take a long time)
-def scan_files_for_data_collection(agent_config: dict, workflow_id: str, data_collection_id: str, headers: dict, scan_type: str = "scan") -> None:
+def scan_files_for_data_collection(
+    agent_config: dict, workflow_id: str, data_collection_id: str, headers: dict, scan_type: str = "scan", file_stats: Optional[List[dict]] = None
+) -> None:
     """
     Scan files for a given data collection of a workflow.
+
+    Per-file stats computed by the CLI are sent along (in the wire format of depictio_cli.wire) so the server can skip its own pass.
     """
 
-    response = httpx.post(
+    response = progress_request(
+        "POST",
         f"{agent_config['api_base_url']}/depictio/api/v1/files/{scan_type}/{workflow_id}/{data_collection_id}",
+        json_body={"file_stats": encode_manifest(file_stats)} if file_stats is not None else None,
         headers=headers,
         timeout=5 * 60,  # Increase the timeout as needed
     )
@@ -257,14 +639,96 @@ def scan_files_for_data_collection(agent_config: dict, workflow_id: str, data_co
         logger.info(f"Files successfully scanned for data collection {data_collection_id}!")
     else:
         logger.info(f"Error for data collection {data_collection_id}: {response.text}")
-        typer.Exit(code=1)
+
+    return response
+
+
+def stream_json_list(agent_config: dict, endpoint: str, headers: dict, params: Optional[dict] = None, page_size: int = 0) -> Iterator[dict]:
+    """
+    Yield the items of a list endpoint as they arrive, without loading the whole response in memory.
+
+    With a page size, the listing is fetched page by page using the skip/limit query parameters.
+    """
+    url = f"{agent_config['api_base_url']}/depictio/api/v1/{endpoint}"
+
+    def fetch(extra_params: dict) -> Iterator[dict]:
+        request_params = {**(params or {}), **extra_params}
+        http_cache = get_http_cache()
+        if http_cache is not None:
+
+            def open_stream(request_headers: dict):
+                return stream_request("GET", url, authorize_headers(request_headers), params=request_params, timeout=5 * 60)
+
+            yield from iter_json_array(http_cache.stream(url, request_params, headers, open_stream, user=_cache_user()))
+            return
+        with stream_request("GET", url, authorize_headers(headers), params=request_params, timeout=5 * 60) as response:
+            if response.status_code != 200:
+                response.read()
+                raise httpx.HTTPStatusError(message=f"Error listing {endpoint}: {response.text}", request=response.request, response=response)
+            yield from iter_json_array(response.iter_bytes())
+
+    if page_size:
+        yield from iter_pages(lambda skip, limit: fetch({"skip": skip, "limit": limit}), page_size)
+    else:
+        yield from fetch({})
+
+
+def list_workflows(agent_config: dict, headers: dict, page_size: int = 0) -> Iterator[dict]:
+    """
+    Yield the workflows available to the user.
+    """
+    return stream_json_list(agent_config, "workflows/get_all_workflows", headers, page_size=page_size)
+
+
+def list_files_for_data_collection(agent_config: dict, workflow_id: str, data_collection_id: str, headers: dict, page_size: int = 0) -> Iterator[dict]:
+    """
+    Yield the files registered for a given data collection of a workflow.
+    """
+    return stream_json_list(agent_config, f"files/list/{workflow_id}/{data_collection_id}", headers, page_size=page_size)
+
+
+def register_files_for_data_collection(
+    agent_config: dict,
+    workflow_id: str,
+    data_collection_id: str,
+    entries: Union[List[dict], Manifest],
+    headers: dict,
+    batch_size: int = 10000,
+    encoding: str = "front-coded",
+) -> bool:
+    """
+    Register files discovered by a local scan for a given data collection of a workflow, in batches.
+
+    With the "front-coded" encoding, each batch is sent in the compact wire format of depictio_cli.wire
+    (sorted, front-coded paths and columnar fields); with "json", as a plain list of entries.
+    """
+    if isinstance(entries, Manifest):
+        batches = entries.batches(batch_size)
+    else:
+        batches = (entries[start : start + batch_size] for start in range(0, len(entries), batch_size))
+    registered = 0
+    for batch in batches:
+        response = api_request(
+            "POST",
+            f"{agent_config['api_base_url']}/depictio/api/v1/files/register/{workflow_id}/{data_collection_id}",
+            json_body={"manifest": encode_manifest(batch)} if encoding == "front-coded" else {"files": list(batch)},
+            headers=headers,
+            timeout=5 * 60,
+        )
+        if response.status_code != 200:
+            logger.error(f"Error registering files for data collection {data_collection_id}: {response.text}")
+            return False
+        logger.info(f"Registered files {registered + 1}-{registered + len(batch)} of {len(entries)} for data collection {data_collection_id}")
+        registered += len(batch)
+    return True
 
 
 def create_deltatable_request(agent_config: dict, workflow_id: str, data_collection_id: str, headers: dict) -> None:
     """
     Create a delta table for a given data collection of a workflow.
     """
-    response = httpx.post(
+    response = progress_request(
+        "POST",
         f"{agent_config['api_base_url']}/depictio/api/v1/deltatables/create/{workflow_id}/{data_collection_id}",
         headers=headers,
         timeout=60.0 * 5,  # Increase the timeout as needed
@@ -274,15 +738,18 @@ def create_deltatable_request(agent_config: dict, workflow_id: str, data_collect
     else:
         logger.info(f"Error for data collection {data_collection_id}: {response.text}")
 
+    return response
+
 
 def create_trackset(agent_config: dict, workflow_id: str, data_collection_id: str, headers: dict) -> None:
     """
     Upload the trackset to S3 for a given data collection of a workflow.
     """
     logger.info("creating trackset")
-    logger.info("workflow_id", workflow_id)
-    logger.info("data_collection_id", data_collection_id)
-    response = httpx.post(
+    logger.info(f"workflow_id: {workflow_id}")
+    logger.info(f"data_collection_id: {data_collection_id}")
+    response = progress_request(
+        "POST",
         f"{agent_config['api_base_url']}/depictio/api/v1/jbrowse/create_trackset/{workflow_id}/{data_collection_id}",
         headers=headers,
         timeout=60.0 * 5,  # Increase the timeout as needed
@@ -295,46 +762,489 @@ def create_trackset(agent_config: dict, workflow_id: str, data_collection_id: st
     return response
 
 
-def process_data_collection(agent_config, wf_id, dc, headers, scan_files=True):
-    if scan_files:
-        logger.info("scan_files_for_data_collection")
-        scan_type = "scan"
+def upload_parquet_files(agent_config: dict, workflow_id: str, data_collection_id: str, conversions: List[dict], headers: dict, cache_dir: str) -> bool:
+    """
+    Upload the Parquet conversions of the files of a data collection, skipping the ones already uploaded.
+    """
+    uploaded, skipped = 0, 0
+    for conversion in conversions:
+        if is_uploaded(cache_dir, workflow_id, data_collection_id, conversion["fingerprint"]):
+            skipped += 1
+            continue
+        with open(conversion["parquet_path"], "rb") as f:
+            content = f.read()
+        response = api_request(
+            "POST",
+            f"{agent_config['api_base_url']}/depictio/api/v1/files/upload_parquet/{workflow_id}/{data_collection_id}",
+            headers={**headers, "Content-Type": "application/vnd.apache.parquet"},
+            params={"source_path": conversion["path"], "fingerprint": conversion["fingerprint"]},
+            content=content,
+            timeout=5 * 60,
+            priority="bulk",
+        )
+        if response.status_code != 200:
+            logger.error(f"Error uploading the Parquet conversion of {conversion['path']}: {response.text}")
+            return False
+        mark_uploaded(cache_dir, workflow_id, data_collection_id, conversion["fingerprint"])
+        uploaded += 1
+    logger.info(f"Uploaded {uploaded} Parquet files for data collection {data_collection_id} ({skipped} already uploaded)")
+    return True
+
+
+def convert_data_collection_tables(agent_config, wf_id, dc, headers, paths, cache_dir=DEFAULT_CACHE_DIR, max_workers=4) -> bool:
+    """
+    Convert the input files of a Table data collection to Parquet locally and upload the conversions.
+    """
+    conversions = convert_data_collection(dc, paths, cache_dir=cache_dir, max_workers=max_workers)
+    if log_conversion_errors(dc["data_collection_tag"], conversions):
+        return False
+    return upload_parquet_files(agent_config, wf_id, str(dc["_id"]), conversions, headers, cache_dir)
+
+
+def refresh_file_index(agent_config, wf_id, dc, headers, file_index) -> Optional[int]:
+    """
+    Refresh the local file index with the files registered for a data collection. Returns the number of files, None on error.
+    """
+    try:
+        files = list_files_for_data_collection(agent_config, wf_id, dc["_id"], headers)
+        counts = file_index.refresh_data_collection_files(wf_id, str(dc["_id"]), files)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"Could not refresh the file index for data collection {dc['data_collection_tag']}: {e}")
+        return None
+    return counts["added"] + counts["updated"] + counts["unchanged"]
+
+
+def local_scan_data_collection(agent_config, wf_id, dc, headers, manifest: Union[Manifest, List[dict]]) -> bool:
+    """
+    Register the files of a data collection found by a local scan, instead of having the server scan them.
+    """
+    logger.info(f"Registering {len(manifest)} locally scanned files for data collection {dc['data_collection_tag']}")
+    record_files_scanned(wf_id, dc["data_collection_tag"], len(manifest))
+    return register_files_for_data_collection(agent_config, wf_id, str(dc["_id"]), manifest, headers)
+
+
+def get_scan_type(dc) -> str:
+    """
+    Server scan endpoint of a data collection: metadata collections are scanned with scan_metadata.
+    """
+    metatype = dc["config"].get("metatype")
+    return "scan_metadata" if metatype and metatype.lower() == "metadata" else "scan"
+
+
+def scan_data_collection(
+    agent_config, wf_id, dc, headers, file_index=None, local_manifest: Optional[Union[Manifest, List[dict]]] = None, file_stats: Optional[List[dict]] = None
+) -> bool:
+    if local_manifest is not None:
+        success = local_scan_data_collection(agent_config, wf_id, dc, headers, local_manifest)
+        if success and file_index is not None:
+            refresh_file_index(agent_config, wf_id, dc, headers, file_index)
+        return success
+
+    logger.info("scan_files_for_data_collection")
+    logger.info(f"Data collection: {dc}")
+
+    scan_type = get_scan_type(dc)
+    logger.info(f"Scan type: {scan_type}")
+    logger.info(f"Data collection: {dc}")
+    logger.info(f"Workflow ID: {wf_id}")
+    response = scan_files_for_data_collection(agent_config, wf_id, dc["_id"], headers, scan_type, file_stats=file_stats)
+    logger.info("Files uploaded.")
+    if response.status_code == 200 and file_index is not None:
+        # The server scan does not report its files: count the ones registered once it is done
+        scanned = refresh_file_index(agent_config, wf_id, dc, headers, file_index)
+        if scanned is not None:
+            record_files_scanned(wf_id, dc["data_collection_tag"], scanned)
+    return response.status_code == 200
+
+
+def plan_deltatable_update(wf_id, dc, table_state: TableState, files: Dict[str, str], full_rebuild: bool = False) -> dict:
+    """
+    Plan how to bring the delta table of a data collection up to date with its files ({path: fingerprint}).
+
+    Only the files new or changed since the last table version recorded locally are written, as an append
+    (or an upsert keyed on the wildcard columns); the table is fully rebuilt when its configuration or columns changed,
+    when files were removed, when there is no previous version or with `full_rebuild`.
+    """
+    options = get_table_read_options(dc)
+
+    def read_columns(path):
+        return read_header(path, options["separator"], options["skip_rows"]) if options["has_header"] else None
+
+    plan = plan_table_update(table_state, wf_id, dc, files, read_columns=read_columns, full_rebuild=full_rebuild)
+    if plan["mode"] == "create":
+        plan["columns"] = read_columns(plan["files"][0]) if plan["files"] else None
+    logger.info(f"Delta table of {dc['data_collection_tag']}: {plan['mode']} ({plan['reason']})")
+    return plan
+
+
+def record_deltatable_version(wf_id, dc, table_state: TableState, plan: dict, files: Dict[str, str], body: Any = None) -> None:
+    """
+    Record the table version written following a plan, with the version returned by the server if any.
+    """
+    dc_id = str(dc["_id"])
+    written = files if plan["mode"] == "create" else {path: files[path] for path in plan["new"] + plan["changed"]}
+    previous = table_state.get_version(wf_id, dc_id)
+    version = body["version"] if isinstance(body, dict) and "version" in body else (previous["version"] + 1 if previous else 0)
+    table_state.record(wf_id, dc_id, version, plan["schema_hash"], written, columns=plan["columns"], replace=plan["mode"] == "create")
+
+
+def get_build_job(dc, plan: Optional[dict] = None, depends_on: Optional[List[str]] = None) -> dict:
+    """
+    Describe the build of the delta table (following a plan, full build by default) or of the trackset of a data collection.
+    """
+    job = {
+        "data_collection_id": str(dc["_id"]),
+        "data_collection_tag": dc["data_collection_tag"],
+        "kind": "trackset" if get_dc_type(dc) == "jbrowse2" else "deltatable",
+        "depends_on": depends_on or [],
+    }
+    if plan is not None and plan["mode"] in ["append", "upsert"]:
+        job.update(mode=plan["mode"], files=plan["new"] + plan["changed"], merge_keys=get_dc_wildcard_names(dc))
+    return job
+
+
+def run_build_job(agent_config, wf_id, job: dict, headers) -> Any:
+    """
+    Run a build job with the request of its data collection. Returns the response body, raises ValueError on failure.
+    """
+    dc_id = job["data_collection_id"]
+    if job["kind"] == "trackset":
+        response = create_trackset(agent_config, wf_id, dc_id, headers)
+    elif job.get("mode", "create") == "create":
+        response = create_deltatable_request(agent_config, wf_id, dc_id, headers)
+    else:
+        response = progress_request(
+            "POST",
+            f"{agent_config['api_base_url']}/depictio/api/v1/deltatables/update/{wf_id}/{dc_id}",
+            json_body={"mode": job["mode"], "files": job["files"], "merge_keys": job["merge_keys"]},
+            headers=headers,
+            timeout=60.0 * 5,
+        )
+    if response.status_code != 200:
+        raise ValueError(f"Error building {job['data_collection_tag']}: {response.text}")
+    try:
+        return response_json(response)
+    except ValueError:
+        return None
+
+
+def update_deltatable(agent_config, wf_id, dc, headers, table_state: TableState, files: Dict[str, str], full_rebuild: bool = False) -> bool:
+    """
+    Bring the delta table of a data collection up to date with its files ({path: fingerprint}), see plan_deltatable_update.
+    """
+    plan = plan_deltatable_update(wf_id, dc, table_state, files, full_rebuild=full_rebuild)
+    if plan["mode"] == "noop":
+        return True
+    try:
+        body = run_build_job(agent_config, wf_id, get_build_job(dc, plan), headers)
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+    record_deltatable_version(wf_id, dc, table_state, plan, files, body)
+    return True
+
+
+class RemoteBuildBackend:
+    """
+    Server-side build jobs: the jobs of a workflow are submitted in one request and fanned out by the server,
+    which reports their progress on a single NDJSON status stream.
+    """
+
+    def __init__(self, agent_config: dict, headers: dict, reconnects: int = 3):
+        self.agent_config = agent_config
+        self.headers = headers
+        self.reconnects = reconnects
+
+    def submit(self, workflow_id: str, jobs: List[dict]) -> str:
+        # Not retried: after a gateway error, the server may still have accepted the group and would build every table twice
+        response = api_request(
+            "POST",
+            f"{self.agent_config['api_base_url']}/depictio/api/v1/jobs/build/{workflow_id}",
+            json_body={"jobs": jobs},
+            headers=self.headers,
+        )
+        if response.status_code != 200:
+            raise ValueError(f"Error submitting the build jobs: {response.text}")
+        return response_json(response)["job_group_id"]
 
-        logger.info(f"Data collection: {dc}")
+    def status_events(self, group_id: str) -> Iterator[dict]:
+        url = f"{self.agent_config['api_base_url']}/depictio/api/v1/jobs/status/{group_id}"
+        for attempt in range(self.reconnects + 1):
+            try:
+                # The server sends the current status of every job first, so a reconnection misses nothing
+                request_headers = {**authorize_headers(self.headers), "Accept": "application/x-ndjson"}
+                with stream_request("GET", url, request_headers, timeout=httpx.Timeout(30.0, read=None), retried=attempt > 0) as response:
+                    if response.status_code != 200:
+                        response.read()
+                        raise ValueError(f"Error following the build jobs: {response.text}")
+                    for line in response.iter_lines():
+                        if line.strip():
+                            yield codec.loads(line)
+                return
+            except httpx.TransportError as e:
+                if attempt == self.reconnects:
+                    raise
+                logger.warning(f"Status stream of the build jobs interrupted ({e}), reconnecting ({attempt + 1}/{self.reconnects})")
+                time.sleep(2**attempt)
 
-        if "metatype" in dc["config"]:
-            if dc["config"]["metatype"]:
-                if dc["config"]["metatype"].lower() == "metadata":
-                    scan_type = "scan_metadata"
-        logger.info(f"Scan type: {scan_type}")
-        logger.info(f"Data collection: {dc}")
-        logger.info(f"Workflow ID: {wf_id}")
-        scan_files_for_data_collection(agent_config, wf_id, dc["_id"], headers, scan_type)
-        logger.info("Files uploaded.")
 
+def aggregate_data_collection(
+    agent_config, wf_id, dc, headers, table_state: Optional[TableState] = None, table_files: Optional[Dict[str, str]] = None, incremental: bool = False
+) -> bool:
     if dc["config"]["type"].lower() == "table":
+        if table_state is not None and table_files is not None:
+            return update_deltatable(agent_config, wf_id, dc, headers, table_state, table_files, full_rebuild=not incremental)
         # if dc["data_collection_tag"] == "mosaicatcher_samples_metadata":
         logger.info("create_deltatable")
-        create_deltatable_request(agent_config, wf_id, dc["_id"], headers)
+        response = create_deltatable_request(agent_config, wf_id, dc["_id"], headers)
         logger.info("deltatable created.")
+        if table_state is not None:
+            # The table no longer matches the recorded state
+            table_state.invalidate(wf_id, str(dc["_id"]))
+        return response.status_code == 200
 
     elif dc["config"]["type"].lower() == "jbrowse2":
-        # # if dc["config"]["type"].lower() == "jbrowse2":
-        #     # if scan_files:
-        #     #     logger.info("scan_files_for_data_collection")
-        #     #     scan_files_for_data_collection(wf_id, dc["_id"], headers)
         logger.info("upload_trackset_to_s3")
-        create_trackset(agent_config, wf_id, dc["_id"], headers)
+        response = create_trackset(agent_config, wf_id, dc["_id"], headers)
+        return response.status_code == 200
 
+    return True
 
-def process_workflow(agent_config, wf, headers, scan_files=True, data_collection_tag=None):
+
+def process_workflow(
+    agent_config,
+    wf,
+    headers,
+    scan_files=True,
+    data_collection_tag=None,
+    max_workers=4,
+    journal=None,
+    resume=False,
+    file_index=None,
+    scan_mode="server",
+    file_stats=False,
+    convert_tables=False,
+    cache_dir=DEFAULT_CACHE_DIR,
+    table_state=None,
+    incremental=False,
+    batch_builds=False,
+    build_backend=None,
+    progress=None,
+    stage_locks=None,
+) -> bool:
+    """
+    Process the data collections of a workflow, following the dependencies between them.
+
+    Each (data collection, stage) node runs as soon as the data collections it depends on are ready,
+    independent branches run in parallel and a failure only cancels the nodes depending on it.
+    Completed nodes are recorded in the journal; with `resume`, nodes already completed with unchanged inputs are skipped.
+    The inputs of a node are the configuration of its data collection and its input files: the files found under the run
+    directories (paths, sizes and modification times) when the CLI walks them, the files registered by the server scan
+    (from the file index) otherwise. New or modified files run the stages of their data collection again, and stages
+    whose input files could not be seen are always run.
+    Scanned data collections are synchronised into the local file index when one is given.
+    With the "local" scan mode, the run directories are walked once by the CLI for all the data collections
+    and the matched files registered in the compact wire format, instead of having the server scan them.
+    With `file_stats`, the row counts and headers of the Table input files are computed locally and sent with the scan.
+    With `convert_tables`, the Table input files are converted to Parquet locally (cached in `cache_dir`) and uploaded before the aggregation.
+    The files delta tables are built from are recorded in `table_state`; with `incremental`, tables are only updated
+    with the files added or changed since their last recorded version.
+    With `batch_builds`, the delta tables and tracksets are not built one request per data collection: they are submitted
+    together once the scans are done, to `build_backend` (the server by default), and followed on a single status stream.
+    With a `progress` display, the progress events of the scan and build requests are shown live, and cancelled
+    stragglers only fail their own data collection.
+    With `stage_locks`, a stage already running in another process for the same workflow and data collection is
+    not run twice: its result is reused, or the stage left to a follow-up pass of that process. Batched builds are
+    locked as one stage of the workflow.
+    """
     logger.info("Processing workflow")
     logger.info(f"Workflow: {wf}")
     wf_id = str(wf["_id"])
-    for dc in wf["data_collections"]:
-        print(dc)
-        if data_collection_tag:
-            if dc["data_collection_tag"] == data_collection_tag:
-                process_data_collection(agent_config, wf_id, dc, headers)
-        else:
-            process_data_collection(agent_config, wf_id, dc, headers)
+    if file_index is not None:
+        file_index.index_workflow(wf)
+
+    data_collections = wf["data_collections"]
+    if data_collection_tag:
+        data_collections = [dc for dc in data_collections if dc["data_collection_tag"] == data_collection_tag]
+
+    local_scan = {}
+    local_scan_lock = threading.Lock()
+
+    def get_local_manifest(dc_tag):
+        with local_scan_lock:
+            if "manifests" not in local_scan:
+                manifest = Manifest.from_entries(scan_runs(discover_runs(wf), data_collections))
+                local_scan["manifests"] = manifest.split_by_data_collection()
+        return local_scan["manifests"].get(dc_tag, Manifest())
+
+    # The local scan is only used for the inputs when the run directories are walked anyway
+    walks_runs = scan_mode == "local" or convert_tables or file_stats
+    input_digests = {}
+
+    def get_input_digest(dc):
+        # Fingerprint of the input files of a data collection, None when no input file was seen (unknown inputs):
+        # the files under the run directories when walked, otherwise the files registered by the last server scan
+        dc_tag = dc["data_collection_tag"]
+        if not walks_runs:
+            return file_index.content_digest(wf_id, str(dc["_id"])) if file_index is not None else None
+        with local_scan_lock:
+            if dc_tag in input_digests:
+                return input_digests[dc_tag]
+        manifest = get_local_manifest(dc_tag)
+        digest = hashlib.sha256()
+        for entry in manifest:
+            digest.update(f"{entry['path']}\0{entry['size']}\0{entry['mtime']!r}\n".encode("utf-8"))
+        with local_scan_lock:
+            # Unmounted run directories are only warned about: an empty scan says nothing of the inputs
+            input_digests[dc_tag] = digest.hexdigest() if len(manifest) else None
+        return input_digests[dc_tag]
+
+    def stage_hash(dc, stage):
+        # Stages of unknown inputs have no hash: they are never skipped nor reused
+        input_digest = get_input_digest(dc)
+        return compute_config_hash(wf_id, dc, stage, input_digest) if input_digest is not None else None
+
+    def get_table_files(dc):
+        # Files the table is built from, {path: fingerprint}: from the local scan, or from the file index synchronised after the server scan
+        if scan_mode == "local":
+            manifest = get_local_manifest(dc["data_collection_tag"])
+            return {entry["path"]: f"{entry['size']}:{entry['mtime']}" for entry in manifest}
+        if file_index is not None:
+            return {file["file_location"]: file["content_hash"] for file in file_index.query_files(workflow=wf_id, data_collection=str(dc["_id"]))}
+        return None
+
+    def run_node(node):
+        if node.stage == "scan":
+            compute_stats = file_stats and get_dc_type(node.dc) == "table"
+            manifest = get_local_manifest(node.dc_tag) if scan_mode == "local" or compute_stats else None
+            stats_entries = None
+            if compute_stats:
+                stats = compute_data_collection_stats(node.dc, manifest.paths(), max_workers=max_workers)
+                stats_entries = [{**entry, "stats": stats[entry["path"]]} for entry in manifest]
+            if scan_mode == "local":
+                local_manifest = stats_entries if stats_entries is not None else manifest
+                return scan_data_collection(agent_config, wf_id, node.dc, headers, file_index=file_index, local_manifest=local_manifest)
+            return scan_data_collection(agent_config, wf_id, node.dc, headers, file_index=file_index, file_stats=stats_entries)
+        if node.stage == "convert":
+            paths = get_local_manifest(node.dc_tag).paths()
+            return convert_data_collection_tables(agent_config, wf_id, node.dc, headers, paths, cache_dir=cache_dir, max_workers=max_workers)
+        table_files = None
+        if table_state is not None and get_dc_type(node.dc) == "table":
+            table_files = get_table_files(node.dc)
+        return aggregate_data_collection(agent_config, wf_id, node.dc, headers, table_state=table_state, table_files=table_files, incremental=incremental)
+
+    def node_hash(node):
+        return stage_hash(node.dc, node.stage)
+
+    def is_done(node):
+        config_hash = node_hash(node)
+        return config_hash is not None and journal.is_completed(wf_id, node.dc_tag, node.stage, config_hash)
+
+    def on_success(node):
+        if stage_locks is not None and stage_locks.is_deferred(wf_id, node.dc_tag):
+            # Left to another process: recorded by it once done
+            return
+        config_hash = node_hash(node)
+        if config_hash is not None:
+            journal.record(wf_id, node.dc_tag, node.stage, config_hash, duration=node.duration)
+
+    def submit_builds() -> bool:
+        dcs_by_tag = {dc["data_collection_tag"]: dc for dc in data_collections if get_dc_type(dc) in ["table", "jbrowse2"]}
+        # Data collections whose scan or conversion did not succeed, and the ones joined with them, are not built
+        excluded = {node.dc_tag for node in nodes.values() if node.status not in ["success", "skipped"]}
+        changed = True
+        while changed:
+            changed = False
+            for tag, dc in dcs_by_tag.items():
+                if tag not in excluded and any(reference in excluded for reference in get_dc_join_references(dc)):
+                    excluded.add(tag)
+                    changed = True
+
+        to_build, plans = [], {}
+        for tag, dc in dcs_by_tag.items():
+            if tag in excluded:
+                continue
+            build_hash = stage_hash(dc, "aggregate")
+            upstream_skipped = all(node.status == "skipped" for node in nodes.values() if node.dc_tag == tag)
+            if journal and resume and upstream_skipped and build_hash is not None and journal.is_completed(wf_id, tag, "aggregate", build_hash):
+                logger.info(f"Skipping {tag}:aggregate (already completed)")
+                continue
+            table_files = get_table_files(dc) if table_state is not None and get_dc_type(dc) == "table" else None
+            if table_files is not None:
+                plans[tag] = plan_deltatable_update(wf_id, dc, table_state, table_files, full_rebuild=not incremental)
+                if plans[tag]["mode"] == "noop":
+                    continue
+            to_build.append(tag)
+
+        jobs = []
+        for tag in to_build:
+            depends_on = [str(dcs_by_tag[reference]["_id"]) for reference in get_dc_join_references(dcs_by_tag[tag]) if reference in to_build]
+            jobs.append(get_build_job(dcs_by_tag[tag], plans.get(tag), depends_on=depends_on))
+        if not jobs:
+            return not excluded.intersection(dcs_by_tag)
+
+        backend = build_backend or RemoteBuildBackend(agent_config, headers)
+        try:
+            group_id = backend.submit(wf_id, jobs)
+        except (ValueError, httpx.HTTPError) as e:
+            logger.error(f"Error submitting the builds of {len(jobs)} data collections: {e}")
+            return False
+        logger.info(f"Submitted the builds of {len(jobs)} data collections as job group {group_id}")
+        results = track_build_jobs(backend, group_id, jobs)
+
+        for tag in to_build:
+            dc = dcs_by_tag[tag]
+            event = results[str(dc["_id"])]
+            if event["status"] != "success":
+                continue
+            if tag in plans:
+                record_deltatable_version(wf_id, dc, table_state, plans[tag], get_table_files(dc), event.get("result"))
+            elif table_state is not None:
+                table_state.invalidate(wf_id, str(dc["_id"]))
+            build_hash = stage_hash(dc, "aggregate")
+            if journal and build_hash is not None:
+                journal.record(wf_id, tag, "aggregate", build_hash)
+        failed = [event["data_collection_tag"] for event in results.values() if event["status"] != "success"]
+        logger.info(f"Job group {group_id}: {len(results) - len(failed)} of {len(results)} builds succeeded")
+        if failed:
+            logger.error(f"Failed builds: {', '.join(failed)}")
+        return not failed and not excluded.intersection(dcs_by_tag)
+
+    def submit_builds_locked() -> bool:
+        if stage_locks is None:
+            return submit_builds()
+        # The batch is locked as a whole: it is coalesced with the batches of other processes, not with their per-data collection builds
+        build_hashes = [stage_hash(dc, "aggregate") for dc in data_collections]
+        batch_hash = compute_config_hash(wf_id, sorted(build_hashes)) if None not in build_hashes else None
+        return stage_locks.run(wf_id, BATCH_BUILDS_LOCK, "build", batch_hash, submit_builds)
+
+    def run_node_timed(node):
+        with stage_timer(wf_id, node.dc_tag, node.stage) as outcome:
+            outcome["success"] = run_node(node)
+        return outcome["success"]
+
+    def run_node_locked(node):
+        if stage_locks is None:
+            return run_node_timed(node)
+        return stage_locks.run(wf_id, node.dc_tag, node.stage, node_hash(node), lambda: run_node_timed(node))
+
+    def run_node_with_progress(node):
+        return progress.run(node.dc_tag, node.stage, lambda: run_node_locked(node))
+
+    nodes = build_workflow_dag(data_collections, scan_files=scan_files, convert_tables=convert_tables, aggregate=not batch_builds)
+    if walks_runs and (journal or stage_locks is not None):
+        # Fingerprint the inputs before any stage runs: files added while a stage runs are left to the next run
+        for dc in data_collections:
+            get_input_digest(dc)
+    scheduler = DAGScheduler(
+        nodes,
+        run_node_with_progress if progress is not None else run_node_locked,
+        max_workers=max_workers,
+        is_done=is_done if journal and resume else None,
+        on_success=on_success if journal else None,
+    )
+    scheduler.run()
+    scheduler.log_summary()
+    if batch_builds:
+        return submit_builds_locked() and scheduler.success
+    return scheduler.success
@@ -0,0 +1,119 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from depictio_cli import BASE_PATH
+from depictio_cli.logging import logger
+from depictio_cli.scheduler import get_dc_join_references, get_dc_wildcard_references
+
+SCHEMA_PATH = str(BASE_PATH / "depictio_json_schema.json")
+
+WILDCARD_PLACEHOLDER = re.compile(r"\{([^{}]+)\}")
+
+
+@lru_cache(maxsize=None)
+def get_schema_validator(schema_path: str = SCHEMA_PATH):
+    """
+    Load and compile the JSON Schema of pipeline configurations, once per process.
+
+    Returns None if the optional jsonschema package is not installed.
+    """
+    try:
+        import jsonschema
+    except ImportError:
+        logger.warning("jsonschema is not installed, skipping the JSON Schema validation (pip install jsonschema).")
+        return None
+
+    with open(schema_path, "r") as f:
+        schema = json.load(f)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema, format_checker=validator_class.FORMAT_CHECKER)
+
+
+def _format_path(path) -> str:
+    formatted = ""
+    for element in path:
+        formatted += f"[{element}]" if isinstance(element, int) else f".{element}"
+    return formatted.lstrip(".") or "<root>"
+
+
+def _check_regex(pattern: Any, path: str, errors: List[str]) -> Optional[re.Pattern]:
+    if not isinstance(pattern, str):
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        errors.append(f"{path}: invalid regular expression {pattern!r}: {e}")
+        return None
+
+
+def compile_dc_pattern(regex_config: dict) -> re.Pattern:
+    """
+    Compile the `regex` section of a data collection, turning its {wildcard} placeholders into named groups.
+    """
+    wildcards = {wildcard["name"]: wildcard.get("wildcard_regex", ".*") for wildcard in regex_config.get("wildcards") or []}
+
+    def substitute(match: re.Match) -> str:
+        name = match.group(1)
+        if name not in wildcards:
+            raise re.error(f"wildcard {{{name}}} is not declared in regex.wildcards")
+        return f"(?P<{name}>{wildcards[name]})"
+
+    return re.compile(WILDCARD_PLACEHOLDER.sub(substitute, regex_config["pattern"]))
+
+
+def validate_pipeline_config_locally(pipeline_config: dict) -> List[str]:
+    """
+    Validate a pipeline configuration without contacting the server and return every error found.
+
+    Checks the JSON Schema, the regular expressions (runs_regex, files_regex, regex patterns and wildcards)
+    and the references between data collections.
+    """
+    errors = []
+
+    validator = get_schema_validator()
+    if validator is not None:
+        for error in sorted(validator.iter_errors(pipeline_config), key=lambda e: list(e.absolute_path)):
+            errors.append(f"{_format_path(error.absolute_path)}: {error.message}")
+
+    if not isinstance(pipeline_config, dict):
+        return errors or ["<root>: the configuration must be a mapping"]
+
+    for i, workflow in enumerate(pipeline_config.get("workflows") or []):
+        if not isinstance(workflow, dict):
+            continue
+        workflow_path = f"workflows[{i}]"
+        _check_regex((workflow.get("config") or {}).get("runs_regex"), f"{workflow_path}.config.runs_regex", errors)
+
+        data_collections = [dc for dc in workflow.get("data_collections") or [] if isinstance(dc, dict)]
+        tags = [dc.get("data_collection_tag") for dc in data_collections]
+        for tag in set(tags):
+            if tags.count(tag) > 1:
+                errors.append(f"{workflow_path}.data_collections: duplicated data_collection_tag {tag!r}")
+
+        for j, dc in enumerate(data_collections):
+            dc_path = f"{workflow_path}.data_collections[{j}]"
+            config = dc.get("config") or {}
+            if not isinstance(config, dict):
+                continue
+
+            _check_regex(config.get("files_regex"), f"{dc_path}.config.files_regex", errors)
+            for k, wildcard in enumerate(config.get("regex_wildcards") or []):
+                _check_regex(wildcard.get("regex"), f"{dc_path}.config.regex_wildcards[{k}].regex", errors)
+
+            regex_config = config.get("regex")
+            if isinstance(regex_config, dict) and isinstance(regex_config.get("pattern"), str):
+                for k, wildcard in enumerate(regex_config.get("wildcards") or []):
+                    _check_regex(wildcard.get("wildcard_regex"), f"{dc_path}.config.regex.wildcards[{k}].wildcard_regex", errors)
+                try:
+                    compile_dc_pattern(regex_config)
+                except (re.error, KeyError, TypeError) as e:
+                    errors.append(f"{dc_path}.config.regex.pattern: invalid pattern {regex_config['pattern']!r}: {e}")
+
+            for reference in get_dc_join_references(dc) + get_dc_wildcard_references(dc):
+                if reference not in tags:
+                    errors.append(f"{dc_path}.config: reference to unknown data collection {reference!r}")
+
+    return errors
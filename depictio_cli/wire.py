@@ -0,0 +1,137 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Standalone module (standard library only) so that the API server can reuse the decoder as is.
+
+WIRE_FORMAT = "depictio-manifest/1"
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    # Binary search on slice comparisons, much faster than comparing character by character in Python
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def front_code(paths: Iterable[str]) -> Tuple[List[int], List[str]]:
+    """
+    Front-code sorted paths: every path is stored as the length of the prefix it shares with the previous one plus the rest.
+    """
+    prefix_lengths, suffixes = [], []
+    previous = ""
+    for path in paths:
+        shared = common_prefix_length(previous, path)
+        prefix_lengths.append(shared)
+        suffixes.append(path[shared:])
+        previous = path
+    return prefix_lengths, suffixes
+
+
+def front_decode(prefix_lengths: List[int], suffixes: List[str]) -> List[str]:
+    if len(prefix_lengths) != len(suffixes):
+        raise ValueError("Front-coded paths: prefix_lengths and suffixes have different lengths")
+    paths = []
+    previous = ""
+    for shared, suffix in zip(prefix_lengths, suffixes):
+        if shared > len(previous):
+            raise ValueError(f"Front-coded paths: prefix length {shared} longer than the previous path")
+        previous = previous[:shared] + suffix
+        paths.append(previous)
+    return paths
+
+
+def dictionary_encode(values: List[Optional[str]]) -> Dict[str, list]:
+    """
+    Encode a string column as its distinct values plus one code per row (-1 for a missing value).
+    """
+    index: Dict[str, int] = {}
+    codes = []
+    for value in values:
+        codes.append(-1 if value is None else index.setdefault(value, len(index)))
+    return {"values": list(index), "codes": codes}
+
+
+def dictionary_decode(column: Dict[str, list]) -> List[Optional[str]]:
+    values = column["values"]
+    return [None if code == -1 else values[code] for code in column["codes"]]
+
+
+def encode_manifest(entries: Iterable[dict]) -> dict:
+    """
+    Encode manifest entries (path, size, mtime, run_id, wildcards) as a JSON-serialisable payload.
+
+    Entries are sorted by path and the paths front-coded; the other fields are stored as columns in the same order,
+    with run ids and wildcard values dictionary-encoded. Per-file stats (entry["stats"]) are carried along when present.
+    """
+    entries = sorted(entries, key=lambda entry: entry["path"])
+    prefix_lengths, suffixes = front_code(entry["path"] for entry in entries)
+    wildcard_names = sorted({name for entry in entries for name in entry.get("wildcards") or {}})
+    payload = {
+        "format": WIRE_FORMAT,
+        "count": len(entries),
+        "paths": {"prefix_lengths": prefix_lengths, "suffixes": suffixes},
+        "size": [entry["size"] for entry in entries],
+        "mtime": [entry["mtime"] for entry in entries],
+        "run_id": dictionary_encode([entry.get("run_id") for entry in entries]),
+        "wildcards": {name: dictionary_encode([(entry.get("wildcards") or {}).get(name) for entry in entries]) for name in wildcard_names},
+    }
+    if any("stats" in entry for entry in entries):
+        payload["stats"] = encode_stats([entry.get("stats") for entry in entries])
+    return payload
+
+
+def encode_stats(stats: List[Optional[dict]]) -> dict:
+    """
+    Encode per-file stats (row count, header, ...), storing every distinct header once.
+    """
+    headers: Dict[tuple, int] = {}
+    files = []
+    for item in stats:
+        item = {key: value for key, value in (item or {}).items() if key != "path"}
+        if "columns" in item:
+            item["columns"] = headers.setdefault(tuple(item["columns"]), len(headers))
+        files.append(item)
+    return {"headers": [list(header) for header in headers], "files": files}
+
+
+def decode_stats(payload: dict) -> List[dict]:
+    stats = []
+    for item in payload["files"]:
+        item = dict(item)
+        if "columns" in item:
+            item["columns"] = payload["headers"][item["columns"]]
+        stats.append(item)
+    return stats
+
+
+def decode_manifest(payload: dict) -> List[dict]:
+    """
+    Decode a payload produced by encode_manifest back into a list of entries, sorted by path.
+    """
+    if payload.get("format") != WIRE_FORMAT:
+        raise ValueError(f"Unsupported manifest format {payload.get('format')!r}, expected {WIRE_FORMAT!r}")
+    paths = front_decode(payload["paths"]["prefix_lengths"], payload["paths"]["suffixes"])
+    run_ids = dictionary_decode(payload["run_id"])
+    wildcards = {name: dictionary_decode(column) for name, column in payload["wildcards"].items()}
+    if not len(paths) == len(payload["size"]) == len(payload["mtime"]) == len(run_ids) == payload["count"]:
+        raise ValueError("Manifest columns have different lengths")
+
+    stats = decode_stats(payload["stats"]) if "stats" in payload else None
+    entries = []
+    for i, path in enumerate(paths):
+        entries.append(
+            {
+                "path": path,
+                "size": payload["size"][i],
+                "mtime": payload["mtime"][i],
+                "run_id": run_ids[i],
+                "wildcards": {name: values[i] for name, values in wildcards.items() if values[i] is not None},
+            }
+        )
+        if stats is not None:
+            entries[-1]["stats"] = stats[i]
+    return entries
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from depictio_cli.logging import logger
+
+
+class WorkQueue:
+    """
+    Queue of run directories to scan, stored in an SQLite file on a filesystem shared by the scan nodes.
+
+    Workers claim runs in batches; a claim not completed within `lease_seconds` (e.g. a crashed worker) is handed out again.
+    The rollback journal is used instead of WAL, which does not work on network filesystems.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 3600):
+        self.path = os.path.expanduser(path)
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=120, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                workflow_tag TEXT NOT NULL,
+                run_path TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                claimed_at REAL,
+                manifest TEXT,
+                PRIMARY KEY (workflow_tag, run_path)
+            )
+            """
+        )
+
+    def populate(self, workflow_tag: str, runs: Iterable[Tuple[str, str]]) -> int:
+        """
+        Add runs to the queue, ignoring the ones already queued. Returns the number of runs added.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (workflow_tag, run_path, run_id) VALUES (?, ?, ?)",
+                [(workflow_tag, run_path, run_id) for run_id, run_path in runs],
+            )
+            added = self._conn.total_changes - before
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, workflow_tag: str, worker: str, batch_size: int = 1) -> List[Tuple[str, str]]:
+        """
+        Atomically claim up to `batch_size` pending (or expired) runs of a workflow.
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(
+                """
+                SELECT run_id, run_path FROM tasks
+                WHERE workflow_tag = ? AND (status = 'pending' OR (status = 'claimed' AND claimed_at < ?))
+                ORDER BY run_path LIMIT ?
+                """,
+                (workflow_tag, now - self.lease_seconds, batch_size),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE tasks SET status = 'claimed', worker = ?, claimed_at = ? WHERE workflow_tag = ? AND run_path = ?",
+                [(worker, now, workflow_tag, run_path) for _, run_path in rows],
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return [(run_id, run_path) for run_id, run_path in rows]
+
+    def complete(self, workflow_tag: str, run_paths: Iterable[str], manifest: str) -> None:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "UPDATE tasks SET status = 'done', manifest = ? WHERE workflow_tag = ? AND run_path = ?",
+                [(manifest, workflow_tag, run_path) for run_path in run_paths],
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def progress(self, workflow_tag: str) -> Dict[str, int]:
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks WHERE workflow_tag = ? GROUP BY status", (workflow_tag,)).fetchall()
+        counts = {"pending": 0, "claimed": 0, "done": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def manifests(self, workflow_tag: str) -> List[str]:
+        rows = self._conn.execute("SELECT DISTINCT manifest FROM tasks WHERE workflow_tag = ? AND status = 'done'", (workflow_tag,)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def worker_id() -> str:
+    return f"{os.uname().nodename}-{os.getpid()}"
+
+
+def log_progress(queue: WorkQueue, workflow_tag: str) -> None:
+    counts = queue.progress(workflow_tag)
+    logger.info(f"Queue progress for {workflow_tag}: {counts['done']} done, {counts['claimed']} claimed, {counts['pending']} pending")
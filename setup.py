@@ -4,6 +4,7 @@ setup(
     name="depictio-cli",
     version="0.1.0",
     packages=find_packages(),
+    package_data={"depictio_cli": ["depictio_json_schema.json"]},
     install_requires=[
         "bleach",
         "bson",
@@ -15,6 +16,13 @@ setup(
         "pyyaml",
         "typer",
     ],
+    extras_require={
+        "fast": ["orjson"],
+        "validation": ["jsonschema"],
+        "parquet": ["polars"],
+        "arrow": ["pyarrow"],
+        "s3": ["boto3"],
+    },
     entry_points={
         "console_scripts": [
             "depictio-cli=depictio_cli.depictio_cli:main"
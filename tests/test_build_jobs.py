@@ -0,0 +1,97 @@
+import contextvars
+import json
+import threading
+
+import httpx
+
+from depictio_cli import build_jobs, metrics
+from depictio_cli.build_jobs import LocalBuildBackend, track_build_jobs
+from depictio_cli.token_manager import TokenManager
+from depictio_cli.utils import RemoteBuildBackend, use_api_session
+
+
+def job(tag, depends_on=()):
+    return {"data_collection_id": f"id-{tag}", "data_collection_tag": tag, "kind": "deltatable", "depends_on": [f"id-{dependency}" for dependency in depends_on]}
+
+
+def track(backend, jobs, timeout=10):
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(track_build_jobs(backend, backend.submit("wf", jobs), jobs)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "track_build_jobs did not return"
+    return {event["data_collection_tag"]: event for event in results.values()}
+
+
+def test_all_jobs_succeed_after_their_dependencies():
+    built = []
+
+    def run_job(job):
+        built.append(job["data_collection_tag"])
+        return {"version": len(built)}
+
+    results = track(LocalBuildBackend(run_job), [job("samples"), job("joined", depends_on=["samples"]), job("other")])
+
+    assert {tag: event["status"] for tag, event in results.items()} == {"samples": "success", "joined": "success", "other": "success"}
+    assert built.index("samples") < built.index("joined")
+    assert results["samples"]["result"]["version"] >= 1
+
+
+def test_failed_dependency_cancels_downstream_job():
+    def run_job(job):
+        if job["data_collection_tag"] == "samples":
+            raise ValueError("server error")
+        return None
+
+    results = track(LocalBuildBackend(run_job), [job("samples"), job("joined", depends_on=["samples"]), job("other")])
+
+    assert results["samples"]["status"] == "failed"
+    assert results["samples"]["error"] == "server error"
+    assert results["joined"]["status"] == "cancelled"
+    assert results["other"]["status"] == "success"
+
+
+def test_dead_group_ends_the_status_stream(monkeypatch):
+    class BrokenScheduler:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError("scheduler crashed")
+
+    monkeypatch.setattr(build_jobs, "DAGScheduler", BrokenScheduler)
+    results = track(LocalBuildBackend(lambda job: None), [job("samples"), job("joined", depends_on=["samples"])])
+
+    assert {event["status"] for event in results.values()} == {"failed"}
+
+
+def test_remote_status_stream_refreshes_a_rejected_token():
+    def handler(request):
+        if request.headers["Authorization"] != "Bearer t2":
+            return httpx.Response(401, json={"detail": "expired"})
+        lines = [{"data_collection_id": "id-samples", "data_collection_tag": "samples", "status": "success"}]
+        return httpx.Response(200, content="".join(json.dumps(line) + "\n" for line in lines), headers={"Content-Type": "application/x-ndjson"})
+
+    registry = metrics.configure_metrics()
+    token_manager = TokenManager({"access_token": "t1"}, refresh=lambda token: {"access_token": "t2"})
+    context = contextvars.copy_context()
+    context.run(use_api_session, httpx.Client(transport=httpx.MockTransport(handler)), token_manager)
+    backend = RemoteBuildBackend({"api_base_url": "https://depictio.example"}, {"Authorization": "Bearer t1"})
+    try:
+        results = context.run(track_build_jobs, backend, "group", [job("samples")])
+    finally:
+        metrics.configure_metrics(enabled=False)
+
+    assert results["id-samples"]["status"] == "success"
+    assert token_manager.refreshes == 1
+    assert 'endpoint="jobs/status/group",method="GET",status="200"' in registry.render()
+
+
+def test_group_is_released_when_the_consumer_stops_early():
+    release = threading.Event()
+    backend = LocalBuildBackend(lambda job: release.wait(5))
+    group_id = backend.submit("wf", [job("samples"), job("other")])
+
+    events = backend.status_events(group_id)
+    assert next(events)["status"] == "queued"
+    events.close()
+    release.set()
+
+    assert group_id not in backend._groups
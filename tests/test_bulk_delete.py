@@ -0,0 +1,67 @@
+import threading
+
+import httpx
+
+from depictio_cli import bulk_delete
+from depictio_cli.bulk_delete import S3Deleter, delete_targets, iter_batches, select_targets
+
+WORKFLOWS = [
+    {"_id": "wf1", "workflow_tag": "snakemake/rnaseq", "data_collections": [{"_id": "dc1", "data_collection_tag": "counts"}, {"_id": "dc2", "data_collection_tag": "tracks"}]},
+    {"_id": "wf2", "workflow_tag": "nextflow/rnaseq", "data_collections": [{"_id": "dc3", "data_collection_tag": "counts"}]},
+]
+
+
+class FakeS3Client:
+    def __init__(self, keys):
+        self.keys = dict(keys)
+        self.lock = threading.Lock()
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(key for key in client.keys if key.startswith(Prefix))
+                for batch in iter_batches(keys, 2):
+                    yield {"Contents": [{"Key": key, "Size": client.keys[key]} for key in batch]}
+
+        return Paginator()
+
+    def delete_objects(self, Bucket, Delete):
+        with self.lock:
+            for item in Delete["Objects"]:
+                self.keys.pop(item["Key"])
+        return {}
+
+
+def make_s3(keys, batch_size=3):
+    s3 = S3Deleter.__new__(S3Deleter)
+    s3.client, s3.bucket, s3.prefix, s3.batch_size = FakeS3Client(keys), "bucket", "data/", batch_size
+    s3._lock = threading.Lock()
+    s3.stats = {"objects": 0, "bytes": 0, "requests": 0, "errors": 0}
+    return s3
+
+
+def test_select_targets():
+    assert [target["kind"] for target in select_targets(WORKFLOWS)] == ["workflow", "workflow"]
+    assert [bulk_delete.target_name(target) for target in select_targets(WORKFLOWS, ["*/rnaseq"], ["count*"])] == ["snakemake/rnaseq/counts", "nextflow/rnaseq/counts"]
+    assert select_targets(WORKFLOWS, ["snakemake/*"])[0]["data_collections"] == WORKFLOWS[0]["data_collections"]
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_delete_targets(monkeypatch):
+    requests = []
+
+    def api_request(method, url, headers=None, timeout=None, retries=0):
+        requests.append(url.split("/api/v1/", 1)[1])
+        return httpx.Response(500 if "wf2" in url else 200, text="error")
+
+    monkeypatch.setattr(bulk_delete, "api_request", api_request)
+    s3 = make_s3({f"data/dc1/{i}.parquet": 10 for i in range(7)} | {"data/dc2/a": 5, "data/dc3/a": 1, "data/dc10/a": 1})
+    deleted = delete_targets({"api_base_url": "https://depictio.example"}, select_targets(WORKFLOWS), {}, max_workers=2, s3=s3)
+
+    assert [target["workflow"]["_id"] for target in deleted] == ["wf1"]
+    assert sorted(requests) == ["workflows/delete/wf1", "workflows/delete/wf2"]
+    # The objects of a data collection are deleted in batches, and only under its own prefix
+    assert s3.client.keys == {"data/dc10/a": 1}
+    assert s3.stats == {"objects": 9, "bytes": 76, "requests": 5, "errors": 0}
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from depictio_cli import utils
+from depictio_cli.client import DepictioClient, SyncDepictioClient
+
+AGENT_CONFIG = {"api_base_url": "https://depictio.example", "user": {"email": "a@example.org", "token": {"access_token": "t1", "expire_datetime": "2999-01-01 00:00:00"}}}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(utils, "get_http_cache", lambda: None)
+    monkeypatch.setattr(utils, "refresh_access_token", lambda agent_config, access_token, config_path: {"access_token": "t2", "expire_datetime": "2999-01-01 00:00:00"})
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.path, request.headers["Authorization"]))
+        if request.headers["Authorization"] != "Bearer t2":
+            return httpx.Response(401)
+        if request.url.path.endswith("/workflows/get/from_args"):
+            return httpx.Response(200, json={"_id": "wf1", "name": request.url.params["name"]})
+        if request.url.path.endswith("/missing"):
+            return httpx.Response(404, text="not found")
+        return httpx.Response(200, json={"ok": True})
+
+    return requests, httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def make_client(http_client):
+    client = DepictioClient(json.loads(json.dumps(AGENT_CONFIG)))
+    client._http_client.close()
+    client._http_client = http_client
+    return client
+
+
+def test_async_client(server):
+    requests, http_client = server
+
+    async def main():
+        async with make_client(http_client) as client:
+            workflows = await asyncio.gather(*(client.get_workflow("rnaseq", "snakemake") for _ in range(3)))
+            assert all(workflow["_id"] == "wf1" for workflow in workflows)
+            # Resolved workflows are reused for the lifetime of the client
+            count = len(requests)
+            await client.get_workflow("rnaseq", "snakemake")
+            assert len(requests) == count
+            with pytest.raises(httpx.HTTPStatusError, match="not found"):
+                await client._request_json("GET", "missing", "fetching")
+            return client
+
+    client = asyncio.run(main())
+    # The rejected token was refreshed once and written back to the agent configuration
+    assert requests[:2] == [("POST", "/depictio/api/v1/cli/validate_agent_config", "Bearer t1"), ("POST", "/depictio/api/v1/cli/validate_agent_config", "Bearer t2")]
+    assert client.token_manager.refreshes == 1
+    assert client.agent_config["user"]["token"]["access_token"] == "t2"
+
+
+def test_sync_client(server):
+    requests, http_client = server
+    client = SyncDepictioClient(json.loads(json.dumps(AGENT_CONFIG)))
+    client.client._http_client.close()
+    client.client._http_client = http_client
+    with client:
+        assert client.request("GET", "workflows/get_all_workflows").json() == {"ok": True}
+        assert client.get_workflow("rnaseq", "snakemake")["_id"] == "wf1"
+    assert requests[-1][2] == "Bearer t2"
@@ -0,0 +1,29 @@
+import datetime
+import importlib.util
+
+import pytest
+
+from depictio_cli import codec
+
+BACKENDS = [name for name in codec.BACKENDS if name == "json" or importlib.util.find_spec(name) is not None]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_round_trip(backend):
+    selected = codec.get_codec(backend)
+    obj = {"tag": "échantillon", "values": [1, 2.5, None, True], "nested": {"empty": []}}
+    data = selected.dumps(obj)
+    assert isinstance(data, bytes)
+    assert selected.loads(data) == obj
+    assert selected.loads(data.decode("utf-8")) == obj
+    # Values that are not JSON types are sent as strings
+    assert selected.loads(selected.dumps({"time": datetime.date(2024, 1, 2)})) == {"time": "2024-01-02"}
+
+
+def test_backend_selection(monkeypatch):
+    with pytest.raises(ValueError, match="Unknown JSON backend"):
+        codec.get_codec("yaml")
+    monkeypatch.setattr(codec, "_codec", codec.get_codec())
+    codec.set_backend("json")
+    assert codec.backend_name() == "json"
+    assert codec.loads(codec.dumps([1, "a"])) == [1, "a"]
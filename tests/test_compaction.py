@@ -0,0 +1,94 @@
+import json
+
+import httpx
+
+from depictio_cli.compaction import CompactionThresholds, LocalTableStore, compact_tables, plan_compaction
+
+THRESHOLDS = CompactionThresholds(target_file_size=100, small_file_size=50, min_small_files=3, min_small_file_ratio=0.5)
+
+
+def write_table(root, table, rows_per_file):
+    directory = root / table
+    directory.mkdir()
+    for i, rows in enumerate(rows_per_file):
+        lines = [json.dumps({"file": i, "row": row}) for row in range(rows)]
+        (directory / f"part-{i:03d}.ndjson").write_text("\n".join(lines) + "\n")
+
+
+def read_rows(root, table):
+    rows = []
+    for path in sorted((root / table).glob("*.ndjson")):
+        rows.extend(json.loads(line) for line in path.read_text().splitlines() if line)
+    return sorted(rows, key=lambda row: (row["file"], row["row"]))
+
+
+def test_plan_compaction_below_minimum():
+    plan = plan_compaction([{"path": "a", "size": 10}, {"path": "b", "size": 10}], THRESHOLDS)
+    assert not plan["compact"]
+    assert plan["small_files"] == 2
+
+
+def test_plan_compaction_below_ratio():
+    files = [{"path": f"small-{i}", "size": 10} for i in range(3)] + [{"path": f"large-{i}", "size": 500} for i in range(4)]
+    assert not plan_compaction(files, THRESHOLDS)["compact"]
+
+
+def test_plan_compaction_groups_by_target_size():
+    files = [{"path": f"part-{i}", "size": 40} for i in reversed(range(6))] + [{"path": "large", "size": 500}]
+    plan = plan_compaction(files, THRESHOLDS)
+    assert plan["compact"]
+    # Groups follow path order and stay within the target size
+    assert plan["groups"] == [["part-0", "part-1"], ["part-2", "part-3"], ["part-4", "part-5"]]
+    assert plan["bytes"] == 240
+
+
+def test_plan_compaction_skips_single_file_groups():
+    files = [{"path": f"part-{i}", "size": 49} for i in range(3)]
+    plan = plan_compaction(files, CompactionThresholds(target_file_size=50, small_file_size=50, min_small_files=3, min_small_file_ratio=0))
+    assert not plan["compact"]
+    assert plan["reason"] == "no group of small files to merge"
+
+
+def test_compact_local_table_keeps_rows(tmp_path):
+    write_table(tmp_path, "samples", [2] * 8)
+    before = read_rows(tmp_path, "samples")
+    store = LocalTableStore(str(tmp_path))
+
+    assert compact_tables(store, THRESHOLDS)
+
+    files = store.list_files("samples")
+    assert len(files) < 8
+    assert any(file["path"].endswith("-compacted.ndjson") for file in files)
+    assert read_rows(tmp_path, "samples") == before
+    assert not list((tmp_path / "samples").glob(".*.tmp"))
+
+
+def test_compact_dry_run_leaves_files(tmp_path):
+    write_table(tmp_path, "samples", [2] * 8)
+    store = LocalTableStore(str(tmp_path))
+
+    assert compact_tables(store, THRESHOLDS, dry_run=True)
+    assert len(store.list_files("samples")) == 8
+
+
+def test_compact_unknown_table_fails_only_itself(tmp_path):
+    write_table(tmp_path, "samples", [2] * 8)
+    store = LocalTableStore(str(tmp_path))
+
+    assert not compact_tables(store, THRESHOLDS, tables=["missing", "samples"])
+    assert len(store.list_files("samples")) < 8
+
+
+def test_compact_api_error_fails_only_its_table(tmp_path):
+    write_table(tmp_path, "a", [2] * 8)
+    write_table(tmp_path, "b", [2] * 8)
+
+    class FlakyStore(LocalTableStore):
+        def list_files(self, table):
+            if table == "a":
+                raise httpx.ConnectError("connection refused")
+            return super().list_files(table)
+
+    store = FlakyStore(str(tmp_path))
+    assert not compact_tables(store, THRESHOLDS)
+    assert len(store.list_files("b")) < 8
@@ -0,0 +1,33 @@
+import os
+
+from depictio_cli.conversion import content_fingerprint
+
+
+def test_unchanged_files_are_not_read_again(tmp_path):
+    path = tmp_path / "S1.csv"
+    path.write_text("sample,count\nS1,1\n")
+    cache_dir = str(tmp_path / "cache")
+    fingerprint = content_fingerprint(str(path), "options", cache_dir=cache_dir)
+    assert fingerprint == content_fingerprint(str(path), "options")
+
+    # Same size, mtime and inode: the recorded fingerprint is returned without reading the content
+    stat = os.stat(path)
+    with open(path, "r+") as f:
+        f.write("SAMPLE")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert content_fingerprint(str(path), "options", cache_dir=cache_dir) == fingerprint
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    changed = content_fingerprint(str(path), "options", cache_dir=cache_dir)
+    assert changed != fingerprint
+    assert changed == content_fingerprint(str(path), "options")
+
+
+def test_fingerprints_are_recorded_per_read_options(tmp_path):
+    path = tmp_path / "S1.csv"
+    path.write_text("sample,count\nS1,1\n")
+    cache_dir = str(tmp_path / "cache")
+    first = content_fingerprint(str(path), "options", cache_dir=cache_dir)
+    second = content_fingerprint(str(path), "other options", cache_dir=cache_dir)
+    assert first != second
+    assert content_fingerprint(str(path), "options", cache_dir=cache_dir) == first
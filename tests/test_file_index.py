@@ -0,0 +1,60 @@
+import pytest
+
+from depictio_cli.file_index import FileIndex
+
+WORKFLOW = {"_id": "wf1", "workflow_tag": "engine/wf", "name": "wf", "engine": "snakemake", "data_collections": [{"_id": "dc1", "data_collection_tag": "samples", "config": {"type": "Table"}}]}
+
+
+def make_file(file_id, run_id, sample, **extra):
+    return {
+        "_id": file_id,
+        "run_id": run_id,
+        "filename": f"{sample}.csv",
+        "file_location": f"/runs/{run_id}/{sample}.csv",
+        "wildcards": [{"name": "sample", "value": sample}],
+        "registration_time": "2024-01-01 00:00:00",
+        **extra,
+    }
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FileIndex(str(tmp_path / "index.sqlite"))
+    index.index_workflow(WORKFLOW)
+    yield index
+    index.close()
+
+
+def test_refresh_is_incremental(index):
+    files = [make_file("f1", "run1", "S1"), make_file("f2", "run1", "S2")]
+    assert index.refresh_data_collection_files("wf1", "dc1", files) == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}
+
+    # A rescan changes the registration times only
+    rescanned = [{**file, "registration_time": "2024-02-01 00:00:00"} for file in files]
+    assert index.refresh_data_collection_files("wf1", "dc1", rescanned) == {"added": 0, "updated": 0, "removed": 0, "unchanged": 2}
+
+    changed = [make_file("f1", "run1", "S1", size=10), make_file("f3", "run2", "S3")]
+    assert index.refresh_data_collection_files("wf1", "dc1", changed) == {"added": 1, "updated": 1, "removed": 1, "unchanged": 0}
+    assert [file["file_id"] for file in index.query_files()] == ["f1", "f3"]
+
+
+def test_query_by_tag_run_and_wildcards(index):
+    index.refresh_data_collection_files("wf1", "dc1", [make_file("f1", "run1", "S1"), make_file("f2", "run2", "S2"), make_file("f3", "run2", "S3")])
+
+    assert len(index.query_files(workflow="engine/wf", data_collection="samples")) == 3
+    assert index.query_files(workflow="other") == []
+    assert [file["file_id"] for file in index.query_files(run_id="run2")] == ["f2", "f3"]
+    matches = index.query_files(wildcards={"sample": "S3"})
+    assert [(file["file_id"], file["wildcards"], file["data_collection_tag"]) for file in matches] == [("f3", {"sample": "S3"}, "samples")]
+    assert len(index.query_files(limit=2)) == 2
+    assert index.list_workflows()[0]["files"] == 3
+
+
+def test_content_digest_follows_the_files(index):
+    assert index.content_digest("wf1", "dc1") is None
+    index.refresh_data_collection_files("wf1", "dc1", [make_file("f1", "run1", "S1")])
+    digest = index.content_digest("wf1", "dc1")
+    index.refresh_data_collection_files("wf1", "dc1", [make_file("f1", "run1", "S1", registration_time="2024-03-01")])
+    assert index.content_digest("wf1", "dc1") == digest
+    index.refresh_data_collection_files("wf1", "dc1", [make_file("f1", "run1", "S1", size=10)])
+    assert index.content_digest("wf1", "dc1") != digest
@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from depictio_cli import file_stats
+from depictio_cli.file_stats import compute_file_stats, count_lines
+
+CONTENT = b"# comment\nsample\tcount\nS1\t1\nS2\t2\n"
+
+
+@pytest.mark.parametrize("compressed", [False, True], ids=["plain", "gzip"])
+def test_counts_across_chunks(tmp_path, monkeypatch, compressed):
+    monkeypatch.setattr(file_stats, "CHUNK_SIZE", 5)
+    path = tmp_path / ("counts.tsv.gz" if compressed else "counts.tsv")
+    path.write_bytes(gzip.compress(CONTENT) if compressed else CONTENT)
+    newlines, ends_with_newline, head = count_lines(str(path), n_head_lines=2)
+    assert (newlines, ends_with_newline, head) == (4, True, [b"# comment", b"sample\tcount"])
+
+    stats = compute_file_stats(str(path), skip_rows=1, keep_columns=["sample", "depth"])
+    assert stats["rows"] == 2
+    assert stats["columns"] == ["sample", "count"]
+    assert stats["missing_columns"] == ["depth"]
+    assert not stats["truncated"]
+
+
+def test_truncated_and_empty_files(tmp_path):
+    truncated = tmp_path / "truncated.csv"
+    truncated.write_bytes(b'"sample","count"\nS1,1\nS2,')
+    stats = compute_file_stats(str(truncated), separator=",")
+    assert (stats["rows"], stats["truncated"], stats["columns"]) == (2, True, ["sample", "count"])
+
+    empty = tmp_path / "empty.csv"
+    empty.write_bytes(b"")
+    assert compute_file_stats(str(empty), separator=",") == {"path": str(empty), "size": 0, "rows": 0, "truncated": False, "columns": [], "missing_columns": []}
+
+    no_header = compute_file_stats(str(truncated), separator=",", has_header=False)
+    assert no_header["rows"] == 3 and "columns" not in no_header
+
+
+def test_unreadable_files(tmp_path):
+    assert "error" in compute_file_stats(str(tmp_path / "missing.csv"))
+    corrupt = tmp_path / "corrupt.csv.gz"
+    corrupt.write_bytes(b"not gzip")
+    assert "error" in compute_file_stats(str(corrupt))
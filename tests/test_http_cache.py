@@ -0,0 +1,80 @@
+import threading
+
+import httpx
+
+from depictio_cli.http_cache import HTTPCache, cache_key, cache_scope
+
+URL = "https://depictio.example/depictio/api/v1/workflows/get_all_workflows"
+REQUEST = httpx.Request("GET", URL)
+
+
+def make_send(responses, sent):
+    def send(headers):
+        sent.append(headers)
+        return responses.pop(0)
+
+    return send
+
+
+def test_cache_key_is_scoped_to_the_user_not_the_token():
+    user = cache_scope({"api_base_url": "https://depictio.example", "user": {"email": "a@example.org"}})
+    other = cache_scope({"api_base_url": "https://depictio.example", "user": {"email": "b@example.org"}})
+    # A refreshed token keeps the cached responses of its user
+    assert cache_key(URL, None, {"Authorization": "Bearer t1"}, user) == cache_key(URL, None, {"Authorization": "Bearer t2"}, user)
+    assert cache_key(URL, None, {"Authorization": "Bearer t1"}, user) != cache_key(URL, None, {"Authorization": "Bearer t1"}, other)
+    # Without a known user, the credentials still keep users apart
+    assert cache_key(URL, None, {"Authorization": "Bearer t1"}) != cache_key(URL, None, {"Authorization": "Bearer t2"})
+
+
+def test_etag_revalidation(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    sent = []
+    send = make_send([httpx.Response(200, json=[1, 2], headers={"ETag": '"v1"'}, request=REQUEST), httpx.Response(304, request=REQUEST)], sent)
+
+    assert cache.request(URL, None, {}, send, user="u").json() == [1, 2]
+    assert cache.request(URL, None, {}, send, user="u").json() == [1, 2]
+    assert sent[1]["If-None-Match"] == '"v1"'
+    assert cache.stats["misses"] == 1 and cache.stats["revalidated"] == 1
+
+
+def test_max_age_is_served_without_a_request(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    sent = []
+    send = make_send([httpx.Response(200, json={"a": 1}, headers={"Cache-Control": "max-age=60"}, request=REQUEST)], sent)
+
+    cache.request(URL, None, {}, send)
+    assert cache.request(URL, None, {}, send).json() == {"a": 1}
+    assert len(sent) == 1 and cache.stats["hits"] == 1
+
+
+def test_uncacheable_responses_are_not_stored(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    sent = []
+    send = make_send([httpx.Response(200, json=1, request=REQUEST), httpx.Response(200, json=2, request=REQUEST)], sent)
+
+    cache.request(URL, None, {}, send)
+    assert cache.request(URL, None, {}, send).json() == 2
+    assert "If-None-Match" not in sent[1]
+
+
+def test_concurrent_identical_requests_share_one_fetch(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+    sent = []
+
+    def send(headers):
+        sent.append(headers)
+        started.set()
+        release.wait(5)
+        return httpx.Response(200, json={"a": 1}, headers={"ETag": '"v1"'}, request=REQUEST)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.request(URL, None, {}, send).json())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+    for thread in threads:
+        thread.join()
+    assert results == [{"a": 1}] * 4
+    assert len(sent) == 1 and cache.stats["coalesced"] == 3
@@ -0,0 +1,37 @@
+from depictio_cli.journal import RunJournal, compute_config_hash
+
+
+def test_config_hash_ignores_volatile_keys():
+    dc = {"data_collection_tag": "samples", "config": {"type": "Table"}, "registration_time": "2024-01-01"}
+    assert compute_config_hash(dc) == compute_config_hash({**dc, "registration_time": "2025-01-01"})
+    assert compute_config_hash(dc) != compute_config_hash({**dc, "config": {"type": "JBrowse2"}})
+
+
+def test_entries_are_only_valid_for_the_same_inputs(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    journal.record("wf", "dc1", "scan", "h1", result={"files": 2}, duration=1.5)
+    assert journal.get("wf", "dc1", "scan", "h1")["result"] == {"files": 2}
+    assert not journal.is_completed("wf", "dc1", "scan", "h2")
+    assert not journal.is_completed("wf", "dc1", "aggregate", "h1")
+
+    journal.record("wf", "dc1", "scan", "h2")
+    assert not journal.is_completed("wf", "dc1", "scan", "h1")
+    assert journal.is_completed("wf", "dc1", "scan", "h2")
+    journal.close()
+
+    # Entries survive the process
+    assert RunJournal(str(tmp_path / "journal.sqlite")).is_completed("wf", "dc1", "scan", "h2")
+
+
+def test_invalidate(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    for dc in ["dc1", "dc2"]:
+        for stage in ["scan", "aggregate"]:
+            journal.record("wf", dc, stage, "h")
+    journal.invalidate("wf", "dc1", "aggregate")
+    assert not journal.is_completed("wf", "dc1", "aggregate", "h")
+    assert journal.is_completed("wf", "dc1", "scan", "h")
+    journal.invalidate("wf", "dc2")
+    assert not journal.is_completed("wf", "dc2", "scan", "h")
+    journal.invalidate("wf")
+    assert not journal.is_completed("wf", "dc1", "scan", "h")
@@ -0,0 +1,76 @@
+import pytest
+
+from depictio_cli import manifest as manifest_module
+from depictio_cli.manifest import Manifest, _Strings
+
+
+def make_entries(count=10):
+    entries = []
+    for i in range(count):
+        wildcards = {"sample": f"S{i % 3}"}
+        if i % 2:
+            # Wildcards first seen after some rows, missing for others
+            wildcards["lane"] = f"L{i}"
+        entries.append(
+            {
+                "data_collection_tag": "counts" if i % 4 else "samples",
+                "run_id": f"run{i // 5}",
+                "path": f"/runs/run{i // 5}/{i}/é_{i}.csv",
+                "size": i * 1000,
+                "mtime": 1700000000.5 + i,
+                "wildcards": wildcards,
+            }
+        )
+    return entries
+
+
+def test_entries_round_trip():
+    entries = make_entries()
+    manifest = Manifest.from_entries(entries)
+    assert len(manifest) == len(entries)
+    assert list(manifest) == entries
+    assert list(manifest.paths()) == [entry["path"] for entry in entries]
+    assert manifest.nbytes() > 0
+
+
+@pytest.mark.parametrize("suffix", [".dpm", ".arrow"])
+def test_write_and_read(tmp_path, suffix):
+    if suffix == ".arrow":
+        pytest.importorskip("pyarrow")
+    entries = [{**entry, "run_path": f"/runs/{entry['run_id']}"} for entry in make_entries()]
+    path = str(tmp_path / f"manifest{suffix}")
+    Manifest.from_entries(entries).write(path)
+    manifest = Manifest.read(path)
+    assert list(manifest) == [{key: value for key, value in entry.items() if key != "run_path"} for entry in entries]
+    assert [manifest.run_path(i) for i in range(len(manifest))] == [entry["run_path"] for entry in entries]
+    assert [child.name for child in tmp_path.iterdir()] == [f"manifest{suffix}"]
+
+
+def test_high_cardinality_wildcards_are_stored_as_strings(monkeypatch):
+    monkeypatch.setattr(manifest_module, "MAX_DICTIONARY_SIZE", 4)
+    entries = make_entries(20)
+    for i, entry in enumerate(entries):
+        entry["wildcards"]["cell"] = f"cell-{i}"
+    manifest = Manifest.from_entries(entries)
+    assert isinstance(manifest.wildcards["cell"], _Strings)
+    assert not isinstance(manifest.wildcards["sample"], _Strings)
+    assert list(Manifest.from_bytes(manifest.to_bytes())) == entries
+
+
+def test_batches_and_split():
+    entries = make_entries()
+    manifest = Manifest.from_entries(entries)
+    batches = list(manifest.batches(4))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [entry for batch in batches for entry in batch.to_records()] == entries
+    assert list(batches[1].sizes) == [entry["size"] for entry in entries[4:8]]
+    assert list(batches[2].paths()) == [entry["path"] for entry in entries[8:]]
+
+    split = manifest.split_by_data_collection()
+    assert sorted(split) == ["counts", "samples"]
+    assert list(split["samples"]) == [entry for entry in entries if entry["data_collection_tag"] == "samples"]
+
+
+def test_invalid_data():
+    with pytest.raises(ValueError, match="Not a depictio manifest"):
+        Manifest.from_bytes(b"PK\x03\x04" + bytes(8))
@@ -0,0 +1,65 @@
+import pytest
+
+from depictio_cli import metrics
+from depictio_cli.metrics import MetricsRegistry, endpoint_label
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", None)
+    registry = metrics.configure_metrics()
+    yield registry
+    metrics.configure_metrics(enabled=False)
+
+
+def test_endpoint_label():
+    url = "https://depictio.example/depictio/api/v1/files/scan/65a1b2c3d4e5f60718293a4b/12?x=1"
+    assert endpoint_label(url) == "files/scan/:id/:id"
+    assert endpoint_label("https://depictio.example/depictio/api/v1/deltatables/get/123e4567-e89b-12d3-a456-426614174000") == "deltatables/get/:id"
+
+
+def test_render():
+    registry = MetricsRegistry()
+    registry.inc("depictio_requests_total", method="GET", endpoint="workflows", status="200")
+    registry.inc("depictio_requests_total", method="GET", endpoint="workflows", status="200")
+    registry.set("depictio_workflow_success", 1, workflow='engine/"wf"\n')
+    registry.inc("custom_total", 0.5)
+    text = registry.render()
+    assert "# TYPE depictio_requests_total counter" in text
+    assert 'depictio_requests_total{endpoint="workflows",method="GET",status="200"} 2' in text
+    assert 'depictio_workflow_success{workflow="engine/\\"wf\\"\\n"} 1' in text
+    assert "# TYPE custom_total untyped\ncustom_total 0.5\n" in text
+    assert text.endswith("\n")
+
+
+def test_recorded_metrics(registry, tmp_path):
+    metrics.record_request("POST", "https://depictio.example/depictio/api/v1/files/scan/42", "200", 0.25, uploaded=100, retried=True)
+    metrics.record_files_scanned("engine/wf", "counts", 10)
+    for result in ["hit", "miss", "revalidated", "miss"]:
+        metrics.record_cache_lookup("table", result)
+    with metrics.stage_timer("engine/wf", "counts", "scan") as outcome:
+        outcome["success"] = True
+    with pytest.raises(RuntimeError):
+        with metrics.stage_timer("engine/wf", "counts", "aggregate"):
+            raise RuntimeError
+
+    path = tmp_path / "depictio.prom"
+    writer = metrics.MetricsWriter(registry, str(path))
+    writer.start()
+    writer.stop()
+    text = path.read_text()
+    assert 'depictio_uploaded_bytes_total{endpoint="files/scan/:id"} 100' in text
+    assert 'depictio_request_retries_total{endpoint="files/scan/:id",method="POST"} 1' in text
+    assert 'depictio_files_scanned_total{data_collection="counts",workflow="engine/wf"} 10' in text
+    assert 'depictio_cache_hit_ratio{cache="table"} 0.5' in text
+    assert 'depictio_stage_runs_total{stage="scan",status="success"} 1' in text
+    assert 'depictio_stage_runs_total{stage="aggregate",status="failed"} 1' in text
+    assert [child.name for child in tmp_path.iterdir()] == ["depictio.prom"]
+
+
+def test_nothing_is_recorded_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", None)
+    metrics.record_request("GET", "https://depictio.example/", "200", 0.1)
+    with metrics.stage_timer("engine/wf", "counts", "scan"):
+        pass
+    assert metrics.get_metrics() is None
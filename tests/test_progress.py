@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+from depictio_cli.progress import ProgressDisplay, ProgressTask, TaskCancelled, current_task, format_task, iter_ndjson_events, iter_sse_events
+
+
+def test_sse_events():
+    lines = [": heartbeat", "event: progress", 'data: {"files_scanned": 1}', "", "data: first", "data: second", "", 'data: {"done": true}']
+    assert list(iter_sse_events(lines)) == [
+        {"event": "progress", "data": {"files_scanned": 1}},
+        {"event": "message", "data": "first\nsecond"},
+        {"event": "message", "data": {"done": True}},
+    ]
+
+
+def test_ndjson_events():
+    lines = ['{"event": "done", "files_scanned": 2}', "", '{"rows_written": 10}']
+    assert [event["event"] for event in iter_ndjson_events(lines)] == ["done", "progress"]
+
+
+def test_task_updates():
+    task = ProgressTask("counts", "scan")
+    task.start_time -= 10
+    task.update({"files_scanned": 25, "files_total": 100, "message": "scanning"})
+    # Estimated from the rate so far: 25 files in 10s, 75 left
+    assert task.eta == pytest.approx(30, rel=0.1)
+    task.update({"eta_seconds": 5, "rows_written": 1000})
+    assert task.eta == 5
+    assert format_task(task).startswith("counts:scan | running | 0:1")
+    assert "files 25/100 | rows 1000 | ETA 0:05 | scanning" in format_task(task)
+
+
+def make_display(**kwargs):
+    return ProgressDisplay(stream=io.StringIO(), tty=False, min_straggler_time=0, **kwargs)
+
+
+def test_run_sets_the_current_task():
+    display = make_display()
+    assert display.run("counts", "scan", lambda: current_task().dc_tag == "counts")
+    assert display.tasks[("counts", "scan")].status == "success"
+    assert current_task() is None
+    assert not display.run("counts", "aggregate", lambda: False)
+    assert display.tasks[("counts", "aggregate")].status == "failed"
+
+
+def test_stragglers_are_reported_and_cancelled():
+    display = make_display(cancel_stragglers=True)
+    for tag, elapsed in [("a", 1.0), ("b", 2.0), ("c", 100.0), ("d", 1.0)]:
+        task = display.tasks[(tag, "scan")] = ProgressTask(tag, "scan", status="success" if tag in "ab" else "running")
+        task.start_time -= elapsed
+        task.end_time = task.start_time + elapsed if tag in "ab" else None
+    interrupted = []
+    display.tasks[("c", "scan")].on_cancel(lambda: interrupted.append("c"))
+
+    display.check_stragglers()
+    assert display.tasks[("c", "scan")].straggler
+    assert display.tasks[("c", "scan")].cancel_reason == "straggler"
+    assert interrupted == ["c"]
+    assert not display.tasks[("d", "scan")].straggler
+
+
+def test_timed_out_tasks_are_cancelled():
+    display = make_display(stage_timeout=1.0)
+
+    def work():
+        task = current_task()
+        task.start_time -= 5
+        display.check_stragglers()
+        if task.cancelled:
+            raise TaskCancelled(task.cancel_reason)
+        return True
+
+    with pytest.raises(TaskCancelled, match="timed out"):
+        display.run("counts", "scan", work)
+    assert display.tasks[("counts", "scan")].status == "cancelled"
@@ -0,0 +1,78 @@
+from depictio_cli import utils
+from depictio_cli.file_index import FileIndex
+from depictio_cli.journal import RunJournal
+
+
+def make_workflow(runs_location):
+    dc = {"_id": "dc1", "data_collection_tag": "samples", "config": {"type": "Table", "files_regex": r".*\.csv"}}
+    return {"_id": "wf1", "workflow_tag": "engine/wf", "config": {"parent_runs_location": [str(runs_location)]}, "data_collections": [dc]}
+
+
+def run_setup(monkeypatch, workflow, journal, file_index=None, scan_mode="server", resume=True):
+    ran = []
+
+    def scan(agent_config, wf_id, dc, headers, file_index=None, local_manifest=None, file_stats=None):
+        ran.append("scan")
+        if file_index is not None:
+            files = [{"_id": "f1", "file_location": "/runs/run1/a.csv", "run_id": "run1"}]
+            file_index.refresh_data_collection_files(wf_id, str(dc["_id"]), files)
+        return True
+
+    def aggregate(agent_config, wf_id, dc, headers, **kwargs):
+        ran.append("aggregate")
+        return True
+
+    monkeypatch.setattr(utils, "scan_data_collection", scan)
+    monkeypatch.setattr(utils, "aggregate_data_collection", aggregate)
+    assert utils.process_workflow({}, workflow, {}, scan_files=True, journal=journal, resume=resume, file_index=file_index, scan_mode=scan_mode)
+    return ran
+
+
+def test_server_scan_mode_never_walks_the_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "discover_runs", lambda workflow: (_ for _ in ()).throw(AssertionError("walked the runs")))
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    file_index = FileIndex(str(tmp_path / "index.sqlite"))
+    workflow = make_workflow(tmp_path / "runs")
+
+    assert run_setup(monkeypatch, workflow, journal, file_index) == ["scan", "aggregate"]
+    # The inputs are the files registered by the last scan, unchanged since
+    assert run_setup(monkeypatch, workflow, journal, file_index) == []
+
+
+def test_unknown_inputs_are_never_skipped(tmp_path, monkeypatch):
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    # Run directories not mounted on this host: no input file is seen
+    workflow = make_workflow(tmp_path / "missing")
+
+    assert run_setup(monkeypatch, workflow, journal, scan_mode="local") == ["scan", "aggregate"]
+    assert run_setup(monkeypatch, workflow, journal, scan_mode="local") == ["scan", "aggregate"]
+
+
+def test_local_scan_mode_runs_again_after_new_files(tmp_path, monkeypatch):
+    run = tmp_path / "runs" / "run1"
+    run.mkdir(parents=True)
+    (run / "a.csv").write_text("x\n1\n")
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    workflow = make_workflow(tmp_path / "runs")
+
+    assert run_setup(monkeypatch, workflow, journal, scan_mode="local") == ["scan", "aggregate"]
+    assert run_setup(monkeypatch, workflow, journal, scan_mode="local") == []
+    (run / "b.csv").write_text("x\n2\n")
+    assert run_setup(monkeypatch, workflow, journal, scan_mode="local") == ["scan", "aggregate"]
+
+
+def test_failed_stages_run_again_on_resume(tmp_path, monkeypatch):
+    run = tmp_path / "runs" / "run1"
+    run.mkdir(parents=True)
+    (run / "a.csv").write_text("x\n1\n")
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    workflow = make_workflow(tmp_path / "runs")
+
+    ran = []
+    monkeypatch.setattr(utils, "scan_data_collection", lambda *args, **kwargs: ran.append("scan") or True)
+    monkeypatch.setattr(utils, "aggregate_data_collection", lambda *args, **kwargs: ran.append("aggregate") and False)
+    assert not utils.process_workflow({}, workflow, {}, scan_files=True, journal=journal, resume=True, scan_mode="local")
+    assert ran == ["scan", "aggregate"]
+
+    # The scan completed and its inputs are unchanged: only the failed aggregation runs again
+    assert run_setup(monkeypatch, workflow, journal, scan_mode="local") == ["aggregate"]
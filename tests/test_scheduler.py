@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from depictio_cli.scheduler import DAGScheduler, build_workflow_dag, critical_path, topological_order
+
+
+def make_dc(tag, dc_type="Table", **config):
+    return {"data_collection_tag": tag, "config": {"type": dc_type, **config}}
+
+
+DATA_COLLECTIONS = [
+    make_dc("samples"),
+    make_dc("counts", regex_wildcards=[{"name": "sample", "join_data_collection": "samples"}], join={"with_dc": ["samples"]}),
+    make_dc("tracks", "JBrowse2", regex={"pattern": r"(?P<sample>S\d+)\.bed", "wildcards": [{"name": "sample", "join_data_collection": "samples"}]}),
+    make_dc("reads", "Files"),
+]
+
+
+def test_dag_edges():
+    nodes = build_workflow_dag(DATA_COLLECTIONS, convert_tables=True)
+    assert ("reads", "aggregate") not in nodes
+    assert nodes[("counts", "convert")].upstream == [("counts", "scan")]
+    assert nodes[("counts", "scan")].upstream == [("samples", "scan")]
+    assert nodes[("tracks", "scan")].upstream == [("samples", "scan")]
+    assert sorted(nodes[("counts", "aggregate")].upstream) == [("counts", "convert"), ("samples", "aggregate")]
+
+    order = topological_order(nodes)
+    for key, node in nodes.items():
+        assert all(order.index(upstream) < order.index(key) for upstream in node.upstream)
+
+
+def test_references_outside_the_run_are_satisfied():
+    nodes = build_workflow_dag([DATA_COLLECTIONS[1]])
+    assert nodes[("counts", "scan")].upstream == []
+    assert nodes[("counts", "aggregate")].upstream == [("counts", "scan")]
+
+
+def test_cycles_are_rejected():
+    dcs = [make_dc("a", join={"with_dc": ["b"]}), make_dc("b", join={"with_dc": ["a"]})]
+    with pytest.raises(ValueError, match="a:aggregate, b:aggregate"):
+        build_workflow_dag(dcs)
+
+
+def test_nodes_run_after_their_upstream_nodes():
+    nodes = build_workflow_dag(DATA_COLLECTIONS)
+    finished, lock = [], threading.Lock()
+
+    def run_node(node):
+        with lock:
+            assert all(upstream in finished for upstream in node.upstream)
+            finished.append(node.key)
+        return True
+
+    scheduler = DAGScheduler(nodes, run_node, max_workers=4)
+    scheduler.run()
+    assert scheduler.success
+    assert sorted(finished) == sorted(nodes)
+
+
+def test_failures_only_cancel_downstream_nodes():
+    nodes = build_workflow_dag(DATA_COLLECTIONS)
+
+    def run_node(node):
+        if node.key == ("samples", "aggregate"):
+            raise RuntimeError("boom")
+        return node.key != ("tracks", "scan")
+
+    scheduler = DAGScheduler(nodes, run_node, max_workers=2)
+    scheduler.run()
+    statuses = {key: node.status for key, node in nodes.items()}
+    assert statuses[("samples", "aggregate")] == "failed"
+    assert nodes[("samples", "aggregate")].error == "boom"
+    assert statuses[("counts", "aggregate")] == "cancelled"
+    assert statuses[("tracks", "scan")] == "failed"
+    assert statuses[("tracks", "aggregate")] == "cancelled"
+    assert statuses[("counts", "scan")] == "success"
+    assert statuses[("reads", "scan")] == "success"
+    assert not scheduler.success
+
+
+def test_done_nodes_are_skipped_only_after_skipped_upstream_nodes():
+    nodes = build_workflow_dag(DATA_COLLECTIONS[:2])
+    ran, succeeded = [], []
+    # samples:scan changed since the last run, everything else is recorded as done
+    scheduler = DAGScheduler(
+        nodes,
+        lambda node: ran.append(node.key) or True,
+        is_done=lambda node: node.key != ("samples", "scan"),
+        on_success=lambda node: succeeded.append(node.key),
+    )
+    scheduler.run()
+    assert sorted(ran) == sorted(nodes)
+    assert sorted(succeeded) == sorted(nodes)
+
+    nodes = build_workflow_dag(DATA_COLLECTIONS[:2])
+    ran = []
+    DAGScheduler(nodes, lambda node: ran.append(node.key) or True, is_done=lambda node: node.stage == "scan").run()
+    assert sorted(ran) == [("counts", "aggregate"), ("samples", "aggregate")]
+    assert nodes[("counts", "scan")].status == "skipped"
+
+
+def test_critical_path():
+    nodes = build_workflow_dag(DATA_COLLECTIONS[:2])
+    durations = {("samples", "scan"): 1.0, ("counts", "scan"): 5.0, ("samples", "aggregate"): 2.0, ("counts", "aggregate"): 1.0}
+    for key, duration in durations.items():
+        nodes[key].start_time, nodes[key].end_time = 0.0, duration
+    path, total = critical_path(nodes)
+    assert path == [("samples", "scan"), ("counts", "scan"), ("counts", "aggregate")]
+    assert total == 7.0
@@ -0,0 +1,50 @@
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+from depictio_cli.commands.data import app
+from depictio_cli.conversion import resolve_dtypes
+from depictio_cli.schema_inference import infer_file_schema, reconcile_schemas
+
+
+def write_pipeline_config(tmp_path):
+    run = tmp_path / "runs" / "run1"
+    run.mkdir(parents=True)
+    (run / "a.tsv").write_text("sample\tcount\tratio\tflag\tnote\ns1\t1\t0.5\ttrue\t\ns2\t2\t1\tfalse\t\n")
+    (run / "b.tsv").write_text("sample\tcount\tratio\tflag\tnote\ns3\t3\t1.5\ttrue\t\n")
+    dc = {
+        "data_collection_tag": "samples",
+        "config": {"type": "Table", "files_regex": r".*\.tsv", "dc_specific_properties": {"format": "TSV", "polars_kwargs": {"separator": "\t"}}},
+    }
+    workflow = {"workflow_tag": "engine/wf", "config": {"parent_runs_location": [str(tmp_path / "runs")]}, "data_collections": [dc]}
+    path = tmp_path / "pipeline.yaml"
+    path.write_text(yaml.safe_dump({"workflows": [workflow]}))
+    return path, run
+
+
+def test_infer_file_schema_promotes_per_column(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text("a,b,c\n1,1,x\n2,1.5,\n")
+    assert infer_file_schema(str(path), separator=",")["dtypes"] == {"a": "Int64", "b": "Float64", "c": "Utf8"}
+
+
+def test_reconcile_schemas_promotes_across_files():
+    schemas = [
+        {"path": "a", "columns": ["x", "y"], "dtypes": {"x": "Int64", "y": None}},
+        {"path": "b", "columns": ["x", "y"], "dtypes": {"x": "Float64", "y": None}},
+    ]
+    # Columns empty in every sampled file are read as strings
+    assert reconcile_schemas(schemas)["dtypes"] == {"x": "Float64", "y": "Utf8"}
+
+
+def test_infer_schema_output_round_trips_through_read_csv(tmp_path):
+    pl = pytest.importorskip("polars")
+    pipeline_config_path, run = write_pipeline_config(tmp_path)
+
+    result = CliRunner().invoke(app, ["infer-schema", "--pipeline-config-path", str(pipeline_config_path), "--max-workers", "1"])
+    assert result.exit_code == 0, result.output
+    polars_kwargs = yaml.safe_load(result.stdout)["engine/wf/samples"]["polars_kwargs"]
+    assert "dtypes" not in polars_kwargs
+
+    df = pl.read_csv(str(run / "a.tsv"), **resolve_dtypes(polars_kwargs))
+    assert df.schema == {"sample": pl.Utf8, "count": pl.Int64, "ratio": pl.Float64, "flag": pl.Boolean, "note": pl.Utf8}
@@ -0,0 +1,125 @@
+import os
+
+import httpx
+import pytest
+
+from depictio_cli import spool as spool_module
+from depictio_cli.spool import Spool, build_manifest, file_event, flush_spool
+
+DC = {"_id": "dc1", "data_collection_tag": "counts", "config": {"type": "Table", "regex": {"pattern": r"{sample}\.csv", "wildcards": [{"name": "sample"}]}}}
+
+
+@pytest.fixture
+def runs(tmp_path):
+    run = tmp_path / "runs" / "run1"
+    run.mkdir(parents=True)
+    for name in ["S1.csv", "S2.csv", "S3.csv", "notes.txt"]:
+        (run / name).write_text("sample\n")
+    workflow = {"_id": "wf1", "workflow_tag": "engine/wf", "config": {"parent_runs_location": [str(tmp_path / "runs")]}, "data_collections": [DC]}
+    return run, workflow
+
+
+@pytest.fixture
+def registry(monkeypatch, runs):
+    # Registered files per data collection; the API is down while `down` is set
+    state = {"registered": [], "down": False, "fail": set()}
+
+    def list_workflows(agent_config, headers):
+        if state["down"]:
+            raise httpx.ConnectError("API down")
+        return [runs[1]]
+
+    def register(agent_config, workflow_id, dc_id, manifest, headers, batch_size=10000):
+        paths = list(manifest.paths())
+        if state["fail"] & set(paths):
+            return False
+        state["registered"].extend(paths)
+        return True
+
+    monkeypatch.setattr(spool_module, "list_workflows", list_workflows)
+    monkeypatch.setattr(spool_module, "register_files_for_data_collection", register)
+    return state
+
+
+def test_events_are_durable_across_partial_writes(tmp_path):
+    spool = Spool(str(tmp_path / "spool"))
+    spool.add({"n": 1})
+    # A writer killed mid-line
+    with open(spool.segments()[-1], "ab") as f:
+        f.write(b'{"n": 2')
+    spool.add({"n": 3})
+    assert list(spool.read_events(spool.segments())) == [{"n": 1}, {"n": 3}]
+
+    sealed = spool.seal()
+    spool.add({"n": 4})
+    assert list(spool.read_events(sealed)) == [{"n": 1}, {"n": 3}]
+    assert list(spool.read_events([path for path in spool.segments() if path not in sealed])) == [{"n": 4}]
+
+
+def test_segments_roll_over(tmp_path):
+    spool = Spool(str(tmp_path / "spool"), max_segment_size=5)
+    for n in range(3):
+        spool.add({"n": n})
+    assert len(spool.segments()) == 3
+    assert spool.pending()[0] == 3
+
+
+def test_build_manifest(runs):
+    run, workflow = runs
+    events = [file_event("engine/wf", "counts", str(run / name)) for name in ["S1.csv", "notes.txt"]]
+    events.append({**events[0], "path": "/elsewhere/S9.csv"})
+    manifest = build_manifest(workflow, DC, events)
+    assert [(entry["run_id"], entry["wildcards"]) for entry in manifest] == [("run1", {"sample": "S1"})]
+    assert manifest.run_path(0) == str(run)
+
+
+def test_unregistered_events_are_replayed(tmp_path, runs, registry):
+    run, _ = runs
+    spool = Spool(str(tmp_path / "spool"))
+    for name in ["S1.csv", "S2.csv"]:
+        spool.add(file_event("engine/wf", "counts", str(run / name)))
+    spool.add(file_event("engine/wf", "unknown", str(run / "S1.csv")))
+
+    registry["down"] = True
+    assert flush_spool({}, {}, spool) is False
+    registry["down"] = False
+    # The files of a data collection are registered in one bulk request: none of them is when it fails
+    registry["fail"] = {str(run / "S2.csv")}
+    assert flush_spool({}, {}, spool) is False
+    assert registry["registered"] == []
+
+    # Events added meanwhile are flushed with the retried ones
+    spool.add(file_event("engine/wf", "counts", str(run / "S3.csv")))
+    registry["fail"] = set()
+    assert flush_spool({}, {}, spool) is False
+    assert sorted(registry["registered"]) == [str(run / name) for name in ["S1.csv", "S2.csv", "S3.csv"]]
+    # Only the events of the data collection that is not registered are left
+    assert [event["data_collection_tag"] for event in spool.read_events(spool.segments())] == ["unknown"]
+
+
+def test_a_crashed_flush_is_replayed(tmp_path, runs, registry, monkeypatch):
+    run, _ = runs
+    spool = Spool(str(tmp_path / "spool"))
+    spool.add(file_event("engine/wf", "counts", str(run / "S1.csv")))
+
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(spool_module, "register_files_for_data_collection", crash)
+        with pytest.raises(KeyboardInterrupt):
+            flush_spool({}, {}, spool)
+    # The sealed segments are only deleted once their events are registered
+    assert flush_spool({}, {}, spool) is True
+    assert registry["registered"] == [str(run / "S1.csv")]
+    assert spool.pending() == (0, 0)
+
+
+def test_concurrent_flushes(tmp_path, registry):
+    spool = Spool(str(tmp_path / "spool"))
+    with spool.lock("flush"):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if flush_spool({}, {}, spool) is None else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+    assert flush_spool({}, {}, spool) is True
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from depictio_cli.stage_lock import StageLocks
+
+
+def run_overlapping(tmp_path, second_starts_first):
+    """
+    Run a stage in a first process while a second one tries it. Returns the runs of the stage, in order.
+    """
+    runs = []
+    started, release = threading.Event(), threading.Event()
+
+    def first_pass():
+        runs.append("first")
+        started.set()
+        release.wait(5)
+        return True
+
+    second = StageLocks(str(tmp_path)) if second_starts_first else None
+    time.sleep(0.01)
+    first = StageLocks(str(tmp_path))
+    thread = threading.Thread(target=first.run, args=("wf", "dc", "scan", "hash", first_pass))
+    thread.start()
+    started.wait(5)
+    if second is None:
+        second = StageLocks(str(tmp_path))
+    threading.Timer(0.1, release.set).start()
+    assert second.run("wf", "dc", "scan", "hash", lambda: runs.append("second") or True)
+    thread.join()
+    return runs
+
+
+def test_wait_reuses_a_pass_started_after_this_run(tmp_path):
+    assert run_overlapping(tmp_path, second_starts_first=True) == ["first"]
+
+
+def test_wait_runs_again_after_a_pass_started_before_this_run(tmp_path):
+    # Files created between the two starts may have been missed by the first pass
+    assert run_overlapping(tmp_path, second_starts_first=False) == ["first", "second"]
+
+
+def test_defer_leaves_the_stage_to_a_follow_up_pass(tmp_path):
+    runs = []
+    started, release = threading.Event(), threading.Event()
+
+    def first_pass():
+        runs.append("first")
+        started.set()
+        release.wait(5)
+        return True
+
+    first = StageLocks(str(tmp_path), on_overlap="defer")
+    thread = threading.Thread(target=first.run, args=("wf", "dc", "scan", "hash", first_pass))
+    thread.start()
+    started.wait(5)
+    second = StageLocks(str(tmp_path), on_overlap="defer")
+    assert second.run("wf", "dc", "scan", "hash", lambda: runs.append("second") or True)
+    assert second.is_deferred("wf", "dc")
+    release.set()
+    thread.join()
+    assert runs == ["first", "first"]
@@ -0,0 +1,64 @@
+import io
+import json
+
+import pytest
+
+from depictio_cli.streaming import iter_json_array, iter_pages, write_rows
+
+ITEMS = [{"tag": "échantillon", "values": [1, 2.5, None]}, 12345, "a\tb", True, [], {}]
+
+
+def chunked(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1024])
+def test_items_split_across_chunks(size):
+    # Chunk boundaries fall inside numbers, literals, strings and multi-byte characters
+    data = json.dumps(ITEMS, ensure_ascii=False).encode("utf-8")
+    assert list(iter_json_array(chunked(data, size))) == ITEMS
+
+
+def test_items_are_yielded_before_the_end_of_the_stream():
+    def chunks():
+        yield b'[{"a": 1}, '
+        yield b'{"a": 2}'
+        raise AssertionError("read too far")
+
+    items = iter_json_array(chunks())
+    assert next(items) == {"a": 1}
+
+
+def test_invalid_streams():
+    assert list(iter_json_array([b" [ ] \n"])) == []
+    with pytest.raises(ValueError, match="Expected a JSON array"):
+        list(iter_json_array([b'{"a": 1}']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"a": 1}, {"a"']))
+    with pytest.raises(ValueError, match="Truncated"):
+        list(iter_json_array([b"[1, 2"]))
+
+
+def test_pages_until_a_short_page():
+    calls = []
+
+    def fetch_page(skip, limit):
+        calls.append(skip)
+        return list(range(10))[skip : skip + limit]
+
+    assert list(iter_pages(fetch_page, 4)) == list(range(10))
+    assert calls == [0, 4, 8]
+    # An endpoint ignoring the pagination parameters is only called once
+    assert list(iter_pages(lambda skip, limit: list(range(10)), 4)) == list(range(10))
+
+
+def test_write_rows():
+    out = io.StringIO()
+    assert write_rows([{"a": 1, "b": {"c": 2}}, {"a": "x\ty", "b": None}], output_format="tsv", out=out) == 2
+    assert out.getvalue() == 'a\tb\n1\t{"c": 2}\nx y\t\n'
+
+    out = io.StringIO()
+    write_rows([{"a": 1}], out=out)
+    assert out.getvalue() == '{"a": 1}\n'
+    with pytest.raises(ValueError):
+        write_rows([], output_format="csv")
@@ -0,0 +1,48 @@
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+from depictio_cli.commands import data
+from depictio_cli.http_cache import cache_scope
+from depictio_cli.table_cache import TableCache, fetch_table
+
+AGENT_CONFIG = {"api_base_url": "https://depictio.example", "user": {"email": "a@example.org"}}
+
+
+def test_tables_are_scoped_to_the_server_and_user(tmp_path):
+    source = tmp_path / "table.arrow"
+    source.write_bytes(b"ARROW1")
+    cache = TableCache(cache_scope(AGENT_CONFIG), str(tmp_path / "cache"))
+    cache.put("engine/wf", "samples", '"v1"', str(source))
+
+    other = TableCache(cache_scope({**AGENT_CONFIG, "api_base_url": "https://other.example"}), str(tmp_path / "cache"))
+    assert cache.get_entry("engine/wf", "samples")[0] == '"v1"'
+    assert other.get_entry("engine/wf", "samples") is None
+
+
+def test_get_table_offline_with_an_expired_token(tmp_path, monkeypatch):
+    agent_config_path = tmp_path / "agent.yaml"
+    token = {"name": "token", "access_token": "t1", "expire_datetime": "2000-01-01 00:00:00"}
+    agent_config_path.write_text(yaml.safe_dump({**AGENT_CONFIG, "user": {**AGENT_CONFIG["user"], "is_admin": False, "token": token}}))
+    pipeline_config_path = tmp_path / "pipeline.yaml"
+    pipeline_config_path.write_text(yaml.safe_dump({"workflows": [{"workflow_tag": "engine/wf", "data_collections": []}]}))
+    source = tmp_path / "table.arrow"
+    source.write_bytes(b"ARROW1")
+    cache_dir = str(tmp_path / "cache")
+    cached_path = TableCache(cache_scope(AGENT_CONFIG), cache_dir).put("engine/wf", "samples", '"v1"', str(source))
+
+    read = []
+    monkeypatch.setattr(data, "read_table", lambda path, columns=None, filters=None: read.append(path) or "table")
+    monkeypatch.setattr(data, "write_table", lambda table, output=None: None)
+    arguments = ["get-table", "--pipeline-config-path", str(pipeline_config_path), "--workflow-tag", "engine/wf", "--data-collection-tag", "samples"]
+    arguments += ["--agent-config-path", str(agent_config_path), "--cache-dir", cache_dir, "--offline"]
+    result = CliRunner().invoke(data.app, arguments)
+
+    assert result.exit_code == 0, result.output
+    assert read == [cached_path]
+
+
+def test_offline_fetch_of_a_missing_table_fails(tmp_path):
+    cache = TableCache(cache_scope(AGENT_CONFIG), str(tmp_path))
+    with pytest.raises(ValueError, match="not cached"):
+        fetch_table({}, {"workflow_tag": "engine/wf"}, {"data_collection_tag": "samples"}, {}, cache, offline=True)
@@ -0,0 +1,61 @@
+import pytest
+
+from depictio_cli.table_state import TableState, compute_table_schema_hash, get_dc_wildcard_names, plan_table_update
+
+WILDCARDS = [{"name": "sample", "wildcard_regex": "S[0-9]+"}]
+
+
+def make_dc(**config):
+    return {"_id": "dc1", "data_collection_tag": "counts", "config": {"type": "Table", "dc_specific_properties": {"format": "csv"}, **config}}
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = TableState(str(tmp_path / "table_state.sqlite"))
+    yield state
+    state.close()
+
+
+def record(state, dc, files):
+    state.record("wf", str(dc["_id"]), 1, compute_table_schema_hash(dc), files, columns=["sample", "count"])
+
+
+def test_wildcard_names_from_both_keys():
+    assert get_dc_wildcard_names(make_dc(regex_wildcards=WILDCARDS)) == ["sample"]
+    assert get_dc_wildcard_names(make_dc(regex={"pattern": r"(?P<sample>S\d+)\.csv", "wildcards": WILDCARDS})) == ["sample"]
+    assert get_dc_wildcard_names(make_dc(files_regex=r".*\.csv")) == []
+
+
+@pytest.mark.parametrize(
+    "config",
+    [{"regex_wildcards": WILDCARDS}, {"regex": {"pattern": r"(?P<sample>S\d+)\.csv", "wildcards": WILDCARDS}}],
+    ids=["legacy", "regex"],
+)
+def test_changed_files_are_upserted_on_the_wildcards(state, config):
+    dc = make_dc(**config)
+    record(state, dc, {"/runs/a/S1.csv": "f1"})
+
+    plan = plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f2", "/runs/b/S2.csv": "f3"})
+    assert plan["mode"] == "upsert"
+    assert plan["new"] == ["/runs/b/S2.csv"]
+    assert plan["changed"] == ["/runs/a/S1.csv"]
+    assert plan["columns"] == ["sample", "count"]
+
+
+def test_planning_modes(state):
+    dc = make_dc(files_regex=r".*\.csv")
+    assert plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f1"})["mode"] == "create"
+
+    record(state, dc, {"/runs/a/S1.csv": "f1"})
+    assert plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f1"})["mode"] == "noop"
+    assert plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f1", "/runs/b/S2.csv": "f2"})["mode"] == "append"
+    # Without wildcard columns there is no key to upsert changed files on
+    assert plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f2"})["mode"] == "create"
+    assert plan_table_update(state, "wf", dc, {})["mode"] == "create"
+    assert plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f1"}, full_rebuild=True)["mode"] == "create"
+
+    new_columns = plan_table_update(state, "wf", dc, {"/runs/a/S1.csv": "f1", "/runs/b/S2.csv": "f2"}, read_columns=lambda path: ["sample"])
+    assert new_columns["mode"] == "create"
+
+    changed_config = make_dc(files_regex=r".*\.csv", dc_specific_properties={"format": "tsv"})
+    assert plan_table_update(state, "wf", changed_config, {"/runs/a/S1.csv": "f1"})["reason"] == "table configuration changed"
@@ -0,0 +1,65 @@
+import threading
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from depictio_cli.throttle import Throttle, parse_bandwidth_limits, request_priority
+
+KB = 1024
+
+
+def drain(throttle, host="api.example"):
+    for bucket in throttle.buckets(host):
+        with ExitStack() as stack:
+            bucket.set_tokens(bucket.lock(stack), 0)
+
+
+def test_parse_bandwidth_limits():
+    assert parse_bandwidth_limits(["*=2", "s3.example=0.5"]) == {"*": 2 * 1024 * 1024, "s3.example": 512 * 1024}
+    for limit in ["2", "host=", "host=-1", "=3"]:
+        with pytest.raises(ValueError):
+            parse_bandwidth_limits([limit])
+    assert request_priority(None) == "metadata"
+    assert request_priority(b"x" * (512 * KB)) == "bulk"
+
+
+def test_bodies_are_sent_at_the_rate_of_the_buckets(tmp_path):
+    throttle = Throttle(max_bandwidth=400 * KB, host_bandwidth={"other.example": 100 * KB}, state_dir=str(tmp_path))
+    assert len(throttle.buckets("api.example")) == 1
+    assert len(throttle.buckets("other.example")) == 2
+
+    start = time.monotonic()
+    chunks = list(throttle.iter_content("https://api.example/upload", b"x" * (600 * KB)))
+    elapsed = time.monotonic() - start
+    assert b"".join(chunks) == b"x" * (600 * KB)
+    # The first 400 KB are the burst, the rest is sent at 400 KB/s keeping the reserve of the bulk class
+    assert 0.5 < elapsed < 3
+    assert throttle.stats["bulk"]["bytes"] == 600 * KB
+
+
+def test_buckets_are_shared_by_processes(tmp_path):
+    first = Throttle(max_bandwidth=400 * KB, state_dir=str(tmp_path))
+    second = Throttle(max_bandwidth=400 * KB, state_dir=str(tmp_path))
+    assert first._try_take(first.buckets("api.example"), 280 * KB, "bulk") == 0
+    assert second._try_take(second.buckets("api.example"), 280 * KB, "bulk") > 0
+    # Bulk transfers leave a reserve to the more urgent classes
+    assert second._try_take(second.buckets("api.example"), 100 * KB, "interactive") == 0
+
+
+def test_urgent_transfers_are_served_first(tmp_path):
+    throttle = Throttle(max_bandwidth=100 * KB, state_dir=None)
+    drain(throttle)
+    order = []
+
+    def send(nbytes, priority):
+        throttle.acquire("api.example", nbytes, priority)
+        order.append(priority)
+
+    bulk = threading.Thread(target=send, args=(50 * KB, "bulk"))
+    bulk.start()
+    while not throttle._waiters:
+        time.sleep(0.01)
+    send(20 * KB, "interactive")
+    bulk.join()
+    assert order == ["interactive", "bulk"]
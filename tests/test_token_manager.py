@@ -0,0 +1,96 @@
+import contextvars
+import threading
+import time
+
+import httpx
+import pytest
+
+from depictio_cli.token_manager import EXPIRE_DATETIME_FORMAT, TokenManager
+from depictio_cli.utils import api_request, use_api_session
+
+
+def expire_in(seconds):
+    return time.strftime(EXPIRE_DATETIME_FORMAT, time.localtime(time.time() + seconds))
+
+
+def test_concurrent_refreshes_of_a_stale_token_are_single_flight():
+    calls, released = [], threading.Event()
+
+    def refresh(token):
+        calls.append(token)
+        released.wait(5)
+        return {"access_token": f"t{len(calls) + 1}", "expire_datetime": expire_in(3600)}
+
+    token_manager = TokenManager({"access_token": "t1", "expire_datetime": expire_in(3600)}, refresh)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(token_manager.refresh(stale_token="t1"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    released.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["t1"]
+    assert results == ["t2"] * 8
+    assert token_manager.refreshes == 1
+
+
+def test_tokens_are_refreshed_before_they_expire():
+    refreshed = []
+    token_manager = TokenManager(
+        {"access_token": "t1", "expire_datetime": expire_in(60)},
+        lambda token: {"access_token": "t2", "expire_datetime": expire_in(3600)},
+        refresh_margin=300,
+        on_refresh=refreshed.append,
+    )
+    assert token_manager.access_token() == "t2"
+    assert token_manager.access_token() == "t2"
+    assert [token["access_token"] for token in refreshed] == ["t2"]
+
+
+def test_failed_refreshes_keep_the_token_until_it_expires():
+    def refresh(token):
+        raise httpx.ConnectError("API down")
+
+    assert TokenManager({"access_token": "t1", "expire_datetime": expire_in(60)}, refresh).access_token() == "t1"
+    with pytest.raises(httpx.ConnectError):
+        TokenManager({"access_token": "t1", "expire_datetime": expire_in(-60)}, refresh).access_token()
+
+
+def test_background_refresh():
+    refreshed = threading.Event()
+
+    def refresh(token):
+        refreshed.set()
+        return {"access_token": "t2", "expire_datetime": expire_in(3600)}
+
+    token_manager = TokenManager({"access_token": "t1", "expire_datetime": expire_in(1)}, refresh, refresh_margin=1)
+    token_manager.start()
+    try:
+        assert refreshed.wait(5)
+    finally:
+        token_manager.stop()
+    assert token_manager.access_token() == "t2"
+
+
+def test_rejected_requests_are_retried_once_with_a_refreshed_token(monkeypatch):
+    monkeypatch.setattr("depictio_cli.utils.get_http_cache", lambda: None)
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers["Authorization"])
+        return httpx.Response(200 if request.headers["Authorization"] == "Bearer t2" else 401, json={})
+
+    token_manager = TokenManager({"access_token": "t1", "expire_datetime": expire_in(3600)}, lambda token: {"access_token": "t2"})
+    context = contextvars.copy_context()
+    context.run(use_api_session, httpx.Client(transport=httpx.MockTransport(handler)), token_manager)
+    response = context.run(api_request, "GET", "https://depictio.example/api", {"Authorization": "Bearer t1"})
+    assert response.status_code == 200
+    assert seen == ["Bearer t1", "Bearer t2"]
+
+    # Still rejected after the refresh: not retried again
+    token_manager = TokenManager({"access_token": "t1"}, lambda token: {"access_token": "t3"})
+    context = contextvars.copy_context()
+    context.run(use_api_session, httpx.Client(transport=httpx.MockTransport(handler)), token_manager)
+    seen.clear()
+    assert context.run(api_request, "GET", "https://depictio.example/api", {"Authorization": "Bearer t1"}).status_code == 401
+    assert seen == ["Bearer t1", "Bearer t3"]
@@ -0,0 +1,51 @@
+import pytest
+
+from depictio_cli import validation
+from depictio_cli.validation import compile_dc_pattern, validate_pipeline_config_locally
+
+
+def make_config(*data_collections, runs_regex=".*"):
+    return {"workflows": [{"config": {"runs_regex": runs_regex}, "data_collections": list(data_collections)}]}
+
+
+@pytest.fixture
+def without_schema(monkeypatch):
+    # Only the checks the JSON Schema cannot express
+    monkeypatch.setattr(validation, "get_schema_validator", lambda: None)
+
+
+def test_compile_dc_pattern():
+    pattern = compile_dc_pattern({"pattern": r"{sample}_{lane}\.csv", "wildcards": [{"name": "sample", "wildcard_regex": r"S\d+"}, {"name": "lane"}]})
+    assert pattern.fullmatch("S12_L001.csv").groupdict() == {"sample": "S12", "lane": "L001"}
+    assert pattern.fullmatch("X12_L001.csv") is None
+
+
+def test_valid_config(without_schema):
+    samples = {"data_collection_tag": "samples", "config": {"files_regex": r".*\.csv"}}
+    counts = {
+        "data_collection_tag": "counts",
+        "config": {"regex": {"pattern": r"{sample}\.tsv", "wildcards": [{"name": "sample", "join_data_collection": "samples"}]}, "join": {"with_dc": ["samples"]}},
+    }
+    assert validate_pipeline_config_locally(make_config(samples, counts)) == []
+
+
+def test_every_error_is_reported(without_schema):
+    dcs = [
+        {"data_collection_tag": "a", "config": {"files_regex": "("}},
+        {"data_collection_tag": "a", "config": {"regex": {"pattern": r"{sample}\.tsv"}}},
+        {"data_collection_tag": "b", "config": {"join": {"with_dc": ["missing"]}, "regex_wildcards": [{"name": "x", "regex": "[", "join_data_collection": "a"}]}},
+    ]
+    errors = validate_pipeline_config_locally(make_config(*dcs, runs_regex="*"))
+    assert errors[0].startswith("workflows[0].config.runs_regex: invalid regular expression")
+    assert "workflows[0].data_collections: duplicated data_collection_tag 'a'" in errors
+    assert any(error.startswith("workflows[0].data_collections[0].config.files_regex") for error in errors)
+    assert any(error.startswith("workflows[0].data_collections[1].config.regex.pattern") and "not declared" in error for error in errors)
+    assert any(error.startswith("workflows[0].data_collections[2].config.regex_wildcards[0].regex") for error in errors)
+    assert "workflows[0].data_collections[2].config: reference to unknown data collection 'missing'" in errors
+    assert len(errors) == 6
+
+
+def test_schema_errors_are_located():
+    pytest.importorskip("jsonschema")
+    errors = validate_pipeline_config_locally({"workflows": "not a list"})
+    assert "workflows: 'not a list' is not of type 'array'" in errors
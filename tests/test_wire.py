@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from depictio_cli.manifest import Manifest
+from depictio_cli.wire import common_prefix_length, decode_manifest, encode_manifest, front_code, front_decode
+
+
+def test_front_coding():
+    paths = ["/runs/run1/a.csv", "/runs/run1/ab.csv", "/runs/run2/a.csv", "/x", ""]
+    prefix_lengths, suffixes = front_code(paths)
+    assert prefix_lengths == [0, 12, 9, 1, 0]
+    assert suffixes[1] == "b.csv"
+    assert front_decode(prefix_lengths, suffixes) == paths
+    assert common_prefix_length("abc", "abd") == 2
+    with pytest.raises(ValueError):
+        front_decode([3], ["a"])
+
+
+def test_manifest_round_trip():
+    entries = [
+        {"data_collection_tag": "counts", "run_id": f"run{i % 3}", "path": f"/runs/run{i % 3}/S{i}_é.csv", "size": i, "mtime": 1.5 * i, "wildcards": {"sample": f"S{i}"} if i % 2 else {}}
+        for i in range(20)
+    ]
+    payload = json.loads(json.dumps(encode_manifest(Manifest.from_entries(entries))))
+    assert payload["count"] == 20
+    assert len(payload["run_id"]["values"]) == 3
+
+    expected = sorted(({key: value for key, value in entry.items() if key != "data_collection_tag"} for entry in entries), key=lambda entry: entry["path"])
+    assert decode_manifest(payload) == expected
+
+
+def test_stats_are_carried_along():
+    entries = [
+        {"path": f"/runs/run1/{name}.csv", "size": 1, "mtime": 0.0, "run_id": "run1", "stats": {"path": "ignored", "rows": rows, "columns": ["a", "b"]}}
+        for name, rows in [("b", 2), ("a", 1)]
+    ]
+    entries.append({"path": "/runs/run1/c.csv", "size": 1, "mtime": 0.0, "run_id": "run1"})
+    payload = encode_manifest(entries)
+    assert payload["stats"]["headers"] == [["a", "b"]]
+    assert [entry.get("stats") for entry in decode_manifest(payload)] == [{"rows": 1, "columns": ["a", "b"]}, {"rows": 2, "columns": ["a", "b"]}, {}]
+
+
+def test_invalid_payloads():
+    payload = encode_manifest([{"path": "/a", "size": 1, "mtime": 0.0, "run_id": None}])
+    assert decode_manifest(payload)[0]["run_id"] is None
+    with pytest.raises(ValueError, match="Unsupported manifest format"):
+        decode_manifest({**payload, "format": "other/1"})
+    with pytest.raises(ValueError, match="different lengths"):
+        decode_manifest({**payload, "size": []})
@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from depictio_cli.manifest import Manifest
+from depictio_cli.scanner import read_partial_manifests, scan_run, write_partial_manifest
+from depictio_cli.work_queue import WorkQueue
+
+DATA_COLLECTIONS = [{"data_collection_tag": "counts", "config": {"type": "Table", "files_regex": r".*\.csv"}}]
+
+
+def make_run(root, run_id, files):
+    run_path = root / run_id
+    for relative_path in files:
+        (run_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (run_path / relative_path).write_text("sample,count\n")
+    return run_id, str(run_path)
+
+
+def test_claims_are_leased(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=0)
+    runs = [("run1", "/runs/run1"), ("run2", "/runs/run2")]
+    assert queue.populate("wf", runs) == 2
+    assert queue.populate("wf", runs) == 0
+
+    claimed = queue.claim("wf", "worker-1", batch_size=1)
+    assert claimed == [("run1", "/runs/run1")]
+    # With no lease left, a claimed run that was not completed is handed out again
+    assert queue.claim("wf", "worker-2", batch_size=2) == runs
+
+    queue.complete("wf", ["/runs/run1", "/runs/run2"], "shard.dpm")
+    assert queue.progress("wf") == {"pending": 0, "claimed": 0, "done": 2}
+    assert queue.manifests("wf") == ["shard.dpm"]
+    queue.close()
+
+
+def test_failed_completion_is_rolled_back(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.populate("wf", [("run1", "/runs/run1")])
+    queue.claim("wf", "worker-1")
+
+    with pytest.raises(sqlite3.Error):
+        queue.complete("wf", [("/runs/run1", "extra parameter")], "shard.dpm")
+    assert not queue._conn.in_transaction
+    queue.complete("wf", ["/runs/run1"], "shard.dpm")
+    assert queue.progress("wf")["done"] == 1
+    queue.close()
+
+
+def test_rescanned_runs_are_merged_once(tmp_path):
+    # Both parent runs locations are under a directory named after the run, which must not be taken for the run directory
+    first_run = make_run(tmp_path / "run1" / "runs", "run1", ["a.csv", "run1/b.csv"])
+    second_run = make_run(tmp_path / "run1" / "archive", "run1", ["a.csv"])
+    first_entries = list(scan_run(*first_run, DATA_COLLECTIONS))
+    second_entries = list(scan_run(*second_run, DATA_COLLECTIONS))
+    assert {entry["run_path"] for entry in first_entries} == {first_run[1]}
+
+    first, second, rescan = (str(tmp_path / name) for name in ["first.dpm", "second.dpm", "rescan.dpm"])
+    write_partial_manifest(first_entries, first)
+    write_partial_manifest(second_entries, second)
+    write_partial_manifest(first_entries, rescan)
+    assert Manifest.read(first).run_path(0) == first_run[1]
+
+    merged = read_partial_manifests([first, second, rescan])
+    assert sorted(merged["counts"].paths()) == sorted(entry["path"] for entry in first_entries + second_entries)
+
+
+def test_manifests_without_run_paths_are_merged_by_directory(tmp_path):
+    entries = [
+        {"data_collection_tag": "counts", "run_id": "run1", "path": "/a/run1/x.csv", "size": 1, "mtime": 0.0},
+        {"data_collection_tag": "counts", "run_id": "run1", "path": "/b/run1/x.csv", "size": 1, "mtime": 0.0},
+    ]
+    path = str(tmp_path / "old.dpm")
+    write_partial_manifest(entries, path)
+    assert Manifest.read(path).run_path(0) is None
+    assert len(read_partial_manifests([path])["counts"]) == 2